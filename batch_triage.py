@@ -0,0 +1,176 @@
+"""
+Bulk lead triage: intent and hypotheses for a backlog of enquiries.
+
+Input is JSONL, one {"id": ..., "message": ...} per line (id defaults to
+the line number). Output is JSONL in completion order, one
+{"id", "main_issue", "risk_level", "hypotheses"} or {"id", "error"} per
+enquiry. BATCH_PACK_SIZE enquiries share one intent prompt, at most
+BATCH_CONCURRENCY prompts run at once, and they queue behind interactive
+sessions for LLM slots.
+
+Resuming: the CLI appends to --out and skips ids that already have a
+result there (failed ones are tried again). Over HTTP, /batch/start also
+streams {"checkpoint": n} lines: every input line before n has been
+answered, so a dropped client can resend the same body with ?offset=n.
+
+    python batch_triage.py leads.jsonl --out triage.jsonl
+    python batch_triage.py - --pack 16 --concurrency 8 < leads.jsonl > triage.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from config import BATCH_PACK_SIZE, BATCH_CONCURRENCY
+from llm_engine import extract_intents_batch
+from llm_scheduler import current_priority, SchedulerOverloaded
+from model_router import API_ERRORS
+
+
+def _enquiry(position, line):
+    """(id, message, error) for one input line; message is None when error is set"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return position, None, "invalid JSON line"
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str) or not data["message"].strip():
+        return data.get("id", position) if isinstance(data, dict) else position, None, "missing message"
+    return data.get("id", position), data["message"], None
+
+
+def _result(enquiry_id, intent):
+    if "error" in intent:
+        return {"id": enquiry_id, "error": intent["error"]}
+    return {
+        "id": enquiry_id,
+        "main_issue": intent["main_issue"],
+        "risk_level": intent.get("risk_level", "low"),
+        "hypotheses": intent["hypotheses"]
+    }
+
+
+async def triage(lines, offset=0, skip=(), pack_size=BATCH_PACK_SIZE, concurrency=BATCH_CONCURRENCY):
+    """
+    Yield a result per enquiry as its pack finishes, plus {"checkpoint": n}
+    whenever every line before n has been answered. Lines before offset and
+    enquiries whose str(id) is in skip are left out.
+    """
+    current_priority.set("batch")
+    finished = asyncio.Queue()  # (input positions, result rows); None once everything is in
+    limit = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def run(pack):
+        try:
+            intents = await extract_intents_batch([message for _, _, message in pack])
+        except (SchedulerOverloaded, *API_ERRORS) as e:
+            intents = [{"error": f"provider unavailable: {type(e).__name__}"}] * len(pack)
+        finally:
+            limit.release()
+        await finished.put(([p for p, _, _ in pack], [_result(i, intent) for (_, i, _), intent in zip(pack, intents)]))
+
+    async def launch(pack):
+        await limit.acquire()
+        task = asyncio.create_task(run(pack))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    async def feed():
+        pack = []
+        try:
+            for position, line in enumerate(lines):
+                if position < offset:
+                    continue
+                if not line.strip():
+                    await finished.put(([position], []))
+                    continue
+                enquiry_id, message, error = _enquiry(position, line)
+                if error or str(enquiry_id) in skip:
+                    await finished.put(([position], [{"id": enquiry_id, "error": error}] if error else []))
+                    continue
+                pack.append((position, enquiry_id, message))
+                if len(pack) == pack_size:
+                    await launch(pack)
+                    pack = []
+            if pack:
+                await launch(pack)
+            while running:
+                await asyncio.gather(*running)
+        finally:
+            await finished.put(None)  # the consumer re-raises anything that went wrong here
+
+    feeder = asyncio.create_task(feed())
+    answered, checkpoint = set(), offset
+    try:
+        while (item := await finished.get()) is not None:
+            positions, rows = item
+            for row in rows:
+                yield row
+            answered.update(positions)
+            reached = checkpoint
+            while reached in answered:
+                answered.remove(reached)
+                reached += 1
+            if reached > checkpoint:
+                checkpoint = reached
+                yield {"checkpoint": checkpoint}
+        await feeder
+    finally:
+        feeder.cancel()
+        for task in running:
+            task.cancel()
+
+
+def _answered_ids(path):
+    """ids that already have a successful result in an earlier output file"""
+    if not path or not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if isinstance(row, dict) and "id" in row and "error" not in row:
+                done.add(str(row["id"]))
+    return done
+
+
+async def _main(args):
+    from llm_engine import aclose
+
+    skip = _answered_ids(args.out)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+    counts = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+    try:
+        async for row in triage(source, skip=skip, pack_size=args.pack, concurrency=args.concurrency):
+            if "checkpoint" in row:
+                continue
+            counts["error" if "error" in row else "ok"] += 1
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        await aclose()
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{counts['ok']} triaged, {counts['error']} failed, {len(skip)} already done "
+        f"in {elapsed:.1f}s ({counts['ok'] / elapsed:.1f} enquiries/s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of enquiries, or - for stdin")
+    parser.add_argument("--out", help="JSONL results file to append to and resume from (default: stdout)")
+    parser.add_argument("--pack", type=int, default=BATCH_PACK_SIZE, help="enquiries per prompt")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="prompts in flight")
+    asyncio.run(_main(parser.parse_args()))
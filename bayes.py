@@ -0,0 +1,63 @@
+from array import array
+
+# Floor for model-provided likelihoods so one answer can never zero out a hypothesis
+MIN_LIKELIHOOD = 0.02
+
+
+def normalize(probs):
+    """Return probs as a compact float array that sums to 1"""
+    vector = array("d", (max(float(p), 0.0) for p in probs))
+    total = sum(vector)
+    if total <= 0:
+        return array("d", [1.0 / len(vector)] * len(vector)) if vector else vector
+    return array("d", (p / total for p in vector))
+
+
+def probability_vector(hypotheses):
+    return normalize(h.get("probability", 0) for h in hypotheses)
+
+
+def build_index(hypotheses):
+    """Case-insensitive hypothesis name -> position, built once per session"""
+    return {h["name"].strip().lower(): i for i, h in enumerate(hypotheses)}
+
+
+def parse_likelihoods(question_data, n_hypotheses):
+    """
+    Validate the per-option likelihood table returned with a question.
+    Returns {option_lower: array} or None if any option is unusable.
+    """
+    table = question_data.get("likelihoods")
+    options = question_data.get("options") or []
+    if not isinstance(table, dict) or not options or not n_hypotheses:
+        return None
+
+    by_key = {str(k).strip().lower(): v for k, v in table.items()}
+    parsed = {}
+    for option in options:
+        row = by_key.get(str(option).strip().lower())
+        if not isinstance(row, list) or len(row) != n_hypotheses:
+            return None
+        try:
+            parsed[str(option).strip().lower()] = array("d", (min(max(float(x), MIN_LIKELIHOOD), 1.0) for x in row))
+        except (TypeError, ValueError):
+            return None
+    return parsed
+
+
+def likelihood_for(likelihoods, answer):
+    if not likelihoods:
+        return None
+    return likelihoods.get(answer.strip().lower())
+
+
+def bayes_update(prior, likelihood):
+    """Posterior ∝ prior × P(answer | hypothesis), renormalized"""
+    return normalize(p * l for p, l in zip(prior, likelihood))
+
+
+def apply_vector(hypotheses, probs):
+    """Write a probability vector back onto the hypothesis dicts"""
+    for hyp, p in zip(hypotheses, probs):
+        hyp["probability"] = round(p, 4)
+    return hypotheses
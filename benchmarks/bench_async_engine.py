@@ -0,0 +1,98 @@
+"""
+Concurrent-session throughput: blocking engine vs. async engine.
+
+Both modes talk to the local fake completion server and run the same
+session shape (/start = 2 LLM calls, each /answer = 3 LLM calls).
+
+- blocking: the old layout, a sync Groq client where every request holds
+  one of 40 worker threads (Starlette's default threadpool) for its whole
+  LLM round trip.
+- async: the llm_engine coroutines on the shared pooled AsyncGroq client.
+
+    python benchmarks/bench_async_engine.py --sessions 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+
+MESSAGE = "my wifi keeps dropping every evening"
+
+
+def run_blocking(sessions, answers, threads):
+    from groq import Groq
+
+    sync_client = Groq(api_key="bench", base_url=os.environ["GROQ_BASE_URL"])
+
+    def call():
+        sync_client.chat.completions.create(
+            model="bench", messages=[{"role": "user", "content": MESSAGE}], temperature=0.2
+        )
+
+    def request(n_calls):
+        for _ in range(n_calls):
+            call()
+
+    def session(pool):
+        pool.submit(request, 2).result()
+        for _ in range(answers):
+            pool.submit(request, 3).result()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool, ThreadPoolExecutor(max_workers=sessions) as clients:
+        start = time.perf_counter()
+        list(clients.map(lambda _: session(pool), range(sessions)))
+        return time.perf_counter() - start
+
+
+async def run_async(sessions, answers):
+    import llm_engine
+
+    async def session():
+        intent = await llm_engine.extract_intent_and_hypotheses(MESSAGE)
+        hypotheses = intent["hypotheses"]
+        question = await llm_engine.generate_adaptive_question(intent["main_issue"], hypotheses, [], [])
+        history, asked = [], [question["question"]]
+        for _ in range(answers):
+            history.append({"question": asked[-1], "answer": question["options"][0]})
+            hypotheses = await llm_engine.update_hypotheses(intent["main_issue"], hypotheses, asked[-1], history[-1]["answer"])
+            await llm_engine.evaluate_confidence(intent["main_issue"], hypotheses, len(history))
+            question = await llm_engine.generate_adaptive_question(intent["main_issue"], hypotheses, history, asked)
+            asked.append(question["question"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    await llm_engine.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    serve_in_background(args.port, args.latency)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("LLM_POOL_SIZE", str(args.sessions))
+
+    calls = args.sessions * (2 + 3 * args.answers)
+    for name, elapsed in (
+        ("blocking", run_blocking(args.sessions, args.answers, args.threads)),
+        ("async", asyncio.run(run_async(args.sessions, args.answers))),
+    ):
+        print(f"{name:>9}: {elapsed:6.2f}s  {args.sessions / elapsed:7.1f} sessions/s  {calls / elapsed:7.1f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
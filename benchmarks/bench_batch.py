@@ -0,0 +1,83 @@
+"""
+Bulk triage throughput against the fake completion server: the same
+backlog through batch_triage.triage() one enquiry per prompt, then packed.
+
+The fake server enforces --rpm like the real provider, so packing shows up
+both as fewer round trips and as more enquiries per rate-limited request.
+
+    python benchmarks/bench_batch.py --enquiries 1000 --pack 8 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+
+MESSAGES = [
+    "my wifi keeps dropping every evening",
+    "the kitchen sink drains really slowly since last week",
+    "I get a headache every afternoon at work",
+    "my laptop fan is loud and it shuts down randomly",
+    "there is a musty smell in the basement after rain",
+    "my car makes a clicking noise when I turn the key"
+]
+
+
+async def run(enquiries, pack, concurrency):
+    import metrics
+    from batch_triage import triage
+
+    lines = [json.dumps({"id": f"lead-{i}", "message": f"{MESSAGES[i % len(MESSAGES)]} (lead {i})"}) for i in range(enquiries)]
+    calls_before = sum(metrics.llm_calls.values.values())
+    counts = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+    async for row in triage(lines, pack_size=pack, concurrency=concurrency):
+        if "checkpoint" not in row:
+            counts["error" if "error" in row else "ok"] += 1
+    elapsed = time.perf_counter() - started
+    return elapsed, counts, sum(metrics.llm_calls.values.values()) - calls_before
+
+
+async def run_all(args):
+    import llm_engine
+
+    for name, pack in (("single", 1), ("packed", args.pack)):
+        elapsed, counts, calls = await run(args.enquiries, pack, args.concurrency)
+        print(
+            f"{name:>7} (pack {pack:2d}): {elapsed:6.2f}s  {counts['ok'] / elapsed:7.1f} enquiries/s  "
+            f"{counts['ok']}/{args.enquiries} ok  {calls} LLM calls"
+        )
+        await asyncio.sleep(10)  # let the provider's burst allowance refill
+    await llm_engine.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enquiries", type=int, default=1000)
+    parser.add_argument("--pack", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8, help="prompts in flight")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=800)
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--malformed-rate", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=9103)
+    args = parser.parse_args()
+
+    serve_in_background(
+        args.port, args.latency, token_rate=args.token_rate, rpm=args.rpm, malformed_rate=args.malformed_rate
+    )
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+    os.environ.setdefault("LLM_RPM", str(args.rpm))  # pace like a correctly configured deployment
+
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
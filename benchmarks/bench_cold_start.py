@@ -0,0 +1,100 @@
+"""
+Cold start: how long a fresh instance takes to import the app, answer its
+first /health and serve its first /start.
+
+Each run spawns a new interpreter. The provider is mocked with the
+synthetic cassette mode (fake_llm_server completions, no latency), so only
+the backend's own import and startup cost is measured. Medians over --runs
+are checked against the budgets; exits non-zero when one is exceeded.
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --health-budget 1.5 --start-budget 2
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+
+IMPORT_PROBE = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def mock_env():
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([ROOT, BENCH]),
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench"),
+        "LLM_CASSETTE_MODE": "synthetic",
+        "LLM_SYNTHESIZER": "fake_llm_server:fake_content",
+        "LLM_CASSETTE": os.path.join(BENCH, "no_such_cassette.log"),
+        "LLM_CASSETTE_LATENCY": "0"
+    }
+
+
+def time_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=mock_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_startup(port):
+    """Seconds from spawning uvicorn to the first /health, then to the first /start"""
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=mock_env()
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError("backend exited during startup")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            health = time.perf_counter() - started
+            response = client.post("/start", json={"message": "my wifi keeps dropping every evening"})
+            if "session_id" not in response.json():
+                raise RuntimeError(f"/start failed: {response.text}")
+            return health, time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8107)
+    parser.add_argument("--import-budget", type=float, default=0.6, help="seconds to import main")
+    parser.add_argument("--health-budget", type=float, default=1.0, help="seconds from spawn to the first /health")
+    parser.add_argument("--start-budget", type=float, default=1.2, help="seconds from spawn to the first /start")
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    startups = [time_startup(args.port) for _ in range(args.runs)]
+    result = {
+        "import": statistics.median(imports),
+        "health": statistics.median(h for h, _ in startups),
+        "start": statistics.median(s for _, s in startups)
+    }
+    budgets = {"import": args.import_budget, "health": args.health_budget, "start": args.start_budget}
+
+    over = False
+    for name, seconds in result.items():
+        status = "ok" if seconds <= budgets[name] else "OVER BUDGET"
+        over |= seconds > budgets[name]
+        print(f"{name:>7}: {seconds * 1000:7.1f}ms  (budget {budgets[name] * 1000:.0f}ms)  {status}")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Deterministic engine benchmark: the five llm_engine stages (intent,
+question, update, confidence, final) and full /start → /answer sessions,
+served from an LLM cassette so it runs without network access.
+
+Record once, against the live provider (GROQ_API_KEY) or the fake
+completion server with --fake. Recording replaces the cassette:
+
+    python benchmarks/bench_replay.py --record benchmarks/engine_cassette.log --fake
+
+Then replay it (instantly by default, --latency-scale 1 for the recorded
+latency profile) and compare with a baseline:
+
+    python benchmarks/bench_replay.py --output benchmarks/replay_baseline.json
+    python benchmarks/bench_replay.py --compare benchmarks/replay_baseline.json
+
+--synthetic generates completions with fake_llm_server instead, drawing
+latencies from the cassette's recorded profile.
+
+Replaying at zero latency leaves only the backend's own time per stage.
+--compare exits non-zero when any prompt misses the cassette, when LLM
+calls per stage or session change, when the outputs' digest changes, or
+when a stage's p50 is more than --tolerance slower than the baseline.
+tests/test_replay.py checks the same misses, calls and digest under pytest.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+from load_test import MESSAGES, percentiles
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_cassette.log")
+SLACK_MS = 1.0  # replayed stages take well under a millisecond; ignore jitter below this
+
+
+async def timed(samples, call):
+    started = time.perf_counter()
+    result = await call()
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def llm_calls():
+    import metrics
+    return sum(metrics.llm_calls.values.values())
+
+
+async def run_stages(repeat):
+    """Each stage on fixed inputs derived from MESSAGES; returns timings, calls and outputs"""
+    import llm_engine
+
+    timings = {stage: [] for stage in ("intent", "question", "update", "confidence", "final")}
+    outputs = []
+    calls_before = llm_calls()
+    for _ in range(repeat):
+        for message in MESSAGES:
+            intent = await timed(timings["intent"], lambda: llm_engine.extract_intent_and_hypotheses(message))
+            issue, hypotheses = intent["main_issue"], intent["hypotheses"]
+            domain, risk = intent.get("domain"), intent.get("risk_level", "low")
+            question = await timed(timings["question"], lambda: llm_engine.generate_adaptive_question(
+                issue, hypotheses, [], [], domain
+            ))
+            answer = question["options"][0]
+            updated = await timed(timings["update"], lambda: llm_engine.update_hypotheses(
+                issue, hypotheses, question["question"], answer, domain=domain
+            ))
+            confidence = await timed(timings["confidence"], lambda: llm_engine.evaluate_confidence(
+                issue, hypotheses, 1, domain
+            ))
+            history = [{"question": question["question"], "answer": answer}]
+            final = await timed(timings["final"], lambda: llm_engine.generate_final_response(
+                issue, hypotheses, history, risk, domain
+            ))
+            outputs.append([intent, question, updated, confidence, final])
+    return timings, llm_calls() - calls_before, outputs
+
+
+async def run_sessions(repeat):
+    """Full sessions through the API, answering the first option until completed"""
+    import httpx
+    import main
+
+    samples, outputs = [], []
+    calls_before = llm_calls()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for _ in range(repeat):
+            for message in MESSAGES:
+                started = time.perf_counter()
+                data = (await client.post("/start", json={"message": message})).json()
+                session_id, transcript = data["session_id"], [data["question"]]
+                while data.get("status", "continue") == "continue":
+                    data = (await client.post("/answer", json={
+                        "session_id": session_id,
+                        "selected_option": data["options"][0],
+                        "question_number": data.get("question_number")
+                    })).json()
+                    transcript.append(data.get("question") or data.get("final_response"))
+                samples.append(time.perf_counter() - started)
+                outputs.append(transcript)
+    return samples, llm_calls() - calls_before, outputs
+
+
+def digest(stage_outputs, session_outputs):
+    """Short fingerprint of everything the stages and sessions returned"""
+    raw = json.dumps([stage_outputs, session_outputs], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+async def run(args):
+    import cassette
+
+    stage_timings, stage_calls, stage_outputs = await run_stages(args.repeat)
+    session_timings, session_calls, session_outputs = await run_sessions(args.repeat)
+    sessions = args.repeat * len(MESSAGES)
+    return {
+        "settings": {"repeat": args.repeat, "latency_scale": args.latency_scale},
+        "stages_ms": {stage: percentiles(samples) for stage, samples in stage_timings.items()},
+        "session_ms": percentiles(session_timings),
+        "llm_calls": {"stages": stage_calls, "per_session": round(session_calls / sessions, 2)},
+        "digest": digest(stage_outputs, session_outputs),
+        "cassette": cassette.active_cassette().snapshot()
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of result against baseline, printed; True if there are any"""
+    failures = []
+    if result["cassette"]["misses"]:
+        failures.append(f"{result['cassette']['misses']} prompts missing from the cassette")
+    if result["llm_calls"] != baseline["llm_calls"]:
+        failures.append(f"LLM calls {result['llm_calls']} (baseline {baseline['llm_calls']})")
+    if result["digest"] != baseline["digest"]:
+        failures.append(f"outputs changed (digest {result['digest']}, baseline {baseline['digest']})")
+    for stage, stats in result["stages_ms"].items():
+        before = baseline["stages_ms"].get(stage, {}).get("p50")
+        if before and stats["p50"] > max(before * (1 + tolerance), before + SLACK_MS):
+            failures.append(f"{stage} p50 {stats['p50']}ms (baseline {before}ms)")
+    for failure in failures:
+        print("REGRESSION:", failure)
+    return bool(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--record", metavar="CASSETTE", help="record a new cassette instead of replaying")
+    parser.add_argument("--fake", action="store_true", help="record against the fake completion server")
+    parser.add_argument("--synthetic", action="store_true", help="generate completions (fake_llm_server) instead of replaying")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="replayed latency as a multiple of the recorded")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-port", type=int, default=9106)
+    parser.add_argument("--output", help="write the result as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown per stage")
+    args = parser.parse_args()
+
+    if args.record:
+        if os.path.exists(args.record):
+            os.remove(args.record)
+        os.environ.update(LLM_CASSETTE_MODE="record", LLM_CASSETTE=args.record)
+        if args.fake:
+            serve_in_background(args.llm_port, 0.2, latency_dist="lognormal", token_rate=800)
+            os.environ.update(GROQ_BASE_URL=f"http://127.0.0.1:{args.llm_port}", GROQ_API_KEY="bench")
+    else:
+        os.environ.update(
+            LLM_CASSETTE_MODE="synthetic" if args.synthetic else "replay",
+            LLM_SYNTHESIZER="fake_llm_server:fake_content",
+            LLM_CASSETTE=args.cassette,
+            LLM_CASSETTE_LATENCY=str(args.latency_scale)
+        )
+    # Every call must reach the provider (or cassette) in the same order each run
+    os.environ.update(RESPONSE_CACHE_SIZE="0", LLM_HEDGE="false", SPECULATIVE_QUESTIONS="false", WS_PREFETCH_MIN_SHARE="0")
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
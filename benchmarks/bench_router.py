@@ -0,0 +1,110 @@
+"""
+Model router against two local fake providers.
+
+"primary" is the preferred backend and "backup" the fallback, each a
+fake_llm_server process. Every scenario runs the same concurrent
+completions for the question stage, first routed to the primary alone,
+then to primary with backup as fallback:
+
+- slow-tail: the primary's latency is lognormal with a long tail;
+  the router hedges calls that pass its p95 on the backup.
+- degraded: the primary is 5x slower than the backup; the router moves
+  traffic to the backup and probes the primary now and then.
+- failing: 30% of the primary's calls fail with a 503; the router fails
+  over instead of spending a backoff round.
+
+    python benchmarks/bench_router.py --calls 400 --concurrency 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+
+SCENARIOS = {
+    "slow-tail": ({"latency": 0.2, "latency_dist": "lognormal"}, {"latency": 0.2}),
+    "degraded": ({"latency": 1.0}, {"latency": 0.2}),
+    "failing": ({"latency": 0.2, "error_rate": 0.3}, {"latency": 0.2}),
+}
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+
+async def run(routes, backends, calls, concurrency):
+    import llm_engine
+    import metrics
+    from model_router import ModelRouter, set_router
+
+    router = ModelRouter(backends, routes)
+    set_router(router)
+    metrics.llm_hedges.values.clear()
+    metrics.llm_failovers.values.clear()
+    limit = asyncio.Semaphore(concurrency)
+    latencies, failed = [], 0
+
+    async def one(i):
+        nonlocal failed
+        async with limit:
+            started = time.perf_counter()
+            try:
+                await llm_engine._complete(f"Return the next \"question\" for case {i}", 0.7, "question")
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    await router.aclose()
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "failed": failed,
+        "hedges": sum(metrics.llm_hedges.values.values()),
+        "failovers": sum(metrics.llm_failovers.values.values()),
+        "backends": router.snapshot()
+    }
+
+
+async def run_all(args):
+    port = args.port
+    for name, (primary, backup) in SCENARIOS.items():
+        serve_in_background(port, **primary)
+        serve_in_background(port + 1, **backup)
+        backends = {
+            "primary": {"kind": "groq", "base_url": f"http://127.0.0.1:{port}", "api_key_env": "GROQ_API_KEY"},
+            "backup": {"kind": "groq", "base_url": f"http://127.0.0.1:{port + 1}", "api_key_env": "GROQ_API_KEY"}
+        }
+        for mode, routes in (
+            ("single", {"default": ["primary:fake-8b"]}),
+            ("routed", {"default": ["primary:fake-8b", "backup:fake-8b"]}),
+        ):
+            result = await run(routes, backends, args.calls, args.concurrency)
+            print(
+                f"{name:>10} {mode:>7}: p50 {result['p50']:7.1f}ms  p95 {result['p95']:7.1f}ms  "
+                f"p99 {result['p99']:7.1f}ms  failed {result['failed']:3d}  "
+                f"hedges {result['hedges']:3d}  failovers {result['failovers']:3d}"
+            )
+        port += 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--port", type=int, default=9110)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("LLM_MAX_RETRIES", "1")
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
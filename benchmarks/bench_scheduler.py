@@ -0,0 +1,89 @@
+"""
+Burst of concurrent sessions against a throttling provider, with and
+without client-side pacing.
+
+The fake completion server enforces --rpm (429 + Retry-After) and fails
+--error-rate of requests with a 503. Both modes run the same session
+shape through llm_engine (/start = 2 LLM calls, each /answer = 3):
+
+- reactive: no client-side budget; the scheduler only backs off after 429s.
+- paced: the scheduler's request bucket matches the provider's rpm.
+
+Each session uses a distinct message so only genuinely identical prompts
+are coalesced.
+
+    python benchmarks/bench_scheduler.py --sessions 100 --rpm 1200 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+
+
+async def run(sessions, answers, rpm):
+    import llm_engine
+    from llm_scheduler import scheduler, current_priority, TokenBucket
+
+    scheduler.requests = TokenBucket(rpm)
+    scheduler.stats = dict.fromkeys(scheduler.stats, 0)
+
+    async def session(i):
+        intent = await llm_engine.extract_intent_and_hypotheses(f"my wifi keeps dropping every evening ({i})")
+        hypotheses = intent["hypotheses"]
+        question = await llm_engine.generate_adaptive_question(intent["main_issue"], hypotheses, [], [])
+        current_priority.set("answer")
+        history, asked = [], [question["question"]]
+        for _ in range(answers):
+            history.append({"question": asked[-1], "answer": question["options"][0]})
+            hypotheses = await llm_engine.update_hypotheses(intent["main_issue"], hypotheses, asked[-1], history[-1]["answer"])
+            await llm_engine.evaluate_confidence(intent["main_issue"], hypotheses, len(history))
+            question = await llm_engine.generate_adaptive_question(intent["main_issue"], hypotheses, history, asked)
+            asked.append(question["question"])
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(session(i) for i in range(sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = sum(isinstance(r, Exception) for r in results)
+    return elapsed, failed, scheduler.snapshot()
+
+
+async def run_all(args):
+    import llm_engine
+
+    for name, rpm in (("reactive", 0), ("paced", args.rpm)):
+        elapsed, failed, stats = await run(args.sessions, args.answers, rpm)
+        print(
+            f"{name:>9}: {elapsed:6.2f}s  {args.sessions - failed}/{args.sessions} sessions ok  "
+            f"429s {stats['throttled']:4d}  coalesced {stats['coalesced']:4d}  "
+            f"avg wait {stats['avg_wait_seconds']:.3f}s  max queue {stats['max_queue_depth']}"
+        )
+        await asyncio.sleep(10)  # let the provider's burst allowance refill
+    await llm_engine.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+
+    serve_in_background(args.port, args.latency, rpm=args.rpm, error_rate=args.error_rate)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+    os.environ.setdefault("CONFIDENCE_BORDERLINE_BAND", "1")  # every confidence check calls the model
+
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Memory per live session: the old plain-dict session vs. the compact
+slotted Session, which stores each question and picked option once.
+
+Both build the same sessions from freshly parsed model JSON (so no string
+is shared by accident): intent with 4 hypotheses, then --turns questions
+with options and likelihoods, each answered by a fresh request string.
+Every session gets its own question text, as the model writes each one
+fresh. Memory is measured with tracemalloc.
+
+The compact sessions are then deleted from the store; whatever they leave
+behind (e.g. strings kept in a process-wide table) must stay under
+--retained-budget bytes per session, or the benchmark exits non-zero.
+String lifetimes differ between Python versions, so run it under the
+image's Python too:
+
+    python benchmarks/bench_session_memory.py --sessions 5000 --turns 6
+    docker run --rm -v "$PWD":/app -w /app python:3.12-slim \
+        sh -c "pip install -q -r requirements.txt && python benchmarks/bench_session_memory.py"
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bayes import apply_vector, build_index, parse_likelihoods, probability_vector
+
+INTENT = json.dumps({
+    "main_issue": "Home wifi keeps dropping every evening on all devices",
+    "risk_level": "low",
+    "hypotheses": [
+        {"name": name, "description": f"{name} would explain drops that come and go during the evening",
+         "probability": 0.25, "key_evidence": [f"signs of {name.lower()}", f"no signs of {name.lower()}"]}
+        for name in ("Router overheating", "Channel interference", "ISP outage", "Old firmware")
+    ]
+})
+
+
+def question_json(turn, seed):
+    options = ["Yes, every time", "Only sometimes", "No, never", "Not sure"]
+    return json.dumps({
+        "question": f"Question {turn}.{seed}: when the wifi drops, do the lights on the router change colour or blink?",
+        "options": options,
+        "why_asking": "Separates a router fault from interference",
+        "likelihoods": {o: [0.7, 0.1, 0.1, 0.1] for o in options}
+    })
+
+
+def legacy_session(turns, seed):
+    """The session shape before the compact representation"""
+    intent = json.loads(INTENT)
+    hypotheses = intent["hypotheses"]
+    probs = probability_vector(hypotheses)
+    session = {
+        "original_message": "my wifi keeps dropping every evening",
+        "main_issue": intent["main_issue"],
+        "risk_level": intent["risk_level"],
+        "domain": "tech",
+        "hypotheses": apply_vector(hypotheses, probs),
+        "probs": probs,
+        "hyp_index": build_index(hypotheses),
+        "likelihoods": None,
+        "questions": [],
+        "trace": [],
+        "answers_history": [],
+        "asked_questions": [],
+        "answer_count": 0
+    }
+    for turn in range(turns):
+        data = json.loads(question_json(turn, seed))
+        session["asked_questions"].append(data["question"])
+        session["likelihoods"] = parse_likelihoods(data, len(hypotheses))
+        session["questions"].append({
+            "question": data["question"], "options": data["options"], "why_asking": data["why_asking"],
+            "likelihoods": {k: list(v) for k, v in session["likelihoods"].items()}
+        })
+        answer = json.loads(json.dumps(data["options"][turn % 4]))
+        session["answers_history"].append({"question": session["asked_questions"][-1], "answer": answer})
+        session["answer_count"] += 1
+    return session
+
+
+def compact_session(turns, seed):
+    return asyncio.run(saved_session(turns, seed))
+
+
+async def saved_session(turns, seed):
+    import session_manager
+
+    session_id, session = session_manager.new_session("my wifi keeps dropping every evening", json.loads(INTENT))
+    for turn in range(turns):
+        data = json.loads(question_json(turn, seed))
+        session_manager.record_question(session, data)
+        answer = json.loads(json.dumps(data["options"][turn % 4]))
+        session_manager.add_answer(session, session["asked_questions"][-1], answer)
+    await session_manager.save_session(session_id, session)
+    return session_id
+
+
+def measure(build, sessions, turns):
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for seed in range(sessions):
+        kept.append(build(turns, seed))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / sessions
+
+
+def retained(sessions, turns, first_seed):
+    """Bytes per session still held once compact sessions are built and deleted again"""
+    import session_manager
+    from session_store import MemorySessionStore
+
+    # An empty store of its own, so the table sizes match between the rounds
+    session_manager.store = MemorySessionStore(3600, 2 * sessions)
+
+    async def churn(seeds):
+        for session_id in [await saved_session(turns, seed) for seed in seeds]:
+            await session_manager.delete_session(session_id)
+
+    # A first round grows the store's tables to size; only the second is
+    # counted, but both are traced so tables the second replaces are subtracted
+    async def rounds():
+        await churn(range(first_seed, first_seed + sessions))
+        before = tracemalloc.get_traced_memory()[0]
+        await churn(range(first_seed + sessions, first_seed + 2 * sessions))
+        return before, tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.start()
+    before, after = asyncio.run(rounds())
+    tracemalloc.stop()
+    return max(after - before, 0) / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--retained-budget", type=float, default=64, help="bytes per deleted session")
+    args = parser.parse_args()
+
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ.setdefault("SESSION_MAX", str(args.sessions * 2))
+    import session_manager
+
+    legacy = measure(legacy_session, args.sessions, args.turns)
+    compact = measure(compact_session, args.sessions, args.turns)
+    print(f"   legacy dict: {legacy:8.0f} bytes/session")
+    print(f"compact Session: {compact:8.0f} bytes/session  ({1 - compact / legacy:.0%} less)")
+    print(f" store estimate: {asyncio.run(session_manager.session_stats())['avg_bytes']:8d} bytes/session")
+
+    # New seeds, so none of this text is already held by the sessions above
+    left = retained(args.sessions, args.turns, args.sessions)
+    status = "ok" if left <= args.retained_budget else "OVER BUDGET"
+    print(f"after deletion: {left:8.0f} bytes/session  (budget {args.retained_budget:.0f})  {status} on Python {sys.version.split()[0]}")
+    if left > args.retained_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
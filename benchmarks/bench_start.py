@@ -0,0 +1,83 @@
+"""
+/start latency with the two-call flow (intent, then first question) and the
+fused single call, through the real endpoint (in process, ASGI transport)
+against the fake completion server.
+
+    python benchmarks/bench_start.py --requests 200 --concurrency 20 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import serve_in_background
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def run(requests, concurrency):
+    import httpx
+    import main
+
+    limit = asyncio.Semaphore(concurrency)
+    samples, failed = [], 0
+
+    async def one(client, i):
+        nonlocal failed
+        async with limit:
+            started = time.perf_counter()
+            response = await client.post("/start", json={"message": f"my wifi keeps dropping every evening ({i})"})
+            if "session_id" not in response.json():
+                failed += 1
+                return
+            samples.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+    return samples, failed
+
+
+async def run_all(args):
+    import main
+    import metrics
+    from model_router import get_router
+
+    await get_router().warm()
+    for name, fused in (("two calls", False), ("fused", True)):
+        main.START_FUSED = fused
+        calls_before = sum(metrics.llm_calls.values.values())
+        samples, failed = await run(args.requests, args.concurrency)
+        calls = sum(metrics.llm_calls.values.values()) - calls_before
+        print(
+            f"{name:>9}: p50 {percentile(samples, 0.5):7.1f}ms  p95 {percentile(samples, 0.95):7.1f}ms  "
+            f"{calls / args.requests:.2f} LLM calls per /start  {failed} failed"
+        )
+    await main.close_llm_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=800)
+    parser.add_argument("--port", type=int, default=9104)
+    args = parser.parse_args()
+
+    serve_in_background(args.port, args.latency, latency_dist="lognormal", token_rate=args.token_rate)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Stopping policies replayed over simulated sessions.
+
+Each simulated session has a hidden true cause among 3-4 hypotheses. Every
+question has 3 options with per-hypothesis likelihoods (how sharply they
+separate causes varies), the user answers as the true cause suggests, and
+probabilities are Bayes-updated with bayes.bayes_update. The confidence
+gate's local verdict is logged per answer. Sessions run to the legacy
+limit (8 answers), so every policy can be replayed with
+stopping_policy.evaluate exactly as logged sessions are.
+
+Reported per policy: answers and estimated LLM calls per session,
+agreement with the logged final diagnosis, and accuracy against the
+hidden cause.
+
+    python benchmarks/bench_stopping.py --sessions 5000
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bayes import bayes_update, normalize
+from confidence_gate import decide
+from stopping_policy import POLICIES, evaluate, make_policy, replay
+
+DOMAINS = {"health": 0.3, "safety": 0.1, "general": 0.3, "tech": 0.3}
+RISKS = {"low": 0.6, "moderate": 0.3, "high": 0.1}
+OPTIONS = ["option a", "option b", "option c"]
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def simulate(rng, max_answers=8):
+    """One logged session (completion log record shape) plus its hidden cause"""
+    n = rng.choice((3, 4))
+    probs = normalize(rng.uniform(0.5, 2.0) for _ in range(n))
+    truth = rng.choices(range(n), weights=probs)[0]
+    domain, risk = _pick(rng, DOMAINS), _pick(rng, RISKS)
+    record = {
+        "domain": domain, "risk_level": risk,
+        "hypotheses": [{"name": f"cause {i}", "probability": 0.0} for i in range(n)],
+        "start": {"probs": list(probs)}, "turns": []
+    }
+    for answers in range(1, max_answers + 1):
+        # Each hypothesis favours one option; sharpness says how well the question separates them
+        sharpness = rng.uniform(0.4, 0.85)
+        favoured = [rng.randrange(len(OPTIONS)) for _ in range(n)]
+        table = {
+            option: [sharpness if favoured[h] == o else (1 - sharpness) / (len(OPTIONS) - 1) for h in range(n)]
+            for o, option in enumerate(OPTIONS)
+        }
+        answer = rng.choices(OPTIONS, weights=[table[o][truth] for o in OPTIONS])[0]
+        probs = bayes_update(probs, table[answer])
+        ranked = sorted(probs, reverse=True)
+        verdict = decide(ranked[0], ranked[1], answers, domain)[0]["verdict"]
+        record["turns"].append({
+            "question": {"question": f"q{answers}", "options": OPTIONS, "likelihoods": table},
+            "answer": answer, "probs": [round(p, 4) for p in probs], "verdict": verdict
+        })
+    top = max(range(n), key=probs.__getitem__)
+    record["top_hypothesis"] = record["hypotheses"][top]["name"]
+    return record, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    simulated = [simulate(rng) for _ in range(args.sessions)]
+    # What the legacy rule would have logged: sessions end where it stopped
+    legacy = make_policy("fixed")
+    records = []
+    for record, truth in simulated:
+        n, _, _ = replay(record, legacy)
+        probs = record["turns"][n - 1]["probs"]
+        records.append(({**record, "turns": record["turns"][:n], "top_hypothesis": f"cause {max(range(len(probs)), key=probs.__getitem__)}"}, truth))
+
+    for name in sorted(POLICIES):
+        policy = make_policy(name)
+        result = evaluate([r for r, _ in records], policy)
+        correct = sum(replay(r, policy)[2] == truth for r, truth in records)
+        health = [(r, t) for r, t in records if r["domain"] == "health"]
+        health_correct = sum(replay(r, policy)[2] == t for r, t in health)
+        print(
+            f"{name:>8}: {result['answers_per_session']:.2f} answers  {result['llm_calls_per_session']:.2f} LLM calls/session  "
+            f"agreement {result['agreement']:.1%}  accuracy {correct / len(records):.1%}  "
+            f"(health {health_correct / len(health):.1%})  {result['stop_reasons']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
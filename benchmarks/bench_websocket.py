@@ -0,0 +1,167 @@
+"""
+REST vs. /ws/diagnose: per-turn latency for the same simulated users, and
+what idle WebSocket connections cost the server.
+
+Starts the fake completion server and the backend (uvicorn main:app) as
+child processes. Each user starts a session, then answers (the first
+option, after --think seconds of reading) until the diagnosis arrives.
+REST users POST /start and then /answer (JSON) or /answer/stream (SSE) on
+their own keep-alive connection; WS users run the same loop over one
+socket, where the next question can be prefetched while they read. A turn
+is timed from the answer being sent until the next question's options (or
+the final response) are complete. Streamed turns pay the fake provider's
+token pacing, so compare the WS flow with rest_stream.
+
+--idle N then opens N sockets that each start a session and stay open,
+and reports the backend's resident memory per connection.
+
+    python benchmarks/bench_websocket.py --users 50 --think 0.5 --idle 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm_server import serve_in_background
+from load_test import MESSAGES, percentiles, start_backend
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def rest_user(base_url, i, think, turns):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        data = (await client.post("/start", json={"message": f"{MESSAGES[i % len(MESSAGES)]} (user {i})"})).json()
+        session_id = data["session_id"]
+        while True:
+            await asyncio.sleep(think)
+            started = time.perf_counter()
+            data = (await client.post("/answer", json={
+                "session_id": session_id,
+                "selected_option": data["options"][0],
+                "question_number": data.get("question_number")
+            })).json()
+            turns.append(time.perf_counter() - started)
+            if data.get("status") != "continue":
+                return
+
+
+async def rest_stream_user(base_url, i, think, turns):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        data = (await client.post("/start", json={"message": f"{MESSAGES[i % len(MESSAGES)]} (user {i})"})).json()
+        session_id, options, number = data["session_id"], data["options"], data.get("question_number")
+        while options:
+            await asyncio.sleep(think)
+            started = time.perf_counter()
+            request = {"session_id": session_id, "selected_option": options[0], "question_number": number}
+            options = None
+            async with client.stream("POST", "/answer/stream", json=request) as response:
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: "):
+                        data = json.loads(line[6:])
+                        if event == "question":
+                            number = data["question_number"]
+                        elif event == "options":
+                            options = data["options"]
+                        elif event == "error":
+                            raise RuntimeError(data["error"])
+            turns.append(time.perf_counter() - started)
+
+
+async def read_turn(ws):
+    """Events up to done: (options, question number), options None once the diagnosis is in"""
+    options = number = None
+    while True:
+        event = json.loads(await ws.recv())
+        if event["type"] == "error":
+            raise RuntimeError(event["error"])
+        if event["type"] == "question":
+            number = event["question_number"]
+        elif event["type"] == "options":
+            options = event["options"]
+        elif event["type"] == "done":
+            return options, number
+
+
+async def ws_user(ws_url, i, think, turns):
+    async with websockets.connect(ws_url, max_queue=None) as ws:
+        await ws.send(json.dumps({"type": "start", "message": f"{MESSAGES[i % len(MESSAGES)]} (user {i})"}))
+        options, number = await read_turn(ws)
+        while options:
+            await asyncio.sleep(think)
+            started = time.perf_counter()
+            await ws.send(json.dumps({"type": "answer", "selected_option": options[0], "question_number": number}))
+            options, number = await read_turn(ws)
+            turns.append(time.perf_counter() - started)
+
+
+async def idle(ws_url, count, backend_pid):
+    before = rss_bytes(backend_pid)
+    sockets = []
+    try:
+        for i in range(count):
+            ws = await websockets.connect(ws_url, max_queue=None)
+            sockets.append(ws)
+            await ws.send(json.dumps({"type": "start", "message": f"{MESSAGES[i % len(MESSAGES)]} (idle {i})"}))
+        await asyncio.gather(*(read_turn(ws) for ws in sockets))
+        after = rss_bytes(backend_pid)
+    finally:
+        await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    return {"connections": count, "rss_bytes_per_connection": round((after - before) / count)}
+
+
+async def run(args, backend_pid):
+    base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = f"ws://127.0.0.1:{args.port}/ws/diagnose"
+    result = {}
+    users = (("rest", rest_user, base_url), ("rest_stream", rest_stream_user, base_url), ("websocket", ws_user, ws_url))
+    for name, user, url in users:
+        turns = []
+        started = time.perf_counter()
+        await asyncio.gather(*(user(url, i, args.think, turns) for i in range(args.users)))
+        result[name] = {"elapsed_s": round(time.perf_counter() - started, 1), "turn_ms": percentiles(turns)}
+    if args.idle:
+        result["idle"] = await idle(ws_url, args.idle, backend_pid)
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        result["speculation"] = (await client.get("/debug/stats")).json().get("speculation")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--think", type=float, default=0.5, help="seconds each user reads a question")
+    parser.add_argument("--idle", type=int, default=0, help="idle WebSocket sessions to hold open")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=800)
+    parser.add_argument("--port", type=int, default=8105)
+    parser.add_argument("--llm-port", type=int, default=9105)
+    args = parser.parse_args()
+
+    serve_in_background(args.llm_port, args.latency, latency_dist="lognormal", token_rate=args.token_rate)
+    backend = start_backend(args.port, args.llm_port, 1, cache=False)
+    try:
+        result = asyncio.run(run(args, backend.pid))
+    finally:
+        backend.terminate()
+        backend.wait()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Local fake Groq/OpenAI-compatible completion server for benchmarks.
+
+Answers POST /openai/v1/chat/completions with canned content shaped like
+each llm_engine stage expects, so benchmarks can run without network
+access or API quota.
+
+Each reply waits a sampled latency (--latency-dist fixed, uniform or
+lognormal around --latency) plus completion tokens / --token-rate.
+--malformed-rate breaks that share of JSON replies the way models do
+(truncated, wrapped in prose, trailing commas, single quotes).
+
+With --rpm it throttles like the real provider: requests over the budget
+(per minute, bursts of up to 10 seconds' worth) get a 429 with Retry-After.
+--error-rate makes that share of requests fail with a 503.
+
+    python benchmarks/fake_llm_server.py --port 9100 --latency 0.2
+    python benchmarks/fake_llm_server.py --port 9100 --rpm 600 --error-rate 0.02
+    python benchmarks/fake_llm_server.py --latency 0.3 --latency-dist lognormal --token-rate 800 --malformed-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+app.state.latency = 0.2
+app.state.latency_dist = "fixed"
+app.state.token_rate = 0.0
+app.state.malformed_rate = 0.0
+app.state.rpm = 0
+app.state.error_rate = 0.0
+app.state.allowance = 0.0
+app.state.updated = time.monotonic()
+
+INTENT = {
+    "main_issue": "Home wifi keeps dropping",
+    "risk_level": "low",
+    "hypotheses": [
+        {"name": "Router overheating", "description": "Router shuts down when hot", "probability": 0.4,
+         "key_evidence": ["drops after long use", "router feels hot"]},
+        {"name": "Channel interference", "description": "Neighbour networks on the same channel", "probability": 0.35,
+         "key_evidence": ["worse in the evening", "many networks nearby"]},
+        {"name": "ISP outage", "description": "Provider side connection loss", "probability": 0.25,
+         "key_evidence": ["modem lights go red", "all devices drop together"]}
+    ]
+}
+
+QUESTION = {
+    "question": "When the wifi drops, do all your devices lose connection at the same time?",
+    "options": ["Yes, all at once", "Only some devices", "Not sure"],
+    "reasoning": "Separates a router or ISP problem from device interference"
+}
+
+FINAL = "Yeah, probably router overheating. Move it somewhere with airflow. Call your ISP if it keeps happening."
+
+
+def fake_content(prompt):
+    """Pick a canned reply based on which engine stage built the prompt"""
+    if '"results"' in prompt:
+        # Packed intent prompt: one result per numbered enquiry line
+        enquiries = re.findall(r'^\[(\d+)\] (".*")$', prompt, flags=re.M)
+        return json.dumps({"results": [
+            {"id": int(n), **INTENT, "main_issue": json.loads(message)[:120]} for n, message in enquiries
+        ]})
+    if '"first_question"' in prompt:
+        # Fused /start prompt: intent plus the opening question
+        message = re.search(r'User\'s problem:\s*"(.*?)"\s*$', prompt, flags=re.M | re.S)
+        likelihoods = {option: [0.7 if i == j else 0.15 for j in range(3)] for i, option in enumerate(QUESTION["options"])}
+        return json.dumps({
+            **INTENT, "main_issue": message.group(1)[:120] if message else INTENT["main_issue"],
+            "first_question": {**QUESTION, "likelihoods": likelihoods}
+        })
+    if '"main_issue"' in prompt:
+        # Echo the user's message so later prompts differ between sessions
+        message = re.search(r'User\'s problem:\s*"(.*?)"\s*$', prompt, flags=re.M | re.S)
+        return json.dumps({**INTENT, "main_issue": message.group(1)[:120]} if message else INTENT)
+    if '"updated_hypotheses"' in prompt:
+        names = re.findall(r"^- (.+?): .*\(current: ", prompt, flags=re.M)
+        updates = [
+            {"name": name, "new_probability": round(0.6 if i == 0 else 0.4 / max(len(names) - 1, 1), 2),
+             "reasoning": "fake update"}
+            for i, name in enumerate(names)
+        ]
+        return json.dumps({"updated_hypotheses": updates})
+    if '"confidence_score"' in prompt:
+        return json.dumps({"confidence_score": 0.7, "verdict": "CONTINUE", "reasoning": "fake verdict"})
+    if '"question"' in prompt or "Numbered hypotheses" in prompt:
+        n = len(re.findall(r"^H\d+\. ", prompt, flags=re.M)) or 3
+        likelihoods = {
+            option: [round(0.7 if i == j else 0.3 / max(n - 1, 1), 2) for j in range(n)]
+            for i, option in enumerate(QUESTION["options"])
+        }
+        return "```json\n" + json.dumps({**QUESTION, "likelihoods": likelihoods}) + "\n```"
+    return FINAL
+
+
+def _malformed(content):
+    """Damage a JSON reply in one of the ways real models do"""
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0:
+        return content
+    body = content[start:end + 1]
+    return random.choice((
+        lambda: body[:len(body) * 2 // 3],
+        lambda: "Sure! Here is the JSON you asked for:\n" + body + "\nLet me know if you need anything else.",
+        lambda: body.replace('"]', '",]').replace("}]", "},]"),
+        lambda: body.replace('"', "'")
+    ))()
+
+
+def _latency():
+    """One sample of the provider's processing time, before token generation"""
+    mean = app.state.latency
+    if app.state.latency_dist == "uniform":
+        return random.uniform(0, 2 * mean)
+    if app.state.latency_dist == "lognormal":
+        # sigma 0.5 gives a p99 about 3x the median, roughly what hosted models show
+        return random.lognormvariate(math.log(mean) - 0.125, 0.5) if mean > 0 else 0.0
+    return mean
+
+
+def _generation_time(completion_tokens):
+    return completion_tokens / app.state.token_rate if app.state.token_rate else 0.0
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }) + "\n\n"
+
+
+async def _stream(content, model, latency):
+    """
+    Emit content in small pieces; the first token arrives after 20% of the
+    latency, the rest is spread over the remainder plus generation time
+    """
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    pieces = [content[i:i + 8] for i in range(0, len(content), 8)] or [""]
+    per_piece = (latency * 0.8 + _generation_time(len(content) // 4)) / len(pieces)
+    await asyncio.sleep(latency * 0.2)
+    yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+    for piece in pieces:
+        yield _chunk(completion_id, model, {"content": piece})
+        await asyncio.sleep(per_piece)
+    yield _chunk(completion_id, model, {}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+def _throttled():
+    """Seconds the caller should wait if this request is over the rpm budget, else 0"""
+    if not app.state.rpm:
+        return 0
+    rate = app.state.rpm / 60
+    now = time.monotonic()
+    app.state.allowance = min(rate * 10, app.state.allowance + (now - app.state.updated) * rate)
+    app.state.updated = now
+    if app.state.allowance < 1:
+        return (1 - app.state.allowance) / rate
+    app.state.allowance -= 1
+    return 0
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    wait = _throttled()
+    if wait:
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429, headers={"retry-after": f"{wait:.2f}"}
+        )
+    if random.random() < app.state.error_rate:
+        return JSONResponse({"error": {"message": "Service unavailable", "type": "internal_server_error"}}, status_code=503)
+    body = await request.json()
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+    content = fake_content(prompt)
+    if content is not FINAL and random.random() < app.state.malformed_rate:
+        content = _malformed(content)
+    if body.get("stream"):
+        return StreamingResponse(_stream(content, body.get("model", "fake"), _latency()), media_type="text/event-stream")
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    await asyncio.sleep(_latency() + _generation_time(completion_tokens))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def serve_in_background(port=9100, latency=0.2, **options):
+    """
+    Start the fake server in a child process and wait until it accepts requests.
+    options are command line flags, e.g. rpm=600 for --rpm 600.
+    """
+    import atexit
+    import subprocess
+    import sys
+    import httpx
+
+    flags = [arg for name, value in options.items() for arg in (f"--{name.replace('_', '-')}", str(value))]
+    proc = subprocess.Popen([sys.executable, __file__, "--port", str(port), "--latency", str(latency), *flags])
+    atexit.register(proc.terminate)
+    while True:
+        try:
+            httpx.post(f"http://127.0.0.1:{port}/openai/v1/chat/completions", json={"messages": []})
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per completion before token generation")
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="fixed")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="completion tokens per second (0 = instant)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of JSON replies returned broken")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.latency_dist = args.latency_dist
+    app.state.token_rate = args.token_rate
+    app.state.malformed_rate = args.malformed_rate
+    app.state.rpm = args.rpm
+    app.state.allowance = args.rpm / 6
+    app.state.error_rate = args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,248 @@
+"""
+End-to-end load test: N concurrent simulated users through the HTTP API.
+
+Starts the fake completion server and the backend (uvicorn main:app) as
+child processes, then runs sessions of /start followed by /answer until
+the backend answers status "completed". Reports throughput, client-side
+p50/p95/p99 per endpoint and per-stage engine timings scraped from
+/metrics.
+
+    python benchmarks/load_test.py --sessions 200 --concurrency 50
+    python benchmarks/load_test.py --output benchmarks/baseline.json
+    python benchmarks/load_test.py --compare benchmarks/baseline.json
+
+--compare exits non-zero when throughput or an endpoint's p95 is more than
+--tolerance worse than the baseline. Compare runs with the same settings
+(the baseline records them) on a comparable machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm_server import serve_in_background
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    "my wifi keeps dropping every evening",
+    "the kitchen sink drains really slowly since last week",
+    "I get a headache every afternoon at work",
+    "my laptop fan is loud and it shuts down randomly",
+    "there is a musty smell in the basement after rain",
+    "my car makes a clicking noise when I turn the key",
+    "I feel dizzy when I stand up quickly",
+    "the fridge is making a buzzing sound at night"
+]
+
+# Settings that must match for two runs to be comparable
+SETTINGS = ("sessions", "concurrency", "latency", "latency_dist", "token_rate", "malformed_rate", "workers", "cache", "seed")
+
+
+def percentiles(samples):
+    """Nearest-rank p50/p95/p99 in milliseconds"""
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+    return {"count": len(ordered), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+_BUCKET = re.compile(r'^(\w+)_bucket\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def histogram_percentiles(metrics_text, name, by="stage"):
+    """p50/p95/p99 in milliseconds from a Prometheus histogram, merged per `by` label"""
+    buckets = {}  # label value -> {upper bound: cumulative count}
+    for line in metrics_text.splitlines():
+        match = _BUCKET.match(line)
+        if not match or match.group(1) != name:
+            continue
+        labels = dict(_LABEL.findall(match.group(2)))
+        series = buckets.setdefault(labels[by], {})
+        bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        series[bound] = series.get(bound, 0) + float(match.group(3))
+
+    result = {}
+    for key, series in sorted(buckets.items()):
+        bounds = sorted(series)
+        total = series[bounds[-1]]
+        result[key] = {"count": int(total)}
+        for label, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            result[key][label] = round(_bucket_quantile(bounds, series, q * total) * 1000, 1) if total else 0.0
+    return result
+
+
+def _bucket_quantile(bounds, series, rank):
+    """Linear interpolation inside the bucket holding rank, like histogram_quantile()"""
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        if series[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(series[bound] - below, 1e-9)
+        lower, below = bound, series[bound]
+    return lower
+
+
+async def run_session(client, rng, timings, outcomes):
+    started = time.perf_counter()
+    response = await client.post("/start", json={"message": f"{rng.choice(MESSAGES)} (user {rng.random():.6f})"})
+    timings["start"].append(time.perf_counter() - started)
+    data = response.json()
+    if response.status_code != 200 or "session_id" not in data:
+        outcomes["failed"] += 1
+        return
+
+    while True:
+        started = time.perf_counter()
+        response = await client.post("/answer", json={
+            "session_id": data["session_id"],
+            "selected_option": rng.choice(data.get("options") or ["Not sure"])
+        })
+        elapsed = time.perf_counter() - started
+        answer = response.json()
+        if response.status_code != 200 or "error" in answer:
+            outcomes["failed"] += 1
+            return
+        if answer["status"] == "completed":
+            timings["answer_final"].append(elapsed)
+            outcomes["completed"] += 1
+            return
+        timings["answer"].append(elapsed)
+        data = {**answer, "session_id": data["session_id"]}
+
+
+async def drive(base_url, sessions, concurrency, seed):
+    timings = {"start": [], "answer": [], "answer_final": []}
+    outcomes = {"completed": 0, "failed": 0}
+    rng = random.Random(seed)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(client, session_rng):
+        async with limit:
+            try:
+                await run_session(client, session_rng, timings, outcomes)
+            except httpx.HTTPError:
+                outcomes["failed"] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, random.Random(rng.random())) for _ in range(sessions)))
+        elapsed = time.perf_counter() - started
+        metrics_text = (await client.get("/metrics")).text
+
+    requests = sum(len(t) for t in timings.values())
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "sessions_per_second": round(outcomes["completed"] / elapsed, 2),
+        "requests_per_second": round(requests / elapsed, 2),
+        **outcomes,
+        "endpoints": {name: percentiles(samples) for name, samples in timings.items()},
+        "stages": histogram_percentiles(metrics_text, "llm_stage_seconds"),
+        "provider": histogram_percentiles(metrics_text, "llm_model_seconds")
+    }
+
+
+def start_backend(port, llm_port, workers, cache):
+    env = {
+        **os.environ,
+        "GROQ_BASE_URL": f"http://127.0.0.1:{llm_port}",
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench")
+    }
+    if not cache:
+        # Simulated users repeat a handful of problems; measure the uncached path
+        env["RESPONSE_CACHE_SIZE"] = "0"
+    if workers > 1:
+        env.setdefault("SESSION_STORE", "sqlite")
+        env.setdefault("SESSION_SQLITE_PATH", os.path.join(ROOT, "loadtest_sessions.db"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health")
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("backend did not start")
+
+
+def compare(result, baseline, tolerance):
+    """Print deltas against a baseline; returns the list of regressions"""
+    mismatched = [k for k in SETTINGS if baseline["settings"].get(k) != result["settings"].get(k)]
+    if mismatched:
+        print(f"warning: settings differ from baseline ({', '.join(mismatched)})")
+
+    regressions = []
+    checks = [("sessions/s", baseline["sessions_per_second"], result["sessions_per_second"], True)]
+    for name, stats in baseline["endpoints"].items():
+        checks.append((f"{name} p95 ms", stats["p95"], result["endpoints"][name]["p95"], False))
+    for label, old, new, higher_is_better in checks:
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        print(f"{label:>20}: {old:10.1f} -> {new:10.1f}  ({change:+.0%}) {flag}")
+        if flag:
+            regressions.append(label)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="sessions in flight at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean provider latency in seconds")
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--token-rate", type=float, default=800, help="provider completion tokens per second")
+    parser.add_argument("--malformed-rate", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="keep the backend's response caches on")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-port", type=int, default=9102)
+    parser.add_argument("--output", help="write the result as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    serve_in_background(
+        args.llm_port, args.latency,
+        latency_dist=args.latency_dist, token_rate=args.token_rate, malformed_rate=args.malformed_rate
+    )
+    backend = start_backend(args.port, args.llm_port, args.workers, args.cache)
+    try:
+        result = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.sessions, args.concurrency, args.seed))
+    finally:
+        backend.terminate()
+        backend.wait()
+    result = {"settings": {k: getattr(args, k) for k in SETTINGS}, **result}
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
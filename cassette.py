@@ -0,0 +1,268 @@
+"""
+Record and replay LLM completions, so the engine can be benchmarked and
+regression-tested offline and deterministically.
+
+LLM_CASSETTE_MODE picks what model_router.make_client hands out:
+
+- record: the real SDK client, with every completion (prompt hash, content,
+  latency, time to first token, token counts) appended to LLM_CASSETTE.
+- replay: completions served from LLM_CASSETTE, never touching the network.
+  A prompt that was never recorded raises CassetteMiss.
+- synthetic: completions generated by LLM_SYNTHESIZER ("module:function",
+  called with the prompt text, e.g. benchmarks/fake_llm_server:fake_content
+  with benchmarks/ on the path), with latencies drawn from LLM_CASSETTE's
+  recorded profile when it exists. There is no default synthesizer.
+
+Replayed and synthetic latency is scaled by LLM_CASSETTE_LATENCY (1 is the
+recorded latency, 0 answers immediately). Recordings are keyed on the
+messages and temperature, not the model, so a cassette survives route
+changes; a prompt recorded more than once replays its recordings in order.
+The file uses completion_log's CRC-framed records.
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+from completion_log import encode_record, iter_frames
+from config import LLM_CASSETTE, LLM_CASSETTE_MODE, LLM_CASSETTE_LATENCY, LLM_SYNTHESIZER
+from prompt_builder import estimate_tokens
+
+MODES = ("off", "record", "replay", "synthetic")
+CHUNK_CHARS = 8  # stream piece size when the recording wasn't streamed
+
+
+class CassetteMiss(LookupError):
+    """A replayed prompt that was never recorded (the prompt changed, or the cassette is stale)"""
+
+
+def cassette_key(messages, temperature):
+    raw = json.dumps([messages, temperature], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+class Cassette:
+    """Recorded completions by prompt key, loaded from and appended to one file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = defaultdict(list)
+        self.served = defaultdict(int)
+        self._file = None
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0, "synthesized": 0}
+        if path and os.path.exists(path):
+            for entry in iter_frames(path):
+                self.entries[entry["key"]].append(entry)
+
+    def latencies(self):
+        return [(e["latency"], e.get("first_token")) for entries in self.entries.values() for e in entries]
+
+    def lookup(self, key):
+        entries = self.entries.get(key)
+        if not entries:
+            self.stats["misses"] += 1
+            raise CassetteMiss(f"no recording for prompt {key} in {self.path}")
+        entry = entries[self.served[key] % len(entries)]
+        self.served[key] += 1
+        self.stats["hits"] += 1
+        return entry
+
+    def record(self, entry):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(encode_record(entry))
+        self._file.flush()
+        self.entries[entry["key"]].append(entry)
+        self.stats["recorded"] += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def snapshot(self):
+        return {**self.stats, "prompts": len(self.entries), "mode": LLM_CASSETTE_MODE}
+
+
+def _completion(entry, model):
+    return ChatCompletion.model_validate({
+        "id": f"cassette-{entry['key']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": entry["content"]}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": entry["prompt_tokens"],
+            "completion_tokens": entry["completion_tokens"],
+            "total_tokens": entry["prompt_tokens"] + entry["completion_tokens"]
+        }
+    })
+
+
+def _chunk(entry, model, delta, finish_reason=None):
+    return ChatCompletionChunk.model_validate({
+        "id": f"cassette-{entry['key']}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    })
+
+
+class _Models:
+    async def list(self):
+        return []
+
+
+class ReplayClient:
+    """
+    Stands in for AsyncGroq/AsyncOpenAI: chat.completions.create serves
+    recorded (or synthesized) completions with their scaled latency.
+    """
+
+    def __init__(self, cassette, latency_scale=LLM_CASSETTE_LATENCY, synthesize=None, seed=0):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.synthesize = synthesize
+        self.rng = random.Random(seed)
+        self.profile = cassette.latencies()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = _Models()
+
+    def with_options(self, **options):
+        return self
+
+    def _entry(self, messages, temperature):
+        key = cassette_key(messages, temperature)
+        if not self.synthesize:
+            return self.cassette.lookup(key)
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        content = self.synthesize(prompt)
+        latency, first_token = self.rng.choice(self.profile) if self.profile else (0.0, None)
+        self.cassette.stats["synthesized"] += 1
+        return {
+            "key": key, "content": content, "latency": latency, "first_token": first_token,
+            "prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)
+        }
+
+    async def create(self, model, messages, temperature=None, stream=False, **options):
+        entry = self._entry(messages, temperature)
+        if stream:
+            return self._stream(entry, model)
+        if self.latency_scale:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return _completion(entry, model)
+
+    async def _stream(self, entry, model):
+        content = entry["content"]
+        sizes = entry.get("chunks") or [CHUNK_CHARS] * (len(content) // CHUNK_CHARS + 1)
+        first_token = entry.get("first_token") or entry["latency"]
+        per_chunk = max(entry["latency"] - first_token, 0.0) / len(sizes) * self.latency_scale
+        if self.latency_scale:
+            await asyncio.sleep(first_token * self.latency_scale)
+        yield _chunk(entry, model, {"role": "assistant", "content": ""})
+        offset = 0
+        for size in sizes:
+            yield _chunk(entry, model, {"content": content[offset:offset + size]})
+            offset += size
+            if per_chunk:
+                await asyncio.sleep(per_chunk)
+        yield _chunk(entry, model, {}, "stop")
+
+    async def close(self):
+        pass
+
+
+class RecordingClient:
+    """Wraps a real SDK client and records every completion it returns"""
+
+    def __init__(self, client, cassette):
+        self.client = client
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = client.models
+
+    def with_options(self, **options):
+        return self.client.with_options(**options)
+
+    async def create(self, model, messages, temperature=None, stream=False, **options):
+        started = time.perf_counter()
+        response = await self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, stream=stream, **options
+        )
+        if stream:
+            return self._stream(response, started, messages, temperature)
+        usage = response.usage
+        self.cassette.record({
+            "key": cassette_key(messages, temperature),
+            "content": response.choices[0].message.content or "",
+            "latency": round(time.perf_counter() - started, 4),
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0
+        })
+        return response
+
+    async def _stream(self, stream, started, messages, temperature):
+        pieces, first_token = [], None
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if first_token is None:
+                    first_token = round(time.perf_counter() - started, 4)
+                pieces.append(delta)
+            yield chunk
+        content = "".join(pieces)
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        self.cassette.record({
+            "key": cassette_key(messages, temperature),
+            "content": content,
+            "latency": round(time.perf_counter() - started, 4),
+            "first_token": first_token,
+            "chunks": [len(p) for p in pieces],
+            # Streams don't report usage; estimate like the scheduler does
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(content)
+        })
+
+    async def close(self):
+        await self.client.close()
+        self.cassette.close()
+
+
+_cassette = None
+
+
+def active_cassette():
+    """The process-wide cassette every backend shares (None when LLM_CASSETTE_MODE is off)"""
+    global _cassette
+    if LLM_CASSETTE_MODE not in MODES:
+        raise ValueError(f"Unknown LLM_CASSETTE_MODE: {LLM_CASSETTE_MODE}")
+    if LLM_CASSETTE_MODE != "off" and _cassette is None:
+        _cassette = Cassette(LLM_CASSETTE)
+    return _cassette
+
+
+def load_synthesizer(spec=LLM_SYNTHESIZER):
+    module, _, name = spec.partition(":")
+    if not module or not name:
+        raise ValueError(f"LLM_CASSETTE_MODE=synthetic needs LLM_SYNTHESIZER as module:function, got {spec!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+def cassette_client(make_real):
+    """
+    The client model_router uses for one backend: make_real() builds the
+    SDK client, which replay and synthetic modes never need.
+    """
+    cassette = active_cassette()
+    if LLM_CASSETTE_MODE == "replay":
+        return ReplayClient(cassette)
+    if LLM_CASSETTE_MODE == "synthetic":
+        return ReplayClient(cassette, synthesize=load_synthesizer())
+    client = make_real()
+    return RecordingClient(client, cassette) if LLM_CASSETTE_MODE == "record" else client
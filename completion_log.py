@@ -0,0 +1,173 @@
+import glob
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from config import COMPLETION_LOG_DIR, COMPLETION_LOG_SEGMENT_BYTES
+
+# Record frame: payload length and CRC32 (little-endian uint32 each), then
+# the payload: b"j" + compact JSON or b"z" + zlib-compressed compact JSON
+_FRAME = struct.Struct("<II")
+_COMPRESS_OVER = 512
+_BATCH_MAX = 512
+_STOP = object()
+
+
+def session_record(session, final_response, trace=None):
+    """What a finished session asked, what was answered and how it ended"""
+    asked = {q["question"]: q for q in session.get("questions", [])}
+    steps = session.get("trace", []) + ([trace] if trace else [])
+    top = max(session["hypotheses"], key=lambda h: h["probability"]) if session["hypotheses"] else {}
+    return {
+        "completed_at": round(time.time(), 3),
+        "original_message": session["original_message"],
+        "main_issue": session["main_issue"],
+        "domain": session["domain"],
+        "risk_level": session["risk_level"],
+        "hypotheses": [{"name": h["name"], "probability": h["probability"]} for h in session["hypotheses"]],
+        "start": steps[0] if steps else {},
+        # steps[i + 1] is the state after answer i
+        "turns": [
+            {
+                "question": asked.get(turn["question"], {"question": turn["question"]}),
+                "answer": turn["answer"],
+                **(steps[i + 1] if i + 1 < len(steps) else {})
+            }
+            for i, turn in enumerate(session["answers_history"])
+        ],
+        "top_hypothesis": top.get("name", ""),
+        "final_response": final_response
+    }
+
+
+def encode_record(record):
+    raw = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=list).encode()
+    payload = b"z" + zlib.compress(raw, 1) if len(raw) > _COMPRESS_OVER else b"j" + raw
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_payload(payload):
+    raw = zlib.decompress(payload[1:]) if payload[:1] == b"z" else payload[1:]
+    return json.loads(raw)
+
+
+class CompletionLog:
+    """
+    Append-only log of completed sessions in rotating segment files.
+    append() only enqueues; a writer thread encodes and writes whatever has
+    queued up as one batch, so the request path never touches the disk.
+    Every process writes its own segments, so workers never interleave.
+    """
+
+    def __init__(self, directory, segment_bytes=COMPLETION_LOG_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self.stats = {"records": 0, "batches": 0, "bytes": 0, "segments": 0, "errors": 0}
+
+    def append(self, session, final_response, trace=None):
+        if not self.directory:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="completion-log", daemon=True)
+                    self._thread.start()
+        # The record is built on the writer thread; finished sessions are no longer mutated
+        self._queue.put((session, final_response, trace))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < _BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            entries = [entry for entry in batch if entry is not _STOP]
+            if entries:
+                try:
+                    self._write(b"".join(encode_record(session_record(*entry)) for entry in entries))
+                    self.stats["records"] += len(entries)
+                    self.stats["batches"] += 1
+                except (OSError, ValueError, TypeError):
+                    self.stats["errors"] += 1
+            if stop:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, data):
+        if self._file is None or self._size + len(data) > self.segment_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.stats["bytes"] += len(data)
+
+    def _rotate(self):
+        if self._file:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"completions-{time.time_ns() // 1000:016d}-{os.getpid()}.log"
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._size = 0
+        self.stats["segments"] += 1
+
+    def close(self):
+        """Write out everything queued and stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self):
+        return {**self.stats, "queued": self._queue.qsize()}
+
+
+def segments(path):
+    """Segment files under a log directory (or the one file given), oldest first"""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "completions-*.log")))
+
+
+def iter_frames(path):
+    """
+    Decoded records of one framed file, read through mmap. A torn or
+    corrupt tail (e.g. from a crashed writer) ends the file.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + _FRAME.size <= len(data):
+                length, crc = _FRAME.unpack_from(data, offset)
+                end = offset + _FRAME.size + length
+                payload = data[offset + _FRAME.size:end]
+                if end > len(data) or zlib.crc32(payload) != crc:
+                    break
+                yield decode_payload(payload)
+                offset = end
+
+
+def iter_completions(path, since=None):
+    """Stream logged sessions, oldest segment first"""
+    for segment in segments(path):
+        for record in iter_frames(segment):
+            if since is None or record["completed_at"] >= since:
+                yield record
+
+
+completion_log = CompletionLog(COMPLETION_LOG_DIR)
@@ -0,0 +1,53 @@
+from config import CONFIDENCE_BORDERLINE_BAND
+
+# Different thresholds for different issue types
+THRESHOLDS = {
+    "health": {"min_confidence": 0.85, "min_questions": 4, "gap": 0.40},
+    "medical": {"min_confidence": 0.85, "min_questions": 4, "gap": 0.40},
+    "safety": {"min_confidence": 0.80, "min_questions": 3, "gap": 0.35},
+    "general": {"min_confidence": 0.70, "min_questions": 2, "gap": 0.25},
+    "tech": {"min_confidence": 0.65, "min_questions": 2, "gap": 0.20},
+}
+
+# How many confidence checks were decided locally vs. sent to the LLM
+stats = {
+    "local_decisions": 0,
+    "llm_fallbacks": 0
+}
+
+
+def thresholds_for(issue_type):
+    return THRESHOLDS.get(issue_type, THRESHOLDS["general"])
+
+
+def decide(top_prob, second_prob, answers_count, issue_type, band=CONFIDENCE_BORDERLINE_BAND):
+    """
+    Apply the STOP/CONTINUE rules locally.
+    Returns the decision and whether it is borderline enough to ask the LLM.
+    """
+    config = thresholds_for(issue_type)
+    gap = top_prob - second_prob
+
+    stop = (
+        top_prob >= config["min_confidence"] and
+        answers_count >= config["min_questions"] and
+        gap >= config["gap"]
+    )
+
+    # Below the question minimum the answer is always CONTINUE, so only
+    # near-threshold distributions are worth a model opinion
+    borderline = answers_count >= config["min_questions"] and (
+        abs(top_prob - config["min_confidence"]) < band or
+        abs(gap - config["gap"]) < band
+    )
+
+    return {
+        "confidence_score": round(top_prob, 3),
+        "verdict": "STOP" if stop else "CONTINUE",
+        "reasoning": f"confidence {top_prob:.0%}, gap {gap:.0%}, {answers_count} questions ({issue_type} thresholds)"
+    }, borderline
+
+
+def gate_stats():
+    total = stats["local_decisions"] + stats["llm_fallbacks"]
+    return {**stats, "llm_calls_avoided_rate": round(stats["local_decisions"] / total, 3) if total else 0.0}
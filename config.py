@@ -0,0 +1,115 @@
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # None uses the SDK default
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+
+# Providers the router can use, as JSON: {"name": {"kind": "groq" | "openai",
+# "base_url": ..., "api_key_env": "ENV_VAR_WITH_THE_KEY"}}
+LLM_BACKENDS = json.loads(os.getenv("LLM_BACKENDS") or json.dumps({
+    "groq": {"kind": "groq", "base_url": GROQ_BASE_URL, "api_key_env": "GROQ_API_KEY"}
+}))
+# Ordered "backend:model" targets per stage (intent, start, intent_batch,
+# question, update, confidence, final, repair); stages without a route use "default"
+LLM_ROUTES = json.loads(os.getenv("LLM_ROUTES") or json.dumps({"default": [f"groq:{LLM_MODEL}"]}))
+# Send a duplicate to the next target once a call outlives the primary's p95
+# (never sooner than LLM_HEDGE_MIN seconds); 0 disables hedging
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN = float(os.getenv("LLM_HEDGE_MIN", "0.5"))
+# Seconds a target is skipped after repeated failures
+LLM_BACKEND_COOLDOWN = float(os.getenv("LLM_BACKEND_COOLDOWN", "10"))
+
+# Shared HTTP connection pool for all LLM calls
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "100"))
+LLM_KEEPALIVE = int(os.getenv("LLM_KEEPALIVE", "20"))
+# Idle seconds before a pooled connection is closed (httpx defaults to 5)
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# Connections opened per backend at startup so the first requests skip TCP/TLS setup
+LLM_WARM_CONNECTIONS = int(os.getenv("LLM_WARM_CONNECTIONS", "4"))
+
+# Record/replay of LLM calls (see cassette.py): off, record, replay or synthetic
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "llm_cassette.log")
+# Replayed latency as a multiple of the recorded one (0 answers immediately)
+LLM_CASSETTE_LATENCY = float(os.getenv("LLM_CASSETTE_LATENCY", "1"))
+# "module:function" that turns a prompt into a completion; required in synthetic
+# mode (the benchmarks use fake_llm_server:fake_content, which isn't deployed)
+LLM_SYNTHESIZER = os.getenv("LLM_SYNTHESIZER", "")
+
+# Per-call timeout in seconds for a single chat completion
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Jittered backoff between retries: up to base * 2^attempt seconds, capped
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "8"))
+
+# Client-side provider budget per minute (0 = unlimited; match your Groq plan)
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# Calls allowed to wait for a slot before new ones are rejected with 503
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "1000"))
+# Completion tokens assumed when budgeting a call before usage is known
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "250"))
+
+# /start asks for the hypotheses and the first question in one model call
+START_FUSED = os.getenv("START_FUSED", "true").lower() in ("1", "true", "yes")
+
+# /ws/diagnose starts the next question while the user reads the current one
+# when one answer has at least this predicted share (0 = off)
+WS_PREFETCH_MIN_SHARE = float(os.getenv("WS_PREFETCH_MIN_SHARE", "0.5"))
+
+# When a session stops asking: "entropy" (per-domain/risk limits, stops once
+# the hypotheses have collapsed) or "fixed" (STOP verdict after 4 answers, at most 8)
+STOPPING_POLICY = os.getenv("STOPPING_POLICY", "entropy")
+
+# Start next-question generation in /answer before the hypothesis update finishes
+SPECULATIVE_QUESTIONS = os.getenv("SPECULATIVE_QUESTIONS", "false").lower() in ("1", "true", "yes")
+
+# evaluate_confidence asks the LLM only when the top probability or the
+# top-two gap is within this distance of its threshold (0 = never ask)
+CONFIDENCE_BORDERLINE_BAND = float(os.getenv("CONFIDENCE_BORDERLINE_BAND", "0.05"))
+
+# Response cache for intent extraction and first questions (0 entries disables it)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+# Minimum word-shingle Jaccard similarity for a near-duplicate intent hit
+# (0 = exact only). Word overlap can't tell "wifi is working" from "wifi not
+# working", so this is off by default; health, safety and negated messages
+# never near-hit even when it is on
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+# Where sessions live: "memory" (single process), "sqlite" (all workers on one
+# host) or "redis" (any Redis-protocol server, shared across hosts)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))  # idle seconds before a session expires
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))  # in-memory store only
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))  # in-memory store only
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "30"))  # seconds between expiry sweeps
+# Finished /answer responses kept per process to replay duplicate submissions
+ANSWER_REPLAY_SIZE = int(os.getenv("ANSWER_REPLAY_SIZE", "10000"))
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Token budget for the per-turn context of the question prompt (static
+# instructions are sent separately as a cacheable system prefix); over it,
+# answers to the oldest questions are dropped, never the questions themselves
+QUESTION_PROMPT_BUDGET = int(os.getenv("QUESTION_PROMPT_BUDGET", "200"))
+
+# Bulk triage (/batch/start and batch_triage.py): enquiries packed into one
+# intent prompt, and packed prompts in flight at once per batch
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", "8"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Directory for the append-only log of completed sessions (empty = off); it
+# feeds the offline question tree builder and analytics jobs
+COMPLETION_LOG_DIR = os.getenv("COMPLETION_LOG_DIR", "")
+COMPLETION_LOG_SEGMENT_BYTES = int(os.getenv("COMPLETION_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# Prebuilt question trees served without LLM calls (missing file = none)
+QUESTION_TREES_PATH = os.getenv("QUESTION_TREES_PATH", "question_trees.json")
+# Sessions that must share a question (or final answer) before it enters a tree
+QUESTION_TREE_MIN_SUPPORT = int(os.getenv("QUESTION_TREE_MIN_SUPPORT", "5"))
@@ -0,0 +1,44 @@
+import re
+
+# Keyword stems per domain; each stem may take a plural/inflection suffix.
+# Domains are listed strictest-threshold first: when several match, the
+# more conservative one wins.
+DOMAIN_KEYWORDS = {
+    "health": [
+        "vomit", "headache", "fever", "pain", "painful", "sick", "ill", "illness", "symptom", "dizzy", "dizziness",
+        "nausea", "nauseous", "feeling", "health", "disease", "hurt", "ache", "cough", "fatigue",
+        "tired", "rash", "bleed", "bleeding", "breath", "chest", "stomach", "throat", "infection",
+        "swollen", "swelling", "injury", "injured", "medication", "medicine", "doctor", "diarrhea",
+        "migraine", "allergy", "allergic", "anxiety", "insomnia", "pregnant"
+    ],
+    "safety": [
+        "gas", "leak", "smoke", "smoking", "fire", "burning", "burnt", "spark", "sparking",
+        "carbon monoxide", "shock", "electrocuted", "flood", "flooding", "fumes", "explosion",
+        "overheat", "overheating", "mold", "mould", "asbestos", "collapse", "crack in the wall"
+    ],
+    "tech": [
+        "wifi", "wi-fi", "router", "modem", "internet", "laptop", "computer", "pc", "phone",
+        "iphone", "android", "tablet", "app", "software", "printer", "bluetooth", "screen",
+        "battery", "charger", "charging", "keyboard", "mouse", "browser", "email", "password",
+        "update", "crash", "crashing", "error", "bug", "network", "tv", "console", "server", "website"
+    ]
+}
+
+_PATTERN = re.compile(
+    "|".join(
+        rf"(?P<{domain}>\b(?:{'|'.join(re.escape(k) for k in sorted(words, key=len, reverse=True))})(?:s|es|ed|ing)?\b)"
+        for domain, words in DOMAIN_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+_ORDER = list(DOMAIN_KEYWORDS)
+
+
+def classify_domain(*texts):
+    """One of health / safety / tech / general for the given text(s)"""
+    found = {m.lastgroup for m in _PATTERN.finditer(" ".join(t for t in texts if t))}
+    for domain in _ORDER:
+        if domain in found:
+            return domain
+    return "general"
@@ -0,0 +1,176 @@
+import json
+
+_SCALARS = {"true": True, "false": False, "null": None}
+_DELIMITERS = ",:{}[]\"\r\n\t "
+
+
+class JsonStreamParser:
+    """
+    Single-pass, incremental and tolerant JSON object parser for model output.
+
+    - skips anything before the first "{" (prose, ```json fences) and after
+      the matching "}"; a brace in leading prose (e.g. "I think {maybe}" or
+      'a { and "quote" then') is dropped once its object comes out empty or
+      its first key has no ":" after it, and parsing restarts at the next "{"
+    - ignores trailing commas
+    - on truncated output, result() returns everything completed so far
+      with open objects/arrays closed
+
+    feed() returns the top-level fields that completed in that chunk, so
+    callers can act on e.g. "question" before "options" has streamed in.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.done = False
+        self._stack = []  # [container, pending_key] frames
+        self._in_string = False
+        self._escaped = False
+        self._chars = []
+        self._scalar = []
+        self._after_colon = False
+
+    def feed(self, chunk):
+        completed = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(completed)
+                    continue
+                self._chars.append(ch)
+                continue
+
+            if not self._stack:
+                self._open_root(ch)
+                continue
+
+            if ch not in _DELIMITERS:
+                self._scalar.append(ch)
+                continue
+            if self._scalar:
+                self._end_scalar(completed)
+                if not self._stack:
+                    # That word showed the brace was prose; this may be the real one
+                    self._open_root(ch)
+                    continue
+
+            if ch == '"':
+                self._in_string = True
+                self._chars = []
+            elif ch == "{" and self._stray_brace():
+                # "{maybe ... {": the first brace was prose, start over here
+                self._restart()
+                self._open_root(ch)
+            elif ch in "{[":
+                container = {} if ch == "{" else []
+                self._attach(container, completed, announce=False)
+                self._stack.append([container, None])
+                self._after_colon = False
+            elif ch in "}]":
+                finished = self._stack.pop()[0]
+                self._after_colon = False
+                if not self._stack:
+                    if self.root:
+                        self.done = True
+                    else:
+                        self._restart()
+                elif len(self._stack) == 1:
+                    completed.append((self._stack[0][1], finished))
+                    self._stack[0][1] = None
+            elif ch == ":":
+                self._after_colon = True
+            elif ch == ",":
+                self._after_colon = False
+                if isinstance(self._stack[-1][0], dict):
+                    self._stack[-1][1] = None
+        return completed
+
+    def result(self):
+        """The parsed object, or None if no object was found"""
+        return self.root
+
+    def _open_root(self, ch):
+        if ch == "{":
+            self.root = {}
+            self._stack.append([self.root, None])
+
+    def _unconfirmed(self):
+        """Still inside a root that hasn't parsed a single field (it may be prose)"""
+        return len(self._stack) == 1 and not self.root
+
+    def _stray_brace(self):
+        """A "{" in the still-empty root without "key": before it can't be a value"""
+        return self._unconfirmed() and (self._stack[0][1] is None or not self._after_colon)
+
+    def _restart(self):
+        # Keep the empty root as the result unless a later object parses
+        self._stack = []
+        self._scalar = []
+        self._after_colon = False
+
+    def _end_string(self, completed):
+        text = "".join(self._chars)
+        try:
+            text = json.loads(f'"{text}"')
+        except ValueError:
+            pass
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and not self._after_colon:
+            if frame[1] is not None and self._unconfirmed():
+                self._restart()  # '"quoted" "words"' in prose, not a key and its value
+            else:
+                frame[1] = text
+        else:
+            self._attach(text, completed)
+
+    def _end_scalar(self, completed):
+        token = "".join(self._scalar)
+        self._scalar = []
+        if token in _SCALARS:
+            value = _SCALARS[token]
+        else:
+            try:
+                value = int(token)
+            except ValueError:
+                try:
+                    value = float(token)
+                except ValueError:
+                    value = token
+        self._attach(value, completed)
+
+    def _attach(self, value, completed, announce=True):
+        frame = self._stack[-1]
+        container = frame[0]
+        if isinstance(container, list):
+            container.append(value)
+            return
+        if frame[1] is None or not self._after_colon:
+            # A value with no "key": before it; in a root that has no fields
+            # yet, the brace was prose ('a { brace and "quote" then {...}')
+            if frame[1] is not None and self._unconfirmed():
+                self._restart()
+            return
+        container[frame[1]] = value
+        self._after_colon = False
+        if len(self._stack) == 1 and announce:
+            completed.append((frame[1], value))
+            frame[1] = None
+        elif not announce:
+            # Nested container: keep the key until it closes so it can be announced
+            return
+        else:
+            frame[1] = None
+
+
+def parse_json_text(content):
+    """Parse the first JSON object in a complete model reply (None if there is none)"""
+    parser = JsonStreamParser()
+    parser.feed(content or "")
+    return parser.result()
@@ -1,37 +1,229 @@
-import os
+import asyncio
 import json
-from dotenv import load_dotenv
-from groq import Groq
+import time
+from pydantic import ValidationError
+import confidence_gate
+import metrics
+from bayes import build_index, probability_vector, apply_vector
+from config import (
+    LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_COMPLETION_ESTIMATE,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY
+)
+from domain_classifier import classify_domain
+from json_stream import JsonStreamParser, parse_json_text
+from llm_scheduler import scheduler, coalesce_key
+from model_router import get_router, close_router, API_ERRORS, RATE_LIMIT_ERRORS, RETRYABLE_ERRORS
+from models import IntentResponse, QuestionResponse
+from prompt_builder import build_question_messages, estimate_tokens, record_prompt_tokens
+from question_trees import tree_index
+from response_cache import ResponseCache
+
+# Near-duplicate /start messages reuse the extracted intent; first questions
+# are only reused for an exact issue + hypothesis list, since option
+# likelihoods are positional
+intent_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY)
+first_question_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+
+
+def _estimated_cost(messages):
+    """Tokens to reserve against the per-minute budget before usage is known"""
+    return sum(estimate_tokens(m["content"]) for m in messages) + LLM_COMPLETION_ESTIMATE
+
+
+async def _complete_messages(messages, temperature, stage, domain="unknown", timeout=LLM_TIMEOUT):
+    """Run a single chat completion; identical calls already in flight are shared"""
+    return await scheduler.coalesce(
+        coalesce_key(stage, messages, temperature),
+        lambda: _scheduled_completion(messages, temperature, stage, domain, timeout),
+        stage
+    )
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
-MODEL_NAME = "llama-3.1-8b-instant"
+async def _scheduled_completion(messages, temperature, stage, domain, timeout):
+    """
+    One completion routed to the stage's backends. Each round tries every
+    target (see ModelRouter.complete); failed rounds retry with jittered backoff.
+    """
+    cost = _estimated_cost(messages)
+
+    async def attempt(target):
+        async with scheduler.slot(cost, stage, domain):
+            started = time.perf_counter()
+            try:
+                response = await target.client.chat.completions.create(
+                    model=target.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout
+                )
+            except RETRYABLE_ERRORS as e:
+                target.failed(e)
+                raise
+            finally:
+                metrics.llm_model_seconds.observe(time.perf_counter() - started, stage, domain)
+            target.succeeded(time.perf_counter() - started)
+            return response
+
+    for attempt_number in range(LLM_MAX_RETRIES + 1):
+        try:
+            response = await get_router().complete(stage, attempt)
+            break
+        except RETRYABLE_ERRORS as e:
+            # Every target failed; when they're all rate limited, hold all dispatch
+            wait = None
+            if isinstance(e, RATE_LIMIT_ERRORS):
+                wait = get_router().cooling_for(stage)
+                scheduler.throttled(wait)
+            if attempt_number == LLM_MAX_RETRIES:
+                metrics.llm_calls.inc(stage, domain, "error")
+                raise
+        except API_ERRORS:
+            metrics.llm_calls.inc(stage, domain, "error")
+            raise
+        metrics.llm_retries.inc(stage)
+        await asyncio.sleep(scheduler.backoff(attempt_number, wait))
+
+    metrics.llm_calls.inc(stage, domain, "ok")
+    metrics.llm_call_made()
+    if response.usage:
+        scheduler.settle(cost, response.usage.total_tokens)
+        metrics.llm_prompt_tokens.observe(response.usage.prompt_tokens, stage)
+        metrics.llm_completion_tokens.observe(response.usage.completion_tokens, stage)
+    return response
+
+
+async def _complete(prompt, temperature, stage, domain="unknown", timeout=LLM_TIMEOUT):
+    return await _complete_messages([{"role": "user", "content": prompt}], temperature, stage, domain, timeout)
+
+
+async def _complete_stream(messages, temperature, stage, domain="unknown", timeout=LLM_TIMEOUT):
+    """Yield content deltas of a streamed chat completion, failing over until the first delta"""
+    router = get_router()
+    targets = router.order(stage)
+    for i, target in enumerate(targets):
+        yielded = False
+        async with scheduler.slot(_estimated_cost(messages), stage, domain):
+            started = time.perf_counter()
+            try:
+                stream = await target.client.chat.completions.create(
+                    model=target.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yielded = True
+                        yield chunk.choices[0].delta.content
+            except RETRYABLE_ERRORS as e:
+                target.failed(e)
+                if yielded or i == len(targets) - 1:
+                    if isinstance(e, RATE_LIMIT_ERRORS):
+                        scheduler.throttled(router.cooling_for(stage))
+                    metrics.llm_calls.inc(stage, domain, "error")
+                    raise
+                metrics.llm_failovers.inc(stage)
+                continue
+            except API_ERRORS:
+                metrics.llm_calls.inc(stage, domain, "error")
+                raise
+            finally:
+                metrics.llm_model_seconds.observe(time.perf_counter() - started, stage, domain)
+            target.succeeded(time.perf_counter() - started)
+        metrics.llm_calls.inc(stage, domain, "ok")
+        metrics.llm_call_made()
+        return
+
+
+async def aclose():
+    """Close pooled connections on shutdown"""
+    await close_router()
 
 
 # -------------------------
-# Safe JSON Parser
+# Tolerant JSON Parsing
 # -------------------------
 
-def safe_json(response):
+# How model replies turned into data since startup
+parse_stats = {
+    "parsed": 0,
+    "repaired": 0,
+    "failed": 0
+}
+
+
+def _schema_error(data, schema):
+    """Short description of why data doesn't fit schema, or None if it does"""
+    if not isinstance(data, dict):
+        return "no JSON object found"
     try:
-        content = response.choices[0].message.content
-        # Try to extract JSON if it's wrapped in text
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "{" in content:
-            content = content[content.find("{"):content.rfind("}")+1]
-        return json.loads(content)
-    except Exception as e:
-        return {"error": f"invalid_json: {str(e)}"}
+        schema.model_validate(data)
+    except ValidationError as e:
+        return "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()[:3]
+        )
+    return None
+
+
+def _count_parse(stage, outcome):
+    parse_stats[outcome] += 1
+    metrics.llm_parse.inc(stage, outcome)
+
+
+async def _validated(messages, content, data, schema, stage, domain="unknown"):
+    """
+    Return data if it fits schema. Otherwise make one targeted repair call
+    that shows the model its own reply and what was wrong with it.
+    """
+    error = _schema_error(data, schema)
+    if error is None:
+        _count_parse(stage, "parsed")
+        return data
+
+    response = await _complete_messages([
+        *messages,
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": f"That reply could not be used ({error}). Return ONLY the corrected JSON object, nothing else."}
+    ], temperature=0, stage="repair", domain=domain)
+    repaired = parse_json_text(response.choices[0].message.content)
+    error = _schema_error(repaired, schema)
+    if error is None:
+        _count_parse(stage, "repaired")
+        return repaired
+
+    _count_parse(stage, "failed")
+    return {"error": f"invalid_json: {error}"}
+
+
+def _parse(content, stage):
+    started = time.perf_counter()
+    data = parse_json_text(content)
+    metrics.llm_parse_seconds.observe(time.perf_counter() - started, stage)
+    return data
+
+
+def _loose_json(response, stage):
+    """Tolerant parse without schema or repair, for stages with a local fallback"""
+    data = _parse(response.choices[0].message.content, stage)
+    if isinstance(data, dict):
+        _count_parse(stage, "parsed")
+        return data
+    _count_parse(stage, "failed")
+    return {"error": "invalid_json: no JSON object found"}
 
 
 # -------------------------
 # 1️⃣ Intent & Hypothesis Generation
 # -------------------------
 
-def extract_intent_and_hypotheses(message):
+@metrics.instrumented("intent")
+async def extract_intent_and_hypotheses(message):
     """Extract the problem and generate initial hypotheses"""
+    cached = intent_cache.get(message)
+    if cached is not None:
+        return cached
+    
     prompt = f"""
 You are a diagnostic expert who listens to problems and figures out what might be wrong.
 
@@ -64,111 +256,301 @@ Return ONLY valid JSON:
 }}
 """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
+    response = await _complete(prompt, temperature=0.3, stage="intent", domain=classify_domain(message))
+
+    content = response.choices[0].message.content
+    result = await _validated([{"role": "user", "content": prompt}], content, _parse(content, "intent"), IntentResponse, stage="intent")
+    if "error" not in result:
+        intent_cache.put(message, result)
+    return result
+
+
+# Top-level fields of the fused /start reply that make up the intent
+INTENT_FIELDS = ("main_issue", "risk_level", "hypotheses")
 
-    return safe_json(response)
+
+def _start_prompt(message):
+    """The fused /start prompt: intent, hypotheses and the first question"""
+    return f"""
+You are a diagnostic expert who listens to problems and figures out what might be wrong.
+
+Analyze what the user is telling you and:
+1. Understand the core problem in simple terms
+2. Generate 3-4 possible reasons WHY this is happening
+3. For each reason, estimate how likely it is (higher % = more confident)
+4. Rate the urgency: low/moderate/high
+5. Ask ONE natural, conversational first question about an OBSERVABLE FACT
+   that best separates your top 2 reasons, with 3-4 realistic options
+
+User's problem:
+"{message}"
+
+Think like:
+- What are the most common causes of this issue?
+- Which one seems most likely given what they said?
+- Are any of these dangerous/urgent?
+
+For EVERY option, give "likelihoods": how likely a person would pick that option
+if each hypothesis were the real cause (0.0 to 1.0, one number per hypothesis,
+in the same order as your "hypotheses" list).
+
+Return ONLY valid JSON:
+{{
+    "main_issue": "simple 1-sentence problem description",
+    "risk_level": "low/moderate/high",
+    "hypotheses": [
+        {{
+            "name": "simple cause name",
+            "description": "why this might be happening (plain English)",
+            "probability": 0.6,
+            "key_evidence": ["things that would prove this", "things that would disprove this"]
+        }}
+    ],
+    "first_question": {{
+        "question": "your conversational question",
+        "options": ["option 1", "option 2", "option 3"],
+        "likelihoods": {{
+            "option 1": [0.8, 0.3, 0.1],
+            "option 2": [0.1, 0.6, 0.3],
+            "option 3": [0.1, 0.1, 0.6]
+        }},
+        "reasoning": "why this question helps narrow it down"
+    }}
+}}
+"""
+
+
+def _opening_question(intent, question):
+    """The fused reply's first question for intent, or None if the caller has to generate one"""
+    # A mined tree for this issue wins, so the session stays on its path
+    served = tree_index.next_question(intent["main_issue"], intent["hypotheses"], [])
+    if served is not None:
+        return served
+    if _schema_error(question, QuestionResponse) is not None:
+        return None
+    first_question_cache.put(_first_question_key(intent["main_issue"], intent["hypotheses"], [], []), question)
+    return question
+
+
+@metrics.instrumented("start")
+async def extract_intent_and_first_question(message):
+    """
+    Intent, hypotheses and the opening question from a single model call
+    (the fused /start). Returns (intent, question); question is None when
+    the caller still has to generate one (cached intent, unusable question).
+    """
+    cached = intent_cache.get(message)
+    if cached is not None:
+        return cached, None
+
+    prompt = _start_prompt(message)
+    response = await _complete(prompt, temperature=0.3, stage="start", domain=classify_domain(message))
+
+    content = response.choices[0].message.content
+    data = _parse(content, "start")
+    question = data.pop("first_question", None) if isinstance(data, dict) else None
+    result = await _validated([{"role": "user", "content": prompt}], content, data, IntentResponse, stage="start")
+    if "error" in result:
+        return result, None
+    intent_cache.put(message, result)
+    return result, _opening_question(result, question)
+
+
+async def stream_intent_and_first_question(message):
+    """
+    Streaming variant of extract_intent_and_first_question.
+    Yields ("intent", intent) as soon as the intent fields are complete,
+    then ("question", question) once the whole reply has arrived.
+    """
+    cached = intent_cache.get(message)
+    if cached is not None:
+        yield "intent", cached
+        yield "question", None
+        return
+
+    messages = [{"role": "user", "content": _start_prompt(message)}]
+    parser, parts, fields, intent = JsonStreamParser(), [], set(), None
+    async for delta in _complete_stream(messages, temperature=0.3, stage="start", domain=classify_domain(message)):
+        parts.append(delta)
+        fields.update(key for key, _ in parser.feed(delta))
+        if intent is None and fields.issuperset(INTENT_FIELDS):
+            early = {key: parser.root[key] for key in INTENT_FIELDS}
+            if _schema_error(early, IntentResponse) is None:
+                _count_parse("start", "parsed")
+                intent = early
+                intent_cache.put(message, intent)
+                yield "intent", intent
+
+    data = parser.result()
+    question = data.pop("first_question", None) if isinstance(data, dict) else None
+    if intent is None:
+        intent = await _validated(messages, "".join(parts), data, IntentResponse, stage="start")
+        if "error" in intent:
+            yield "intent", intent
+            return
+        intent_cache.put(message, intent)
+        yield "intent", intent
+    yield "question", _opening_question(intent, question)
+
+
+@metrics.instrumented("intent_batch")
+async def extract_intents_batch(messages):
+    """
+    Intent and hypotheses for several enquiries from one packed prompt, in
+    input order. Enquiries the packed reply dropped or got wrong go through
+    extract_intent_and_hypotheses on their own.
+    """
+    results = [intent_cache.get(message) for message in messages]
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    if len(missing) > 1:
+        enquiries = "\n".join(
+            f"[{n}] {json.dumps(messages[i], ensure_ascii=False)}" for n, i in enumerate(missing, 1)
+        )
+        prompt = f"""
+You are a diagnostic expert who listens to problems and figures out what might be wrong.
+
+Below are {len(missing)} separate enquiries from different people. For EACH one, on its own:
+1. Understand the core problem in simple terms
+2. Generate 3-4 possible reasons WHY this is happening
+3. For each reason, estimate how likely it is (higher % = more confident)
+4. Rate the urgency: low/moderate/high
+
+Enquiries:
+{enquiries}
+
+Return ONLY valid JSON with one entry per enquiry, using its number as "id":
+{{
+    "results": [
+        {{
+            "id": 1,
+            "main_issue": "simple 1-sentence problem description",
+            "risk_level": "low/moderate/high",
+            "hypotheses": [
+                {{
+                    "name": "simple cause name",
+                    "description": "why this might be happening (plain English)",
+                    "probability": 0.6,
+                    "key_evidence": ["things that would prove this", "things that would disprove this"]
+                }}
+            ]
+        }}
+    ]
+}}
+"""
+        response = await _complete(prompt, temperature=0.3, stage="intent_batch", domain="batch")
+        data = _parse(response.choices[0].message.content, "intent_batch")
+        entries = data.get("results") if isinstance(data, dict) else None
+        for entry in entries if isinstance(entries, list) else []:
+            n = entry.get("id") if isinstance(entry, dict) else None
+            if not isinstance(n, int) or not 1 <= n <= len(missing) or _schema_error(entry, IntentResponse):
+                continue
+            i = missing[n - 1]
+            results[i] = {k: v for k, v in entry.items() if k != "id"}
+            intent_cache.put(messages[i], results[i])
+        _count_parse("intent_batch", "parsed" if all(results[i] is not None for i in missing) else "failed")
+
+    retry = [i for i in missing if results[i] is None]
+    for i, result in zip(retry, await asyncio.gather(*(extract_intent_and_hypotheses(messages[i]) for i in retry))):
+        results[i] = result
+    return results
 
 
 # -------------------------
 # 2️⃣ Hypothesis-Driven Question Generator
 # -------------------------
 
-def generate_adaptive_question(original_issue, hypotheses, answers_history, asked_questions):
+def _first_question_key(original_issue, hypotheses, answers_history, asked_questions):
+    """The opening question only depends on the issue and hypothesis list"""
+    if answers_history or asked_questions:
+        return None
+    return original_issue + " " + " ".join(f"h{i} {h['name']}" for i, h in enumerate(hypotheses))
+
+
+# How the question prompt describes each domain
+DOMAIN_PROMPT_LABELS = {
+    "health": "HEALTH/MEDICAL",
+    "safety": "SAFETY/HOME HAZARD",
+    "tech": "TECHNICAL",
+    "general": "HOME/GENERAL"
+}
+
+
+def _question_messages(original_issue, hypotheses, answers_history, asked_questions, domain):
+    return build_question_messages(
+        original_issue, DOMAIN_PROMPT_LABELS.get(domain, "GENERAL"), hypotheses, answers_history, asked_questions
+    )
+
+
+@metrics.instrumented("question")
+async def generate_adaptive_question(original_issue, hypotheses, answers_history, asked_questions, domain=None):
     """Generate a smart, context-aware question like ChatGPT"""
     
-    # Sort hypotheses by likelihood
-    sorted_hyp = sorted(hypotheses, key=lambda x: x["probability"], reverse=True)
-    top_1 = sorted_hyp[0] if len(sorted_hyp) > 0 else {}
-    top_2 = sorted_hyp[1] if len(sorted_hyp) > 1 else {}
-    
-    # Analyze conversation to understand what we know
-    answers_summary = "\n".join([
-        f"- {h['answer']}"
-        for h in answers_history[-3:]  # Last 3 answers for context
-    ]) if answers_history else "Just started"
-    
-    # Get list of facts we already know
-    facts_known = set()
-    for answer in answers_history:
-        facts_known.add(answer['answer'].lower())
-    
-    # Detect domain
-    health_keywords = ["vomiting", "headache", "fever", "pain", "sick", "ill", "symptom", "dizzy", "nausea", "feeling", "health", "disease", "hurt", "ache", "cough", "fatigue"]
-    original_lower = original_issue.lower()
-    is_health = any(keyword in original_lower for keyword in health_keywords)
+    # Sessions still on a mined question path need no model call
+    served = tree_index.next_question(original_issue, hypotheses, answers_history)
+    if served is not None:
+        return served
     
-    domain = "HEALTH/MEDICAL" if is_health else "TECHNICAL/HOME/GENERAL"
+    cache_key = _first_question_key(original_issue, hypotheses, answers_history, asked_questions)
+    if cache_key:
+        cached = first_question_cache.get(cache_key)
+        if cached is not None:
+            return cached
     
-    prompt = f"""
-You are a smart diagnostic AI like ChatGPT. Act like a helpful expert having a natural conversation.
-
-CONTEXT:
-- Issue: {original_issue}
-- Domain: {domain}
-- Questions already asked: {len(asked_questions)}
-- Top 2 hypotheses:
-  1. {top_1.get('name', 'Unknown')} ({top_1.get('probability', 0):.0%})
-  2. {top_2.get('name', 'Unknown')} ({top_2.get('probability', 0):.0%})
-
-What we know so far:
-{answers_summary}
-
-Questions ALREADY ASKED (NEVER REPEAT THESE):
-{chr(10).join('- ' + q for q in (asked_questions or [])) if asked_questions else "None yet"}
-
-YOUR JOB:
-Generate ONE clever follow-up question that:
-1. Act natural and conversational - like you're learning as you go
-2. Is COMPLETELY DIFFERENT from questions already asked
-3. Narrows down between top 2 hypotheses
-4. Asks about OBSERVABLE FACTS only
-5. Flows naturally from the conversation
-6. Gets information we DON'T have yet
-
-SMART QUESTION STRATEGY:
-- If we know "started 2 weeks ago", don't ask about timing again
-- If we know "worse after rain", don't ask about weather again
-- Ask about the NEXT logical thing: other symptoms, context, patterns, triggers
-- Make it conversational: "So you mentioned X... Does Y happen too?"
-
-Think about what distinguishes {top_1.get('name', '')} vs {top_2.get('name', '')}:
-- What evidence would support one over the other?
-- What do we still NOT know?
-- Ask about that!
-
-Generate a SINGLE smart question that:
-- Is natural and conversational
-- Asks something NEW we haven't covered
-- Will help distinguish between the top hypotheses
-- Provides 3-4 realistic observable options
-
-Return ONLY valid JSON (no markdown, no code blocks):
-{{
-    "question": "your smart conversational question",
-    "options": ["option 1", "option 2", "option 3"],
-    "reasoning": "why this question helps narrow it down"
-}}
-"""
+    domain = domain or classify_domain(original_issue)
+    messages, estimated_tokens = _question_messages(original_issue, hypotheses, answers_history, asked_questions, domain)
+    response = await _complete_messages(messages, temperature=0.7, stage="question", domain=domain)  # Higher temp for more creative/natural questions
+    record_prompt_tokens(len(asked_questions) + 1, estimated_tokens, response.usage.prompt_tokens if response.usage else None)
+
+    content = response.choices[0].message.content
+    result = await _validated(messages, content, _parse(content, "question"), QuestionResponse, stage="question", domain=domain)
+    if cache_key and "error" not in result:
+        first_question_cache.put(cache_key, result)
+    return result
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7  # Higher temp for more creative/natural questions
-    )
 
-    return safe_json(response)
+async def stream_adaptive_question(original_issue, hypotheses, answers_history, asked_questions, domain=None):
+    """
+    Streaming variant of generate_adaptive_question.
+    Yields ("question", text) as soon as the question field is complete,
+    then ("data", parsed_question) once the whole reply has arrived.
+    """
+    cached = tree_index.next_question(original_issue, hypotheses, answers_history)
+    cache_key = _first_question_key(original_issue, hypotheses, answers_history, asked_questions)
+    if cached is None and cache_key:
+        cached = first_question_cache.get(cache_key)
+    if cached is not None:
+        yield "question", cached.get("question", "")
+        yield "data", cached
+        return
+    
+    domain = domain or classify_domain(original_issue)
+    messages, estimated_tokens = _question_messages(original_issue, hypotheses, answers_history, asked_questions, domain)
+    record_prompt_tokens(len(asked_questions) + 1, estimated_tokens)
+    parser = JsonStreamParser()
+    parts = []
+    async for delta in _complete_stream(messages, temperature=0.7, stage="question", domain=domain):
+        parts.append(delta)
+        for key, value in parser.feed(delta):
+            if key == "question":
+                yield "question", value
+    
+    result = await _validated(messages, "".join(parts), parser.result(), QuestionResponse, stage="question", domain=domain)
+    if cache_key and "error" not in result:
+        first_question_cache.put(cache_key, result)
+    yield "data", result
 
 
 # -------------------------
 # 3️⃣ Adaptive Hypothesis Updater
 # -------------------------
 
-def update_hypotheses(original_issue, hypotheses, last_question, last_answer):
-    """Update hypothesis probabilities based on the latest answer"""
+@metrics.instrumented("update")
+async def update_hypotheses(original_issue, hypotheses, last_question, last_answer, index=None, domain=None):
+    """
+    Update hypothesis probabilities based on the latest answer.
+    Only used when the question came without usable option likelihoods.
+    """
     
     hyp_text = "\n".join([
         f"- {h['name']}: {h['description']} (current: {h['probability']:.0%})"
@@ -203,29 +585,29 @@ Return ONLY valid JSON:
 }}
 """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
+    response = await _complete(prompt, temperature=0.2, stage="update", domain=domain or "unknown")
 
-    result = safe_json(response)
+    result = _loose_json(response, "update")
     
-    # Update hypothesis probabilities
+    # Update hypothesis probabilities (name lookup via the per-session index)
     if "updated_hypotheses" in result:
+        index = index or build_index(hypotheses)
         for update in result["updated_hypotheses"]:
-            for hyp in hypotheses:
-                if hyp["name"].lower() == update["name"].lower():
-                    hyp["probability"] = update.get("new_probability", hyp["probability"])
+            i = index.get(str(update.get("name", "")).strip().lower())
+            if i is not None:
+                hyp = hypotheses[i]
+                hyp["probability"] = update.get("new_probability", hyp["probability"])
     
-    return hypotheses
+    # The model's numbers don't sum to 1
+    return apply_vector(hypotheses, probability_vector(hypotheses))
 
 
 # -------------------------
 # 4️⃣ Improved Confidence Evaluation
 # -------------------------
 
-def evaluate_confidence(original_issue, hypotheses, answers_count, issue_type="general"):
+@metrics.instrumented("confidence")
+async def evaluate_confidence(original_issue, hypotheses, answers_count, issue_type=None):
     """Evaluate if we have enough confidence to provide a diagnosis"""
     
     # Sort by probability
@@ -234,23 +616,17 @@ def evaluate_confidence(original_issue, hypotheses, answers_count, issue_type="g
     top_prob = sorted_hyp[0]["probability"] if sorted_hyp else 0
     second_prob = sorted_hyp[1]["probability"] if len(sorted_hyp) > 1 else 0
     
-    # Different thresholds for different issue types
-    thresholds = {
-        "health": {"min_confidence": 0.85, "min_questions": 4, "gap": 0.40},
-        "medical": {"min_confidence": 0.85, "min_questions": 4, "gap": 0.40},
-        "safety": {"min_confidence": 0.80, "min_questions": 3, "gap": 0.35},
-        "general": {"min_confidence": 0.70, "min_questions": 2, "gap": 0.25},
-        "tech": {"min_confidence": 0.65, "min_questions": 2, "gap": 0.20},
-    }
+    # Sessions carry their domain; classify only for direct callers
+    issue_type = issue_type or classify_domain(original_issue)
     
-    # Detect if it's a health issue
-    health_keywords = ["vomiting", "headache", "fever", "pain", "sick", "ill", "symptom", "dizzy", "nausea", "feeling", "health", "disease", "hurt", "ache"]
-    original_lower = original_issue.lower()
-    is_health = any(keyword in original_lower for keyword in health_keywords)
-    if is_health:
-        issue_type = "health"
+    # Clear-cut cases are decided locally; only borderline ones need the model
+    decision, borderline = confidence_gate.decide(top_prob, second_prob, answers_count, issue_type)
+    if not borderline:
+        confidence_gate.stats["local_decisions"] += 1
+        return decision
+    confidence_gate.stats["llm_fallbacks"] += 1
     
-    config = thresholds.get(issue_type, thresholds["general"])
+    config = confidence_gate.thresholds_for(issue_type)
     min_confidence = config["min_confidence"]
     min_questions = config["min_questions"]
     min_gap = config["gap"]
@@ -294,13 +670,11 @@ Return ONLY valid JSON:
 }}
 """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
+    response = await _complete(prompt, temperature=0.2, stage="confidence", domain=issue_type)
 
-    result = safe_json(response)
+    result = _loose_json(response, "confidence")
+    if "error" in result:
+        return decision
     return result
 
 
@@ -308,20 +682,13 @@ Return ONLY valid JSON:
 # 5️⃣ Evidence-Based Final Response
 # -------------------------
 
-def generate_final_response(original_issue, hypotheses, answers_history, risk_level):
-    """Generate SHORT final diagnosis - 2-3 sentences maximum"""
-    
-    # Detect if this is a health issue
-    health_keywords = ["vomiting", "headache", "fever", "pain", "sick", "ill", "symptom", "dizzy", "nausea", "feeling", "health", "disease", "hurt", "ache", "cough", "fatigue"]
-    original_lower = original_issue.lower()
-    is_health = any(keyword in original_lower for keyword in health_keywords)
-    
+def _final_prompt(original_issue, hypotheses, domain):
     # Sort hypotheses by probability
     sorted_hyp = sorted(hypotheses, key=lambda x: x["probability"], reverse=True)
     top_hypothesis = sorted_hyp[0] if sorted_hyp else {}
     top_name = top_hypothesis.get('name', 'Unknown')
     
-    health_disclaimer_text = "⚠️ See a doctor. " if is_health else ""
+    health_disclaimer_text = "⚠️ See a doctor. " if domain == "health" else ""
     
     # VERY strict format - force concise output
     prompt = f"""FINAL ANSWER: 2-3 SHORT SENTENCES. NO QUESTIONS. NO LISTS.
@@ -342,13 +709,12 @@ Format:
 
 WRITE NOW (statements only, 2-3 sentences):"""
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.15  # Very low temp for consistency
-    )
+    return prompt, top_name
 
-    result = response.choices[0].message.content.strip()
+
+def _clean_final(result, top_name):
+    """Strip numbering, instructions and questions from the model's final answer"""
+    result = result.strip()
     
     # Post-processing: Remove numbering, clean up, remove questions
     lines = result.split('\n')
@@ -380,3 +746,39 @@ WRITE NOW (statements only, 2-3 sentences):"""
         final = f"Yeah, probably {top_name}. Check recent conditions. Consider professional help if it persists."
     
     return final
+
+
+@metrics.instrumented("final")
+async def generate_final_response(original_issue, hypotheses, answers_history, risk_level, domain=None):
+    """Generate SHORT final diagnosis - 2-3 sentences maximum"""
+    
+    served = tree_index.final_response(original_issue, hypotheses, answers_history)
+    if served:
+        return served
+    
+    domain = domain or classify_domain(original_issue)
+    prompt, top_name = _final_prompt(original_issue, hypotheses, domain)
+    response = await _complete(prompt, temperature=0.15, stage="final", domain=domain)  # Very low temp for consistency
+
+    return _clean_final(response.choices[0].message.content, top_name)
+
+
+async def stream_final_response(original_issue, hypotheses, answers_history, risk_level, domain=None):
+    """
+    Streaming variant of generate_final_response.
+    Yields ("token", text) as the diagnosis is generated, then ("final", cleaned_text).
+    """
+    served = tree_index.final_response(original_issue, hypotheses, answers_history)
+    if served:
+        yield "token", served
+        yield "final", served
+        return
+    
+    domain = domain or classify_domain(original_issue)
+    prompt, top_name = _final_prompt(original_issue, hypotheses, domain)
+    parts = []
+    async for delta in _complete_stream([{"role": "user", "content": prompt}], temperature=0.15, stage="final", domain=domain):
+        parts.append(delta)
+        yield "token", delta
+    
+    yield "final", _clean_final("".join(parts), top_name)
@@ -0,0 +1,213 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import random
+import time
+import metrics
+from config import LLM_POOL_SIZE, LLM_RPM, LLM_TPM, LLM_QUEUE_MAX, LLM_RETRY_BASE, LLM_RETRY_MAX
+
+# Lower runs first: an open session waiting on its next question goes
+# ahead of a visitor who hasn't seen a first question yet, and bulk triage
+# only gets what interactive traffic leaves over
+PRIORITIES = {"answer": 0, "start": 1, "batch": 2}
+
+# Set by the endpoint; tasks it spawns (speculative questions) inherit it
+current_priority = contextvars.ContextVar("llm_priority", default="start")
+
+
+class SchedulerOverloaded(Exception):
+    """The wait queue is full; the caller should shed the request"""
+
+
+class TokenBucket:
+    """
+    Refills per_minute units evenly over a minute and holds at most
+    burst_seconds worth of them; per_minute = 0 disables the limit
+    """
+
+    def __init__(self, per_minute, burst_seconds=10):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self, amount, now):
+        """Seconds until amount units are available"""
+        if not self.capacity:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)  # an oversized call waits for a full bucket, not forever
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+class LLMScheduler:
+    """
+    Client-side admission control for provider calls: at most `concurrency`
+    calls in flight, request and token budgets per minute, and a bounded
+    priority queue for everything that has to wait. A 429 pauses dispatch
+    for every caller, not just the one that got it.
+    """
+
+    def __init__(self, concurrency, rpm=0, tpm=0, max_queue=1000):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._active = 0
+        self._waiters = []  # heap of [priority, seq, cost, future]
+        self._seq = itertools.count()
+        self._timer = None
+        self._hold_until = 0.0
+        self._inflight = {}  # coalescing key -> [task, waiters]
+        self.stats = {
+            "dispatched": 0,
+            "queued": 0,
+            "rejected": 0,
+            "coalesced": 0,
+            "throttled": 0,
+            "max_queue_depth": 0,
+            "wait_seconds": 0.0
+        }
+
+    @contextlib.asynccontextmanager
+    async def slot(self, cost, stage="unknown", domain="unknown"):
+        """Hold one call slot; cost is the estimated total tokens of the call"""
+        queued = time.perf_counter()
+        await self._acquire(PRIORITIES.get(current_priority.get(), 1), cost)
+        waited = time.perf_counter() - queued
+        self.stats["wait_seconds"] += waited
+        metrics.llm_queue_seconds.observe(waited, stage, domain)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority, cost):
+        if not self._waiters and self._active < self.concurrency and self._ready_in(cost) == 0:
+            self._grant(cost)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise SchedulerOverloaded(f"{len(self._waiters)} LLM calls already waiting")
+
+        entry = [priority, next(self._seq), cost, asyncio.get_running_loop().create_future()]
+        heapq.heappush(self._waiters, entry)
+        self.stats["queued"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._waiters))
+        self._pump()
+        try:
+            await entry[3]
+        except asyncio.CancelledError:
+            if entry[3].done() and not entry[3].cancelled():
+                self._release()  # granted, but the caller went away before using it
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._set_depth()
+            raise
+
+    def _ready_in(self, cost):
+        now = time.monotonic()
+        return max(self._hold_until - now, self.requests.delay(1, now), self.tokens.delay(cost, now))
+
+    def _grant(self, cost):
+        self._active += 1
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self.stats["dispatched"] += 1
+
+    def _release(self):
+        self._active -= 1
+        self._pump()
+
+    def _pump(self):
+        """Dispatch waiters in priority order while slots and budget allow"""
+        while self._waiters and self._active < self.concurrency:
+            entry = self._waiters[0]
+            delay = self._ready_in(entry[2])
+            if delay > 0:
+                if self._timer:
+                    self._timer.cancel()
+                self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                break
+            heapq.heappop(self._waiters)
+            self._grant(entry[2])
+            entry[3].set_result(None)
+        self._set_depth()
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def _set_depth(self):
+        for name, priority in PRIORITIES.items():
+            metrics.llm_queue_depth.set(sum(1 for e in self._waiters if e[0] == priority), name)
+
+    def settle(self, estimated, actual):
+        """Correct the token budget once the provider reports real usage"""
+        self.tokens.take(actual - estimated)
+
+    def throttled(self, retry_after=None):
+        """The provider said slow down: hold all dispatch and empty the request bucket"""
+        self.stats["throttled"] += 1
+        self.requests.drain()
+        if retry_after:
+            self._hold_until = max(self._hold_until, time.monotonic() + retry_after)
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, never shorter than the provider's Retry-After"""
+        delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    async def coalesce(self, key, call, stage="unknown"):
+        """
+        Run call() once for identical concurrent requests. The shared call is
+        cancelled only when every caller waiting on it has gone away.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = [asyncio.ensure_future(call()), 0]
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+        else:
+            self.stats["coalesced"] += 1
+            metrics.llm_coalesced.inc(stage)
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+    def _forget(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def snapshot(self):
+        waits = self.stats["dispatched"] and self.stats["wait_seconds"] / self.stats["dispatched"]
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "avg_wait_seconds": round(waits, 4),
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "holding_for": round(max(0.0, self._hold_until - time.monotonic()), 3)
+        }
+
+
+def coalesce_key(route, messages, temperature):
+    return json.dumps([route, messages, temperature], separators=(",", ":"), ensure_ascii=False)
+
+
+scheduler = LLMScheduler(LLM_POOL_SIZE, LLM_RPM, LLM_TPM, LLM_QUEUE_MAX)
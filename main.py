@@ -1,160 +1,705 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+from contextlib import aclosing, asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.requests import HTTPConnection
+import metrics
+from config import SPECULATIVE_QUESTIONS, START_FUSED, WS_PREFETCH_MIN_SHARE
 from models import StartRequest, AnswerRequest
-from session_manager import create_session, get_session, add_answer_to_session, update_hypotheses, delete_session
+from bayes import likelihood_for
+from session_manager import (
+    current_store, new_session, get_session, save_session, commit_answer, add_answer, record_question, apply_likelihood, update_hypotheses,
+    delete_session, reap_sessions, session_stats, session_lock, claim_answer, finish_answer, replay_snapshot
+)
 from llm_engine import (
     extract_intent_and_hypotheses,
+    extract_intent_and_first_question,
+    stream_intent_and_first_question,
     generate_adaptive_question,
+    stream_adaptive_question,
     update_hypotheses as update_hyp_scores,
     evaluate_confidence,
-    generate_final_response
+    generate_final_response,
+    stream_final_response,
+    aclose as close_llm_client,
+    intent_cache,
+    first_question_cache,
+    parse_stats
+)
+from confidence_gate import gate_stats
+from prompt_builder import prompt_token_stats
+from completion_log import completion_log
+from stopping_policy import stopping_policy
+from model_router import API_ERRORS, current_router, get_router
+from llm_scheduler import scheduler, current_priority, SchedulerOverloaded
+from question_trees import tree_index
+from batch_triage import triage
+from speculation import (
+    start_speculative_question, prefetch_next_question, would_stop, skip_on_stop,
+    abandon, discard, cancel, resolve, speculation_stats
 )
 
-app = FastAPI()
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def _warm():
+    await get_router().warm()
+
+
+def _use_app_state(app):
+    """Serve what runs from here on (and the tasks it starts) with app's router and session store"""
+    current_router.set(app.state.router)
+    current_store.set(app.state.store)
+
+
+async def use_app_state(connection: HTTPConnection):
+    _use_app_state(connection.app)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    _use_app_state(app)
+    # Connection and TLS setup runs in the background so /health answers at
+    # once; requests that arrive first just open their own connections
+    warming = asyncio.create_task(_warm())
+    reaper = asyncio.create_task(reap_sessions())
+    yield
+    warming.cancel()
+    reaper.cancel()
+    # An injected router belongs to whoever passed it in
+    if app.state.router is None:
+        await close_llm_client()
+    completion_log.close()
+
+
+routes = APIRouter()
+
+
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.http_request_seconds.observe(time.perf_counter() - started, route.path if route else "unmatched")
+    return response
+
+async def shed_load(request: Request, exc: SchedulerOverloaded):
+    return JSONResponse({"error": "Busy right now, please try again shortly"}, status_code=503, headers={"Retry-After": "5"})
+
+
+async def _open_session(message):
+    """
+    Extract intent and create the session, unsaved until its first question
+    is recorded. Returns (session_id, session, first_question), where
+    first_question is None if it still has to be generated, or
+    (None, None, None) on failure.
+    """
+
+    # Extract intent and generate initial hypotheses (with the first question when fused)
+    if START_FUSED:
+        intent_data, question_data = await extract_intent_and_first_question(message)
+    else:
+        intent_data, question_data = await extract_intent_and_hypotheses(message), None
+
+    if "error" in intent_data:
+        return None, None, None
+
+    # Create session with hypotheses
+    session_id, session = new_session(message, intent_data)
+    return session_id, session, question_data
+
+
+async def _apply_answer(session, selected_option, prefetched=None):
+    """
+    Record the answer in the request's copy of the session, update hypotheses
+    and decide whether to stop. Nothing is saved: the caller commits the
+    session once its reply is ready, so a failure leaves the answer unrecorded.
+    prefetched is a speculative next question already started for this answer.
+    Returns (session, confidence_score, should_stop, speculative).
+    """
+
+    # Store the answer with the last question
+    last_question = session["asked_questions"][-1] if session["asked_questions"] else "Initial question"
+    add_answer(session, last_question, selected_option)
+
+    # Apply the answer locally when the question came with option likelihoods
+    likelihood = likelihood_for(session["likelihoods"], selected_option)
+    if likelihood:
+        apply_likelihood(session, likelihood)
+
+    # Speculatively generate the next question while the remaining LLM calls run,
+    # unless the local update already settles the session
+    speculative = prefetched
+    if SPECULATIVE_QUESTIONS and not speculative:
+        if likelihood and would_stop(session, session["probs"], session["answer_count"]):
+            skip_on_stop()
+        else:
+            speculative = start_speculative_question(
+                original_issue=session["main_issue"],
+                hypotheses=session["hypotheses"],
+                answers_history=session["answers_history"],
+                asked_questions=session["asked_questions"],
+                domain=session["domain"]
+            )
+
+    try:
+        # Free-text answers (or questions without likelihoods) fall back to the LLM updater
+        if not likelihood:
+            updated_hypotheses = await update_hyp_scores(
+                original_issue=session["main_issue"],
+                hypotheses=session["hypotheses"],
+                last_question=last_question,
+                last_answer=selected_option,
+                index=session["hyp_index"],
+                domain=session["domain"]
+            )
+            update_hypotheses(session, updated_hypotheses)
+
+        # Evaluate confidence
+        confidence_data = await evaluate_confidence(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_count=session["answer_count"],
+            issue_type=session["domain"]
+        )
+
+        confidence_score = confidence_data.get("confidence_score", 0.5)
+        verdict = confidence_data.get("verdict", "CONTINUE")
+
+        # Per-domain/risk limits and the hypothesis distribution decide when to stop
+        history = [step["probs"] for step in session.get("trace", [])] + [session["probs"]]
+        should_stop, reason = stopping_policy.decide(
+            history, session["answer_count"], session["domain"], session["risk_level"], verdict
+        )
+        if should_stop:
+            metrics.session_stops.inc(reason)
+
+        if should_stop and speculative:
+            discard(speculative[0])
+            speculative = None
+    except BaseException:
+        # The request is failing: don't leave the next question generating
+        if speculative:
+            cancel(speculative[0])
+        raise
+
+    return session, confidence_score, should_stop, speculative
+
 
-@app.get("/health")
+def _question_fields(question_data):
+    return {
+        "question": question_data.get("question", ""),
+        "options": question_data.get("options", []),
+        "why_asking": question_data.get("why_asking", question_data.get("reasoning", ""))
+    }
+
+
+def _top_hypothesis(session):
+    return sorted(session["hypotheses"], key=lambda x: x["probability"], reverse=True)[0]["name"]
+
+
+def _trace(session, timings, started, confidence=None, should_stop=None):
+    """Completion-log step for one request: probabilities after it, the verdict and stage timings"""
+    step = {
+        "probs": [round(p, 4) for p in session["probs"]],
+        "timings": {**timings, "total": round(time.perf_counter() - started, 4)}
+    }
+    if should_stop is not None:
+        step["confidence"] = confidence
+        step["verdict"] = "STOP" if should_stop else "CONTINUE"
+    return step
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _submission_key(request, kind):
+    """
+    What makes two /answer submissions the same one, and whether its response
+    is kept for later retries. Without an idempotency key or question number,
+    only a duplicate that arrives while the first is still running is caught.
+    """
+    if request.idempotency_key:
+        return f"{kind}:key:{request.idempotency_key}", True
+    if request.question_number is not None:
+        return f"{kind}:question:{request.question_number}", True
+    return f"{kind}:option:{request.selected_option.strip().lower()}", False
+
+
+def _out_of_sequence(request, session):
+    if request.question_number is not None and request.question_number != session["answer_count"] + 1:
+        return {"error": "Out-of-sequence answer", "expected_question_number": session["answer_count"] + 1}
+    return None
+
+
+async def _superseded(session_id):
+    """Error for an answer whose commit lost to another request's (on this or another worker)"""
+    session = await get_session(session_id)
+    if not session:
+        return {"error": "Invalid session"}
+    return {"error": "Out-of-sequence answer", "expected_question_number": session["answer_count"] + 1}
+
+
+@routes.get("/health")
 def health():
     return {"status": "Backend running"}
 
-@app.post("/start")
-def start_session(request: StartRequest):
+@routes.post("/start")
+async def start_session(request: StartRequest):
     """Start a new diagnostic session"""
-    
-    # Extract intent and generate initial hypotheses
-    intent_data = extract_intent_and_hypotheses(request.message)
-    
-    if "error" in intent_data:
+
+    started, timings = time.perf_counter(), metrics.collect_stage_timings()
+    session_id, session, question_data = await _open_session(request.message)
+    if not session:
         return {"error": "Failed to process your enquiry"}
-    
-    # Create session with hypotheses
-    session_id = create_session(request.message, intent_data)
-    session = get_session(session_id)
-    
-    # Generate first question
-    question_data = generate_adaptive_question(
-        original_issue=session["main_issue"],
-        hypotheses=session["hypotheses"],
-        answers_history=[],
-        asked_questions=[]
-    )
-    
+
+    # Generate first question unless it came with the intent
+    if question_data is None:
+        question_data = await generate_adaptive_question(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=[],
+            asked_questions=[],
+            domain=session["domain"]
+        )
+
     # Add first question to the asked_questions list
-    first_question = question_data.get("question", "")
-    if first_question:
-        session["asked_questions"].append(first_question)
-    
+    record_question(session, question_data, _trace(session, timings, started))
+    await save_session(session_id, session)
+
     return {
         "session_id": session_id,
         "issue_summary": session["main_issue"],
         "risk_level": session["risk_level"],
-        "question": question_data.get("question", ""),
-        "options": question_data.get("options", []),
-        "why_asking": question_data.get("why_asking", question_data.get("reasoning", "")),
+        **_question_fields(question_data),
         "question_number": 1
     }
 
-@app.post("/answer")
-def answer_question(request: AnswerRequest):
+@routes.post("/answer")
+async def answer_question(request: AnswerRequest):
     """Process user's answer and generate next question or final response"""
-    
-    session = get_session(request.session_id)
+
+    # Open sessions jump the LLM queue ahead of new /start requests
+    current_priority.set("answer")
+
+    # Retries and double clicks get the first submission's response
+    key, keep = _submission_key(request, "json")
+    replayed, response = await claim_answer(request.session_id, key)
+    if replayed:
+        return response
+
+    calls, response = metrics.count_llm_calls(), None
+    try:
+        async with session_lock(request.session_id):
+            response = await _answer(request)
+    finally:
+        finish_answer(request.session_id, key, response, calls[0], keep)
+    return response
+
+async def _answer(request):
+    """Body of /answer, run under the session's lock"""
+    started, timings = time.perf_counter(), metrics.collect_stage_timings()
+    session = await get_session(request.session_id)
     if not session:
         return {"error": "Invalid session"}
-    
-    # Store the answer with the last question
-    last_question = session["asked_questions"][-1] if session["asked_questions"] else "Initial question"
-    add_answer_to_session(request.session_id, last_question, request.selected_option)
-    
-    # Update hypothesis probabilities based on this answer
-    updated_hypotheses = update_hyp_scores(
-        original_issue=session["main_issue"],
-        hypotheses=session["hypotheses"],
-        last_question=last_question,
-        last_answer=request.selected_option
-    )
-    update_hypotheses(request.session_id, updated_hypotheses)
-    session = get_session(request.session_id)  # Refresh session
-    
-    # Evaluate confidence
-    confidence_data = evaluate_confidence(
-        original_issue=session["main_issue"],
-        hypotheses=session["hypotheses"],
-        answers_count=session["answer_count"],
-        issue_type="general"  # Automatically detected in function
-    )
-    
-    confidence_score = confidence_data.get("confidence_score", 0.5)
-    verdict = confidence_data.get("verdict", "CONTINUE")
-    
-    # ENFORCE MINIMUM 4 QUESTIONS before giving final answer
-    # This ensures we get enough context from the user
-    min_questions_before_stop = 4
-    max_questions = 8
-    
-    should_stop = (
-        (verdict == "STOP" and session["answer_count"] >= min_questions_before_stop) or
-        session["answer_count"] >= max_questions
-    )
-    
+    out_of_sequence = _out_of_sequence(request, session)
+    if out_of_sequence:
+        return out_of_sequence
+    seen = session["answer_count"]
+
+    session, confidence_score, should_stop, speculative = await _apply_answer(session, request.selected_option)
+
     if should_stop:
-        final_response = generate_final_response(
+        final_response = await generate_final_response(
             original_issue=session["main_issue"],
             hypotheses=session["hypotheses"],
             answers_history=session["answers_history"],
-            risk_level=session["risk_level"]
+            risk_level=session["risk_level"],
+            domain=session["domain"]
         )
-        
-        # Clean up session
-        delete_session(request.session_id)
-        
+
+        # Commit the answer, log the finished trace, then clean up session
+        if not await commit_answer(request.session_id, session, seen):
+            return await _superseded(request.session_id)
+        completion_log.append(session, final_response, _trace(session, timings, started, confidence_score, should_stop))
+        await delete_session(request.session_id)
+
         return {
             "status": "completed",
             "confidence": confidence_score,
             "final_response": final_response
         }
-    
-    # Generate next question
-    question_data = generate_adaptive_question(
-        original_issue=session["main_issue"],
-        hypotheses=session["hypotheses"],
-        answers_history=session["answers_history"],
-        asked_questions=session["asked_questions"]
-    )
-    
-    # Add the new question to asked_questions list to avoid repeating it
-    new_question = question_data.get("question", "")
-    if new_question and new_question not in session["asked_questions"]:
-        session["asked_questions"].append(new_question)
-    
+
+    # Generate next question (or keep the speculative one if still valid)
+    if speculative:
+        question_data = await resolve(
+            *speculative,
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=session["answers_history"],
+            asked_questions=session["asked_questions"],
+            domain=session["domain"]
+        )
+    else:
+        question_data = await generate_adaptive_question(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=session["answers_history"],
+            asked_questions=session["asked_questions"],
+            domain=session["domain"]
+        )
+
+    # Add the new question to asked_questions list to avoid repeating it, and commit the answer with it
+    record_question(session, question_data, _trace(session, timings, started, confidence_score, should_stop))
+    if not await commit_answer(request.session_id, session, seen):
+        return await _superseded(request.session_id)
+
     return {
         "status": "continue",
         "confidence": confidence_score,
-        "question": question_data.get("question", ""),
-        "options": question_data.get("options", []),
-        "why_asking": question_data.get("why_asking", question_data.get("reasoning", "")),
+        **_question_fields(question_data),
         "question_number": session["answer_count"] + 1,
-        "top_hypothesis": sorted(session["hypotheses"], key=lambda x: x["probability"], reverse=True)[0]["name"]
+        "top_hypothesis": _top_hypothesis(session)
+    }
+
+@routes.post("/start/stream")
+async def start_session_stream(request: StartRequest):
+    """
+    Streaming /start (Server-Sent Events).
+    Events: session, question (as soon as the text is complete), options, done | error
+    """
+
+    async def events():
+        async for event, data in _start_events(request.message):
+            yield _sse(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+async def _start_events(message, committed=None):
+    """
+    (event, data) pairs of a streamed /start, shared by SSE and the WebSocket.
+    A fused reply is streamed too: the session event goes out as soon as its
+    intent fields are complete, the question once the rest has arrived. If
+    the reply breaks off after the intent, the question is generated on its own.
+    committed, if given, receives the saved session under "session".
+    """
+    started, timings = time.perf_counter(), metrics.collect_stage_timings()
+    async with aclosing(stream_intent_and_first_question(message)) as fused:
+        try:
+            if START_FUSED:
+                _, intent_data = await anext(fused)
+            else:
+                intent_data = await extract_intent_and_hypotheses(message)
+        except (SchedulerOverloaded, *API_ERRORS):
+            intent_data = {"error": "provider unavailable"}
+        if "error" in intent_data:
+            yield "error", {"error": "Failed to process your enquiry"}
+            return
+
+        # Saved before the client learns its id, so /answer always finds it
+        session_id, session = new_session(message, intent_data)
+        await save_session(session_id, session)
+        yield "session", {
+            "session_id": session_id,
+            "issue_summary": session["main_issue"],
+            "risk_level": session["risk_level"]
+        }
+        question_data = None
+        if START_FUSED:
+            try:
+                _, question_data = await anext(fused)
+            except (SchedulerOverloaded, *API_ERRORS):
+                metrics.start_fallbacks.inc()
+
+    if question_data is not None:
+        record_question(session, question_data, _trace(session, timings, started))
+        await save_session(session_id, session)
+        if committed is not None:
+            committed["session"] = session
+        yield "question", {"question": question_data.get("question", ""), "question_number": 1}
+        yield "options", _question_fields(question_data)
+        yield "done", {}
+        return
+
+    try:
+        async for kind, value in stream_adaptive_question(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=[],
+            asked_questions=[],
+            domain=session["domain"]
+        ):
+            if kind == "question":
+                yield "question", {"question": value, "question_number": 1}
+            else:
+                record_question(session, value, _trace(session, timings, started))
+                await save_session(session_id, session)
+                if committed is not None:
+                    committed["session"] = session
+                yield "options", _question_fields(value)
+    except (SchedulerOverloaded, *API_ERRORS):
+        yield "error", {"error": "Busy right now, please try again shortly"}
+        return
+
+    yield "done", {}
+
+@routes.post("/answer/stream")
+async def answer_question_stream(request: AnswerRequest):
+    """
+    Streaming /answer (Server-Sent Events).
+    Events: status, then either question + options or token* + final, then done | error
+    """
+
+    async def events():
+        current_priority.set("answer")
+        key, keep = _submission_key(request, "stream")
+        replayed, emitted = await claim_answer(request.session_id, key)
+        if replayed:
+            for event in emitted:
+                yield event
+            return
+
+        calls, emitted, finished = metrics.count_llm_calls(), [], False
+        try:
+            async with session_lock(request.session_id):
+                async for event, data in _answer_events(request):
+                    emitted.append(_sse(event, data))
+                    yield emitted[-1]
+            finished = True
+        finally:
+            finish_answer(request.session_id, key, emitted if finished else None, calls[0], keep)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+async def _answer_events(request, prefetched=None, committed=None):
+    """
+    (event, data) pairs of a streamed /answer, run under the session's lock.
+    The answer is committed with the reply's last event; a stream that stops
+    earlier leaves it unrecorded, so the client can resend it. committed, if
+    given, receives the session under "session" when it continues.
+    """
+    started, timings = time.perf_counter(), metrics.collect_stage_timings()
+    session = await get_session(request.session_id)
+    if not session:
+        yield "error", {"error": "Invalid session"}
+        return
+    out_of_sequence = _out_of_sequence(request, session)
+    if out_of_sequence:
+        yield "error", out_of_sequence
+        return
+    seen = session["answer_count"]
+
+    session, confidence_score, should_stop, speculative = await _apply_answer(
+        session, request.selected_option, prefetched
+    )
+
+    yield "status", {
+        "status": "completed" if should_stop else "continue",
+        "confidence": confidence_score
     }
 
-@app.post("/debug/session/{session_id}")
-def debug_session(session_id: str):
+    if should_stop:
+        async for kind, value in stream_final_response(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=session["answers_history"],
+            risk_level=session["risk_level"],
+            domain=session["domain"]
+        ):
+            if kind == "token":
+                yield "token", {"text": value}
+            elif not await commit_answer(request.session_id, session, seen):
+                yield "error", await _superseded(request.session_id)
+                return
+            else:
+                completion_log.append(session, value, _trace(session, timings, started, confidence_score, should_stop))
+                await delete_session(request.session_id)
+                yield "final", {"final_response": value}
+        yield "done", {}
+        return
+
+    question_number = session["answer_count"] + 1
+    if speculative:
+        question_data = await resolve(
+            *speculative,
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=session["answers_history"],
+            asked_questions=session["asked_questions"],
+            domain=session["domain"]
+        )
+        yield "question", {"question": question_data.get("question", ""), "question_number": question_number}
+    else:
+        async for kind, value in stream_adaptive_question(
+            original_issue=session["main_issue"],
+            hypotheses=session["hypotheses"],
+            answers_history=session["answers_history"],
+            asked_questions=session["asked_questions"],
+            domain=session["domain"]
+        ):
+            if kind == "question":
+                yield "question", {"question": value, "question_number": question_number}
+            else:
+                question_data = value
+
+    record_question(session, question_data, _trace(session, timings, started, confidence_score, should_stop))
+    if not await commit_answer(request.session_id, session, seen):
+        yield "error", await _superseded(request.session_id)
+        return
+    if committed is not None:
+        committed["session"] = session
+    yield "options", {**_question_fields(question_data), "top_hypothesis": _top_hypothesis(session)}
+    yield "done", {}
+
+@routes.websocket("/ws/diagnose")
+async def diagnose_socket(websocket: WebSocket):
+    """
+    The whole /start → /answer loop over one connection. The client sends
+    {"type": "start", "message"} and then {"type": "answer", "selected_option",
+    "question_number"}; the server pushes the /start/stream and /answer/stream
+    events as {"type": event, ...}. While the user reads a question, the one
+    after its likeliest answer is already being generated.
+    """
+    await websocket.accept()
+    metrics.ws_connections.inc()
+    session_id, prefetch = None, None
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "error": "Messages must be JSON"})
+                continue
+            started, committed = time.perf_counter(), {}
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "start" and isinstance(message.get("message"), str):
+                current_priority.set("start")
+                if prefetch:
+                    abandon(prefetch[1][0])
+                    prefetch = None
+                events = _start_events(message["message"], committed)
+            elif kind == "answer" and session_id and isinstance(message.get("selected_option"), str):
+                current_priority.set("answer")
+                request = AnswerRequest(
+                    session_id=session_id,
+                    selected_option=message["selected_option"],
+                    question_number=message.get("question_number")
+                )
+                prefetched = None
+                if prefetch:
+                    answer, speculative = prefetch
+                    if answer.strip().lower() == request.selected_option.strip().lower():
+                        prefetched = speculative
+                    else:
+                        abandon(speculative[0])
+                    prefetch = None
+                events = _locked(session_id, _answer_events(request, prefetched, committed))
+            else:
+                await websocket.send_json({"type": "error", "error": "Expected a start message, then answer messages"})
+                continue
+
+            async for event, data in events:
+                if event == "session":
+                    session_id = data["session_id"]
+                await websocket.send_json({"type": event, **data})
+            metrics.ws_message_seconds.observe(time.perf_counter() - started, kind)
+
+            # The session as this turn left it; none once it has finished
+            session = committed.get("session")
+            if session and WS_PREFETCH_MIN_SHARE:
+                # Speculative work queues behind live answers
+                token = current_priority.set("start")
+                prefetch = prefetch_next_question(session, WS_PREFETCH_MIN_SHARE)
+                current_priority.reset(token)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if prefetch:
+            abandon(prefetch[1][0])
+        metrics.ws_connections.dec()
+
+async def _locked(session_id, events):
+    """Run an event generator under the session's lock"""
+    async with session_lock(session_id):
+        async for event in events:
+            yield event
+
+@routes.post("/batch/start")
+async def batch_start(request: Request, offset: int = 0):
+    """
+    Bulk triage (JSONL in, JSONL out): one {"id", "message"} per request line,
+    one {"id", "main_issue", "risk_level", "hypotheses"} per enquiry as packs
+    finish, and {"checkpoint": n} lines; resend the body with ?offset=n to resume
+    """
+    lines = (await request.body()).decode("utf-8", errors="replace").splitlines()
+
+    async def rows():
+        async for row in triage(lines, offset):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@routes.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@routes.post("/debug/session/{session_id}")
+async def debug_session(session_id: str):
     """Debug endpoint to see session state"""
-    session = get_session(session_id)
+    session = await get_session(session_id)
     if not session:
         return {"error": "Session not found"}
-    
+
     return {
         "main_issue": session["main_issue"],
         "hypotheses": session["hypotheses"],
         "answers_count": session["answer_count"],
-        "risk_level": session["risk_level"]
+        "risk_level": session["risk_level"],
+        "domain": session["domain"]
     }
+
+@routes.get("/debug/stats")
+async def debug_stats():
+    """Debug endpoint for pipeline counters"""
+    return {
+        "sessions": await session_stats(),
+        "speculation": speculation_stats(),
+        "confidence_gate": gate_stats(),
+        "intent_cache": intent_cache.snapshot(),
+        "first_question_cache": first_question_cache.snapshot(),
+        "json_parsing": parse_stats,
+        "llm_scheduler": scheduler.snapshot(),
+        "model_router": get_router().snapshot(),
+        "question_trees": tree_index.snapshot(),
+        "completion_log": completion_log.snapshot(),
+        "answer_replay": replay_snapshot(),
+        "question_prompt_tokens": prompt_token_stats()
+    }
+
+
+def create_app(router=None, store=None):
+    """
+    A new app serving the API. router (a model_router.ModelRouter, e.g. over
+    cassette clients) handles its LLM calls and store (a session_store store)
+    holds its sessions; by default both are the process-wide ones, built from
+    config when first needed. Other apps in the process are unaffected.
+    """
+    app = FastAPI(lifespan=lifespan, dependencies=[Depends(use_app_state)])
+    app.state.router = router
+    app.state.store = store
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(time_requests)
+    app.add_exception_handler(SchedulerOverloaded, shed_load)
+    app.include_router(routes)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,192 @@
+import bisect
+import contextvars
+import functools
+import time
+
+# Latency buckets in seconds (LLM calls range from ~50ms to tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is one bisect and two adds"""
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., overflow, sum, count]
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{base} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{base} {series[-1]}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+registry = []
+
+
+def counter(name, help_text, labels=()):
+    metric = Counter(name, help_text, tuple(labels))
+    registry.append(metric)
+    return metric
+
+
+def gauge(name, help_text, labels=()):
+    metric = Gauge(name, help_text, tuple(labels))
+    registry.append(metric)
+    return metric
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    metric = Histogram(name, help_text, tuple(labels), buckets)
+    registry.append(metric)
+    return metric
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# LLM engine
+llm_queue_seconds = histogram("llm_queue_wait_seconds", "Time waiting for an LLM call slot", ["stage", "domain"])
+llm_queue_depth = gauge("llm_queue_depth", "LLM calls waiting for a slot", ["priority"])
+llm_model_seconds = histogram("llm_model_seconds", "LLM provider round-trip time", ["stage", "domain"])
+llm_parse_seconds = histogram("llm_parse_seconds", "Time parsing and validating a model reply", ["stage"])
+llm_stage_seconds = histogram("llm_stage_seconds", "End-to-end time of an engine stage", ["stage"])
+llm_prompt_tokens = histogram("llm_prompt_tokens", "Prompt tokens per LLM call", ["stage"], TOKEN_BUCKETS)
+llm_completion_tokens = histogram("llm_completion_tokens", "Completion tokens per LLM call", ["stage"], TOKEN_BUCKETS)
+llm_calls = counter("llm_calls_total", "LLM calls by outcome", ["stage", "domain", "outcome"])
+llm_retries = counter("llm_retries_total", "LLM call retries", ["stage"])
+llm_backend_calls = counter("llm_backend_calls_total", "LLM provider calls by backend, model and outcome", ["backend", "model", "outcome"])
+llm_hedges = counter("llm_hedges_total", "Duplicate LLM calls sent after the primary passed its p95", ["stage"])
+llm_failovers = counter("llm_failovers_total", "LLM calls moved to another backend after a failure", ["stage"])
+llm_coalesced = counter("llm_coalesced_total", "LLM calls served by an identical in-flight call", ["stage"])
+llm_parse = counter("llm_parse_total", "Model reply parsing by outcome", ["stage", "outcome"])
+
+# Sessions (live/bytes refreshed by the session reaper)
+session_stops = counter("session_stops_total", "Sessions ended by the stopping policy, by rule", ["reason"])
+answer_replays = counter("answer_replays_total", "Duplicate /answer submissions answered from an earlier run", ["source"])
+start_fallbacks = counter("start_fallbacks_total", "Fused /start replies that broke off after the intent; the question was generated on its own")
+answer_llm_calls_deduplicated = counter("answer_llm_calls_deduplicated_total", "LLM calls duplicate /answer submissions did not repeat")
+sessions_live = gauge("sessions_live", "Sessions currently held by the session store")
+sessions_bytes = gauge("sessions_bytes", "Estimated bytes of live sessions (stored bytes for SQLite and Redis)")
+
+# HTTP
+http_request_seconds = histogram("http_request_seconds", "HTTP request latency", ["path"])
+ws_connections = gauge("ws_connections", "Open /ws/diagnose connections")
+ws_message_seconds = histogram("ws_message_seconds", "WebSocket turn latency, client message to done event", ["type"])
+
+
+# Per-request stage totals for the completion log; tasks spawned by the
+# request (speculative questions) add to the same dict
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def collect_stage_timings():
+    """Start collecting stage timings for the current request; returns the dict they go into"""
+    timings = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+# Provider calls made on behalf of the current request (shared with tasks it spawns)
+_llm_call_count = contextvars.ContextVar("llm_call_count", default=None)
+
+
+def count_llm_calls():
+    """Start counting LLM calls for the current request; returns the one-item list they go into"""
+    counter = [0]
+    _llm_call_count.set(counter)
+    return counter
+
+
+def llm_call_made():
+    counter = _llm_call_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrumented(stage):
+    """Time an engine coroutine end to end under the given stage label"""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                llm_stage_seconds.observe(elapsed, stage)
+                timings = _stage_timings.get()
+                if timings is not None:
+                    timings[stage] = round(timings.get(stage, 0.0) + elapsed, 4)
+        return timed
+    return wrap
@@ -0,0 +1,264 @@
+import asyncio
+import collections
+import contextvars
+import importlib
+import os
+import time
+import httpx
+import metrics
+from cassette import cassette_client
+from config import (
+    LLM_BACKENDS, LLM_ROUTES, LLM_HEDGE, LLM_HEDGE_MIN, LLM_BACKEND_COOLDOWN,
+    LLM_POOL_SIZE, LLM_KEEPALIVE, LLM_KEEPALIVE_EXPIRY, LLM_WARM_CONNECTIONS, LLM_TIMEOUT
+)
+
+# Backend kind -> (SDK module, async client class). Only the SDKs that
+# LLM_BACKENDS uses are imported; openai's alone adds ~0.5s to a cold start
+CLIENTS = {"groq": ("groq", "AsyncGroq"), "openai": ("openai", "AsyncOpenAI")}
+SDKS = {
+    kind: importlib.import_module(CLIENTS[kind][0])
+    for kind in sorted({"groq"} | {spec.get("kind", "groq") for spec in LLM_BACKENDS.values()})
+}
+
+# Each SDK raises its own copy of the same error hierarchy
+API_ERRORS = tuple(sdk.APIError for sdk in SDKS.values())
+RATE_LIMIT_ERRORS = tuple(sdk.RateLimitError for sdk in SDKS.values())
+# Transient provider failures worth another attempt (429, 5xx, network)
+RETRYABLE_ERRORS = tuple(
+    error for sdk in SDKS.values() for error in (sdk.APIConnectionError, sdk.RateLimitError, sdk.InternalServerError)
+)
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 100  # recent latencies kept per target for the hedge deadline
+MIN_HEDGE_SAMPLES = 20
+FAILURES_BEFORE_COOLDOWN = 3
+# A later target only overtakes an earlier one that is this many times slower,
+# so a fast small fallback doesn't permanently replace the configured model
+SWITCH_FACTOR = 2.0
+# Every Nth call keeps the configured order so a demoted target gets fresh samples
+PROBE_EVERY = 20
+WARM_TIMEOUT = 5.0  # don't hold up startup for an unreachable backend
+
+
+def retry_after(error):
+    """Seconds from the provider's Retry-After header, if it sent one"""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def make_client(spec):
+    """
+    One pooled async client for a backend entry of LLM_BACKENDS (recording,
+    or replaced by a cassette replay, under LLM_CASSETTE_MODE)
+    """
+    kind = spec.get("kind", "groq")
+    if kind not in SDKS:
+        raise ValueError(f"Backend kind {kind!r} is not used by LLM_BACKENDS, so its SDK isn't loaded")
+
+    def make_real():
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_KEEPALIVE, keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=LLM_TIMEOUT
+        )
+        return getattr(SDKS[kind], CLIENTS[kind][1])(
+            api_key=os.getenv(spec.get("api_key_env", "GROQ_API_KEY")),
+            base_url=spec.get("base_url"),
+            http_client=http_client,
+            timeout=LLM_TIMEOUT,
+            max_retries=0  # retried in llm_engine so attempts are counted and paced
+        )
+
+    return cassette_client(make_real)
+
+
+class Target:
+    """A backend + model pair with rolling latency and error health"""
+
+    def __init__(self, backend, model, client):
+        self.backend = backend
+        self.model = model
+        self.client = client
+        self.latency = None  # EWMA seconds of successful calls
+        self.error_rate = 0.0  # EWMA share of failed calls
+        self.failures = 0  # consecutive
+        self.cooldown_until = 0.0
+        self.recent = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def succeeded(self, seconds):
+        self.latency = seconds if self.latency is None else self.latency + EWMA_ALPHA * (seconds - self.latency)
+        self.error_rate *= 1 - EWMA_ALPHA
+        self.failures = 0
+        self.recent.append(seconds)
+        metrics.llm_backend_calls.inc(self.backend, self.model, "ok")
+
+    def failed(self, error):
+        self.error_rate += EWMA_ALPHA * (1 - self.error_rate)
+        self.failures += 1
+        wait = retry_after(error) if isinstance(error, RATE_LIMIT_ERRORS) else None
+        if isinstance(error, RATE_LIMIT_ERRORS) or self.failures >= FAILURES_BEFORE_COOLDOWN:
+            self.cooldown_until = time.monotonic() + (wait or LLM_BACKEND_COOLDOWN)
+        metrics.llm_backend_calls.inc(self.backend, self.model, "error")
+
+    def cooling_for(self, now):
+        return max(0.0, self.cooldown_until - now)
+
+    def score(self):
+        """Expected seconds per successful call"""
+        return self.latency / max(1 - self.error_rate, 0.1)
+
+    def hedge_after(self):
+        """This target's recent p95, once there are enough samples to trust it"""
+        if len(self.recent) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return max(LLM_HEDGE_MIN, ordered[int(0.95 * (len(ordered) - 1))])
+
+    def snapshot(self):
+        return {
+            "latency_ewma": round(self.latency, 4) if self.latency is not None else None,
+            "error_rate_ewma": round(self.error_rate, 3),
+            "hedge_after": self.hedge_after(),
+            "cooling_for": round(self.cooling_for(time.monotonic()), 2)
+        }
+
+
+class ModelRouter:
+    """
+    Picks the backend and model for each engine stage. Stages list targets in
+    order of preference; the router reorders them by health, fails over on
+    transient errors and hedges calls that run past the primary's p95.
+    """
+
+    def __init__(self, backends, routes, hedge=LLM_HEDGE, clients=None):
+        # clients (backend name -> client) replaces make_client, e.g. with cassette replays
+        self.clients = clients if clients is not None else {name: make_client(spec) for name, spec in backends.items()}
+        self.targets = {}  # "backend:model" -> Target, shared by every stage routed to it
+        self.routes = {stage: [self._target(name) for name in names] for stage, names in routes.items()}
+        self.hedge = hedge
+        self.calls = 0
+
+    def _target(self, name):
+        if name not in self.targets:
+            backend, model = name.split(":", 1)
+            self.targets[name] = Target(backend, model, self.clients[backend])
+        return self.targets[name]
+
+    def order(self, stage):
+        """Targets for stage, best first; cooling targets go last, soonest to recover first"""
+        now = time.monotonic()
+        targets = self.routes.get(stage) or self.routes["default"]
+        healthy = [t for t in targets if not t.cooling_for(now)]
+        cooling = sorted((t for t in targets if t.cooling_for(now)), key=lambda t: t.cooldown_until)
+        if not healthy:
+            return cooling
+
+        self.calls += 1
+        best = healthy[0]
+        if self.calls % PROBE_EVERY:
+            for target in healthy[1:]:
+                if target.latency is not None and best.latency is not None and best.score() > SWITCH_FACTOR * target.score():
+                    best = target
+        return [best] + [t for t in healthy if t is not best] + cooling
+
+    def cooling_for(self, stage):
+        """Seconds until any target for stage accepts calls again (0 if one does now)"""
+        now = time.monotonic()
+        return min(t.cooling_for(now) for t in self.routes.get(stage) or self.routes["default"])
+
+    async def complete(self, stage, call):
+        """
+        Run call(target) on the best target for stage and return the first
+        success. A transient failure moves on to the next target; a call that
+        outlives the primary's p95 gets one duplicate on the next target.
+        """
+        remaining = iter(self.order(stage))
+        pending = {}
+        hedged = False
+
+        def launch():
+            target = next(remaining, None)
+            if target is not None:
+                pending[asyncio.ensure_future(call(target))] = target
+            return target
+
+        latest = launch()
+        error = None
+        try:
+            while pending:
+                deadline = latest.hedge_after() if self.hedge and not hedged else None
+                done, _ = await asyncio.wait(pending, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        metrics.llm_hedges.inc(stage)
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if not isinstance(error, RETRYABLE_ERRORS):
+                        raise error
+                if not pending:
+                    latest = launch() or latest
+                    if pending:
+                        metrics.llm_failovers.inc(stage)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def warm(self, connections=LLM_WARM_CONNECTIONS):
+        """Open pooled connections to every backend before the first request needs them"""
+        async def touch(client):
+            try:
+                await client.with_options(timeout=WARM_TIMEOUT).models.list()
+            except API_ERRORS:
+                pass  # any reply (even an error) leaves a warm connection in the pool
+
+        await asyncio.gather(*(touch(client) for client in self.clients.values() for _ in range(connections)))
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.close()
+
+    def snapshot(self):
+        return {name: target.snapshot() for name, target in self.targets.items()}
+
+
+_router = None
+# The router of the app serving the current request (see main.create_app);
+# None means the process-wide one
+current_router = contextvars.ContextVar("llm_router", default=None)
+
+
+def get_router():
+    """
+    The current app's router, else the process-wide one, built from
+    LLM_BACKENDS/LLM_ROUTES on first use
+    """
+    router = current_router.get()
+    if router is not None:
+        return router
+    global _router
+    if _router is None:
+        _router = ModelRouter(LLM_BACKENDS, LLM_ROUTES)
+    return _router
+
+
+def set_router(router):
+    """Serve LLM calls outside an app with its own router through router (tests, benchmarks)"""
+    global _router
+    _router = router
+
+
+async def close_router():
+    """Close the process-wide router's clients, if one was ever built"""
+    global _router
+    if _router is not None:
+        await _router.aclose()
+        _router = None
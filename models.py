@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class StartRequest(BaseModel):
     message: str
@@ -7,6 +7,10 @@ class StartRequest(BaseModel):
 class AnswerRequest(BaseModel):
     session_id: str
     selected_option: str
+    # Retries and double submissions carrying the same key (or answering the
+    # same question_number) get the first submission's response replayed
+    idempotency_key: Optional[str] = None
+    question_number: Optional[int] = None  # as returned with the question being answered
 
 class Hypothesis(BaseModel):
     name: str
@@ -14,8 +18,14 @@ class Hypothesis(BaseModel):
     probability: float
     key_evidence: List[str]
 
+class IntentResponse(BaseModel):
+    main_issue: str
+    risk_level: str = "low"
+    hypotheses: List[Hypothesis]
+
 class QuestionResponse(BaseModel):
     question: str
     options: List[str]
     reasoning: Optional[str] = None
     targets: Optional[List[str]] = None
+    likelihoods: Optional[Dict[str, List[float]]] = None
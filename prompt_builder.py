@@ -0,0 +1,154 @@
+import re
+from config import QUESTION_PROMPT_BUDGET
+
+# Verbatim Q&A pairs kept before older ones are folded into compact facts
+RECENT_TURNS = 2
+
+# Static instructions for generate_adaptive_question. Sent as an identical
+# system message every turn so provider-side prefix caching can reuse it.
+QUESTION_SYSTEM_PROMPT = """You are a smart diagnostic AI like ChatGPT. Act like a helpful expert having a natural conversation.
+
+YOUR JOB:
+Generate ONE clever follow-up question that:
+1. Act natural and conversational - like you're learning as you go
+2. Is COMPLETELY DIFFERENT from questions already asked
+3. Narrows down between top 2 hypotheses
+4. Asks about OBSERVABLE FACTS only
+5. Flows naturally from the conversation
+6. Gets information we DON'T have yet
+
+SMART QUESTION STRATEGY:
+- If we know "started 2 weeks ago", don't ask about timing again
+- If we know "worse after rain", don't ask about weather again
+- Ask about the NEXT logical thing: other symptoms, context, patterns, triggers
+- Make it conversational: "So you mentioned X... Does Y happen too?"
+
+Think about what distinguishes the top 2 hypotheses:
+- What evidence would support one over the other?
+- What do we still NOT know?
+- Ask about that!
+
+Generate a SINGLE smart question that:
+- Is natural and conversational
+- Asks something NEW we haven't covered
+- Will help distinguish between the top hypotheses
+- Provides 3-4 realistic observable options
+
+For EVERY option, give "likelihoods": how likely a person would pick that option
+if each hypothesis were the real cause (0.0 to 1.0, one number per hypothesis,
+in the order of the numbered hypothesis list).
+
+Return ONLY valid JSON (no markdown, no code blocks):
+{
+    "question": "your smart conversational question",
+    "options": ["option 1", "option 2", "option 3"],
+    "likelihoods": {
+        "option 1": [0.8, 0.3, 0.1],
+        "option 2": [0.1, 0.6, 0.3],
+        "option 3": [0.1, 0.1, 0.6]
+    },
+    "reasoning": "why this question helps narrow it down"
+}"""
+
+# Estimated vs. provider-reported input tokens per question turn
+prompt_stats = {}
+
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def _shorten(text, words):
+    parts = text.split()
+    return " ".join(parts[:words]) + ("…" if len(parts) > words else "")
+
+
+def _dedupe(answers_history, asked_questions):
+    """Unique (question, answer) pairs in order; unanswered asked questions get answer None"""
+    pairs = {}
+    for item in answers_history:
+        pairs[_NON_WORD.sub("", item["question"].lower())] = (item["question"], item["answer"])
+    for question in asked_questions or []:
+        pairs.setdefault(_NON_WORD.sub("", question.lower()), (question, None))
+    return list(pairs.values())
+
+
+def _render(original_issue, domain, hypotheses, n_asked, earlier, recent):
+    ranked = sorted(hypotheses, key=lambda x: x["probability"], reverse=True)
+    top = "\n".join(f"  {i + 1}. {h['name']} ({h['probability']:.0%})" for i, h in enumerate(ranked[:2]))
+    order = "\n".join(f"H{i + 1}. {h['name']}" for i, h in enumerate(hypotheses))
+    covered = "\n".join(
+        f"- {q} → {a}" if a is not None else f"- {q}" for q, a in recent
+    ) or "None yet"
+    lines = [
+        "CONTEXT:",
+        f"- Issue: {original_issue}",
+        f"- Domain: {domain}",
+        f"- Questions already asked: {n_asked}",
+        "- Top 2 hypotheses:",
+        top,
+        "",
+        "Numbered hypotheses (likelihood order):",
+        order,
+        "",
+    ]
+    if earlier:
+        lines += [
+            "Earlier questions, with answers where known (NEVER REPEAT THESE):",
+            "; ".join(f"{q} → {a}" if a is not None else q for q, a in earlier),
+            ""
+        ]
+    lines += ["Latest questions and answers (NEVER REPEAT THESE):", covered]
+    return "\n".join(lines)
+
+
+def build_question_messages(original_issue, domain, hypotheses, answers_history, asked_questions, budget=QUESTION_PROMPT_BUDGET):
+    """
+    Chat messages for generate_adaptive_question. Duplicate questions are
+    dropped and older Q&A is shortened. Every asked question stays in the
+    prompt so the model can't repeat one; over the token budget, only the
+    answers to the oldest questions are dropped.
+    Returns (messages, estimated_input_tokens).
+    """
+    pairs = _dedupe(answers_history, asked_questions)
+    recent = pairs[-RECENT_TURNS:]
+    earlier = [(_shorten(q, 6), _shorten(a, 5) if a is not None else None) for q, a in pairs[:-RECENT_TURNS]]
+    n_asked = len(pairs)
+
+    context = _render(original_issue, domain, hypotheses, n_asked, earlier, recent)
+    for i, (question, answer) in enumerate(earlier):
+        if estimate_tokens(context) <= budget:
+            break
+        if answer is not None:
+            earlier[i] = (question, None)
+            context = _render(original_issue, domain, hypotheses, n_asked, earlier, recent)
+
+    messages = [
+        {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+        {"role": "user", "content": context}
+    ]
+    return messages, estimate_tokens(QUESTION_SYSTEM_PROMPT) + estimate_tokens(context)
+
+
+def record_prompt_tokens(turn, estimated, actual=None):
+    """Track input tokens per question turn (actual comes from the provider's usage)"""
+    stats = prompt_stats.setdefault(turn, {"calls": 0, "estimated": 0, "actual": 0})
+    stats["calls"] += 1
+    stats["estimated"] += estimated
+    if actual:
+        stats["actual"] += actual
+
+
+def prompt_token_stats():
+    """Average input tokens per question turn"""
+    return {
+        f"turn_{turn}": {
+            "calls": s["calls"],
+            "avg_estimated": round(s["estimated"] / s["calls"]),
+            "avg_actual": round(s["actual"] / s["calls"]) if s["actual"] else None
+        }
+        for turn, s in sorted(prompt_stats.items())
+    }
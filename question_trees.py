@@ -0,0 +1,164 @@
+"""
+Question trees mined from completed sessions.
+
+A tree belongs to one issue cluster: the same normalized main_issue and the
+same hypothesis list (option likelihoods are positional, so the list must
+match exactly). Each node is the state after a sequence of answers and holds
+the question most sessions were asked there, with its options and
+likelihoods, plus the final answer sessions that stopped there agreed on.
+
+    python question_trees.py completion_log/ --out question_trees.json --min-support 5
+"""
+import argparse
+import copy
+import json
+import os
+from collections import Counter
+from completion_log import iter_completions
+from config import QUESTION_TREES_PATH, QUESTION_TREE_MIN_SUPPORT
+from response_cache import normalize_text
+
+
+def tree_key(main_issue, hypotheses):
+    return normalize_text(main_issue) + " | " + " | ".join(h["name"].strip().lower() for h in hypotheses)
+
+
+def _question_key(text):
+    return normalize_text(text)
+
+
+def _answer_key(answer):
+    return str(answer).strip().lower()
+
+
+# -------------------------
+# Offline builder
+# -------------------------
+
+def build_trees(sessions, min_support=QUESTION_TREE_MIN_SUPPORT):
+    """{tree_key: root node} for every cluster with at least min_support sessions"""
+    clusters = {}
+    for session in sessions:
+        if session.get("turns") and session.get("hypotheses"):
+            clusters.setdefault(tree_key(session["main_issue"], session["hypotheses"]), []).append(session)
+
+    trees = {}
+    for key, group in clusters.items():
+        if len(group) >= min_support:
+            root = _build_node(group, 0, min_support)
+            if root:
+                trees[key] = root
+    return trees
+
+
+def _build_node(sessions, depth, min_support):
+    """
+    Node for sessions that gave the same first `depth` answers. Only sessions
+    that were asked the majority question at this depth continue below it.
+    """
+    node = {"sessions": len(sessions)}
+
+    # Sessions that stopped here: keep each top hypothesis' most common final answer
+    finals = Counter(
+        (_answer_key(s["top_hypothesis"]), s["final_response"])
+        for s in sessions if len(s["turns"]) == depth and s.get("final_response")
+    )
+    agreed = {}
+    for (top, text), count in finals.most_common():
+        if count >= min_support and top not in agreed:
+            agreed[top] = text
+    if agreed:
+        node["finals"] = agreed
+
+    asked = [s for s in sessions if len(s["turns"]) > depth and s["turns"][depth]["question"].get("options")]
+    counts = Counter(_question_key(s["turns"][depth]["question"]["question"]) for s in asked)
+    if counts:
+        text, support = counts.most_common(1)[0]
+        if support >= min_support:
+            followers = [s for s in asked if _question_key(s["turns"][depth]["question"]["question"]) == text]
+            node["question"] = followers[0]["turns"][depth]["question"]
+            by_answer = {}
+            for s in followers:
+                by_answer.setdefault(_answer_key(s["turns"][depth]["answer"]), []).append(s)
+            children = {}
+            for answer, group in by_answer.items():
+                child = _build_node(group, depth + 1, min_support)
+                if child:
+                    children[answer] = child
+            node["children"] = children
+
+    return node if "question" in node or "finals" in node else None
+
+
+# -------------------------
+# Runtime index
+# -------------------------
+
+class QuestionTreeIndex:
+    """Serves questions and final answers for sessions still on a known path"""
+
+    def __init__(self, trees=None):
+        self.trees = trees or {}
+        self.stats = {"questions_served": 0, "finals_served": 0, "off_path": 0, "no_tree": 0}
+
+    @classmethod
+    def load(cls, path):
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _node(self, original_issue, hypotheses, answers_history):
+        """The node for this session's answers so far, or None once it left the tree"""
+        if not self.trees:
+            return None
+        node = self.trees.get(tree_key(original_issue, hypotheses))
+        if node is None:
+            self.stats["no_tree"] += 1
+            return None
+        for turn in answers_history:
+            question = node.get("question")
+            if not question or _question_key(question["question"]) != _question_key(turn["question"]):
+                node = None
+            else:
+                node = node["children"].get(_answer_key(turn["answer"]))
+            if node is None:
+                self.stats["off_path"] += 1
+                return None
+        return node
+
+    def next_question(self, original_issue, hypotheses, answers_history):
+        node = self._node(original_issue, hypotheses, answers_history)
+        if node is None or "question" not in node:
+            return None
+        self.stats["questions_served"] += 1
+        return copy.deepcopy(node["question"])
+
+    def final_response(self, original_issue, hypotheses, answers_history):
+        node = self._node(original_issue, hypotheses, answers_history)
+        if node is None or not hypotheses:
+            return None
+        top = max(hypotheses, key=lambda h: h["probability"])
+        final = node.get("finals", {}).get(_answer_key(top["name"]))
+        if final:
+            self.stats["finals_served"] += 1
+        return final
+
+    def snapshot(self):
+        return {**self.stats, "trees": len(self.trees)}
+
+
+tree_index = QuestionTreeIndex.load(QUESTION_TREES_PATH)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="completion log directory (COMPLETION_LOG_DIR) or one segment")
+    parser.add_argument("--out", default=QUESTION_TREES_PATH)
+    parser.add_argument("--min-support", type=int, default=QUESTION_TREE_MIN_SUPPORT)
+    args = parser.parse_args()
+
+    trees = build_trees(iter_completions(args.log), args.min_support)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(trees, f, ensure_ascii=False)
+    print(f"{len(trees)} trees written to {args.out}")
@@ -0,0 +1,145 @@
+import copy
+import json
+import re
+import time
+from collections import OrderedDict
+from domain_classifier import classify_domain
+
+STOPWORDS = {
+    "a", "an", "the", "my", "i", "im", "me", "is", "are", "was", "it", "its", "and", "or",
+    "to", "of", "in", "on", "for", "with", "at", "this", "that", "be", "been", "so", "just",
+    "have", "has", "had", "do", "does", "keep", "keeps", "really", "very"
+}
+
+# Words that flip a message's meaning while barely changing its word overlap
+# ("t" is what's left of n't once punctuation is dropped)
+NEGATIONS = {"no", "not", "never", "none", "nothing", "without", "cannot", "cant", "dont", "doesnt", "isnt", "wont", "t"}
+# A borrowed intent here would drive a risky session, so these always go to the model
+EXACT_ONLY_DOMAINS = {"health", "safety"}
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+def _stem(word):
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def shingles(normalized):
+    """Stemmed content words used for near-duplicate matching"""
+    return frozenset(_stem(w) for w in normalized.split() if w not in STOPWORDS)
+
+
+def _near_domain(normalized):
+    """The domain a near-duplicate match must share, or None if text may only match exactly"""
+    if NEGATIONS.intersection(normalized.split()):
+        return None
+    domain = classify_domain(normalized)
+    return None if domain in EXACT_ONLY_DOMAINS else domain
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache keyed on normalized text, bounded by entry count and
+    approximate bytes. With similarity > 0, misses fall back to the most
+    similar cached key (word-shingle Jaccard) through an inverted index,
+    among keys of the same domain; negated and health/safety texts only
+    match exactly.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl, similarity=0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (expires_at, size, shingles, domain, value)
+        self._index = {}  # shingle -> set of keys
+        self.bytes = 0
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, text):
+        if not self.max_entries:
+            return None
+        key = normalize_text(text)
+        entry = self._live_entry(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+        elif self.similarity > 0:
+            key = self._nearest(key)
+            entry = self._live_entry(key) if key else None
+            if entry is not None:
+                self.stats["near_hits"] += 1
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        # Sessions mutate hypotheses in place, so never hand out the stored object
+        return copy.deepcopy(entry[4])
+
+    def put(self, text, value):
+        if not self.max_entries:
+            return
+        key = normalize_text(text)
+        if key in self._entries:
+            self._remove(key)
+        size = len(key) + len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        words, domain = shingles(key), _near_domain(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, words, domain, copy.deepcopy(value))
+        if self.similarity > 0 and domain:
+            for word in words:
+                self._index.setdefault(word, set()).add(key)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            self.stats["expired"] += 1
+            return None
+        return entry
+
+    def _nearest(self, key):
+        words, domain = shingles(key), _near_domain(key)
+        if not words or not domain:
+            return None
+        overlap = {}
+        for word in words:
+            for candidate in self._index.get(word, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+        best, best_score = None, self.similarity
+        for candidate, shared in overlap.items():
+            other, other_domain = self._entries[candidate][2:4]
+            if other_domain != domain:
+                continue
+            score = shared / (len(words) + len(other) - shared)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _remove(self, key):
+        _, size, words, _, _ = self._entries.pop(key)
+        self.bytes -= size
+        for word in words:
+            keys = self._index.get(word)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._index[word]
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["near_hits"]) / lookups if lookups else 0.0
+        return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "hit_rate": round(hit_rate, 3)}
@@ -1,47 +1,223 @@
+import asyncio
+import contextlib
+import contextvars
 import uuid
+from collections import OrderedDict
+import metrics
+from bayes import apply_vector, bayes_update, build_index, parse_likelihoods, probability_vector
+from config import ANSWER_REPLAY_SIZE, SESSION_STORE, SESSION_TTL, SESSION_MAX, SESSION_MAX_BYTES, SESSION_SQLITE_PATH, SESSION_REAP_INTERVAL, REDIS_URL
+from domain_classifier import classify_domain
+from session_store import Session, make_store
 
-sessions = {}
+store = None
+# The session store of the app serving the current request (see
+# main.create_app); None means the process-wide one
+current_store = contextvars.ContextVar("session_store", default=None)
 
-def create_session(original_message, intent_data):
-    """Create a new diagnostic session with hypotheses"""
+def _store():
+    """The current app's session store, else the process-wide one, built on first use"""
+    current = current_store.get()
+    if current is not None:
+        return current
+    global store
+    if store is None:
+        store = make_store(SESSION_STORE, SESSION_TTL, SESSION_MAX, SESSION_SQLITE_PATH, REDIS_URL, SESSION_MAX_BYTES)
+    return store
+
+def _reuse(text, held):
+    """
+    The string equal to text that the session already holds, so a question or
+    picked option is stored once however many fields refer to it. Only within
+    a session: model and user text rarely repeats across sessions, and a
+    process-wide table (sys.intern) would keep all of it alive.
+    """
+    return next((h for h in held if h == text), text)
+
+def new_session(original_message, intent_data):
+    """A new diagnostic session with hypotheses; returns (session_id, session), not yet saved"""
     session_id = str(uuid.uuid4())
+    # key_evidence only guides the model's own reasoning; the session never reads it
+    hypotheses = [
+        {"name": h.get("name", ""), "description": h.get("description", ""), "probability": h.get("probability", 0)}
+        for h in intent_data.get("hypotheses", [])
+    ]
+    probs = probability_vector(hypotheses)
 
-    sessions[session_id] = {
+    return session_id, Session(**{
         "original_message": original_message,
         "main_issue": intent_data.get("main_issue", ""),
         "risk_level": intent_data.get("risk_level", "low"),
-        "hypotheses": intent_data.get("hypotheses", []),
+        "domain": classify_domain(original_message, intent_data.get("main_issue", "")),
+        "hypotheses": apply_vector(hypotheses, probs),
+        "probs": probs,  # Normalized probabilities, same order as hypotheses
+        "hyp_index": build_index(hypotheses),
+        "likelihoods": None,  # Per-option likelihoods for the current question
+        "questions": [],  # Every question asked, with options and likelihoods
+        "trace": [],  # Per request: probabilities, verdict and stage timings
         "answers_history": [],  # Track all Q&A pairs
         "asked_questions": [],
         "answer_count": 0
-    }
+    })
 
+async def create_session(original_message, intent_data):
+    """Create and save a new diagnostic session; returns its id"""
+    session_id, session = new_session(original_message, intent_data)
+    await save_session(session_id, session)
     return session_id
 
-def get_session(session_id):
-    """Get session data"""
-    return sessions.get(session_id)
+async def get_session(session_id):
+    """The session's current state, as a copy to change and save back (None if unknown)"""
+    return await _store().get(session_id)
+
+async def save_session(session_id, session):
+    await _store().put(session_id, session)
+
+async def commit_answer(session_id, session, answer_count):
+    """
+    Save a session that took one more answer, unless the stored one no longer
+    has answer_count answers (another request or worker got there first).
+    Returns whether it was saved.
+    """
+    return await _store().put_if(session_id, session, answer_count)
+
+async def add_answer_to_session(session_id, question, answer):
+    """
+    Record an answer in a stored session in one load and compare-and-set
+    commit. Returns the updated session, or None if the session is gone or
+    another request recorded an answer in between.
+    """
+    session = await get_session(session_id)
+    if session is None:
+        return None
+    seen = session["answer_count"]
+    add_answer(session, question, answer)
+    return session if await commit_answer(session_id, session, seen) else None
 
-def add_answer_to_session(session_id, question, answer):
+# The functions below change the session they're given; nothing is stored
+# until the request saves or commits it, so a failed request leaves no trace
+
+def add_answer(session, question, answer):
     """Add an answer to the session's history"""
-    session = sessions.get(session_id)
-    if session:
-        session["answers_history"].append({
+    last = session["questions"][-1] if session["questions"] else {}
+    question = _reuse(question, session["asked_questions"][-1:])
+    answer = _reuse(answer, last.get("options", ()))
+    session["answers_history"].append({
+        "question": question,
+        "answer": answer
+    })
+    # Only add to asked_questions if it's not already there (avoid duplicates)
+    if question not in session["asked_questions"]:
+        session["asked_questions"].append(question)
+    session["answer_count"] += 1
+    return session
+
+def record_question(session, question_data, trace=None):
+    """Track a newly asked question, its per-option likelihoods and the request's trace"""
+    if trace:
+        session.setdefault("trace", []).append(trace)
+    question = question_data.get("question", "")
+    if question and question not in session["asked_questions"]:
+        session["asked_questions"].append(question)
+    session["likelihoods"] = parse_likelihoods(question_data, len(session["hypotheses"]))
+    if question:
+        session.setdefault("questions", []).append({
             "question": question,
-            "answer": answer
+            "options": list(question_data.get("options", [])),
+            "why_asking": question_data.get("why_asking", question_data.get("reasoning", "")),
+            "likelihoods": session["likelihoods"]  # same arrays the Bayes update reads
         })
-        # Only add to asked_questions if it's not already there (avoid duplicates)
-        if question not in session["asked_questions"]:
-            session["asked_questions"].append(question)
-        session["answer_count"] += 1
+    return session
 
-def update_hypotheses(session_id, updated_hypotheses):
+def apply_likelihood(session, likelihood):
+    """Bayes-update the session's hypotheses with the likelihood of the given answer"""
+    session["probs"] = bayes_update(session["probs"], likelihood)
+    apply_vector(session["hypotheses"], session["probs"])
+    return session
+
+def update_hypotheses(session, updated_hypotheses):
     """Update hypotheses in session"""
-    session = sessions.get(session_id)
-    if session:
-        session["hypotheses"] = updated_hypotheses
+    session["probs"] = probability_vector(updated_hypotheses)
+    session["hypotheses"] = apply_vector(updated_hypotheses, session["probs"])
+    return session
 
-def delete_session(session_id):
+async def delete_session(session_id):
     """Delete session after completion"""
-    if session_id in sessions:
-        del sessions[session_id]
+    await _store().delete(session_id)
+
+async def reap_sessions(interval=SESSION_REAP_INTERVAL):
+    """Background task: expire idle sessions and refresh the session gauges"""
+    while True:
+        await asyncio.sleep(interval)
+        await _store().reap()
+
+async def session_stats():
+    return await _store().snapshot()
+
+# -------------------------
+# Answer submissions: one at a time per session, duplicates replayed
+# -------------------------
+
+_locks = {}  # session_id -> [lock, holders and waiters]
+_pending = {}  # (session_id, key) -> future resolved when that submission finishes
+_replies = OrderedDict()  # (session_id, key) -> (response, LLM calls it took), oldest first
+replay_stats = {"replayed": 0, "waited": 0, "llm_calls_saved": 0}
+
+@contextlib.asynccontextmanager
+async def session_lock(session_id):
+    """
+    Run one session's requests one at a time in this process, so a duplicate
+    waits for the first instead of losing the compare-and-set. Across
+    workers, commit_answer's compare-and-set is what keeps answers single.
+    """
+    entry = _locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[session_id]
+
+async def claim_answer(session_id, key):
+    """
+    Returns (True, response) when this submission was already answered
+    (waiting for it first if it is still running), else (False, None) and
+    the caller must run it and then call finish_answer.
+    """
+    while True:
+        pending = _pending.get((session_id, key))
+        if pending is not None:
+            reply, source = await asyncio.shield(pending), "in_flight"
+            if reply is None:
+                continue  # that run failed; try again ourselves
+        else:
+            reply, source = _replies.get((session_id, key)), "finished"
+            if reply is None:
+                _pending[(session_id, key)] = asyncio.get_running_loop().create_future()
+                return False, None
+            _replies.move_to_end((session_id, key))
+        response, calls = reply
+        replay_stats["waited" if source == "in_flight" else "replayed"] += 1
+        replay_stats["llm_calls_saved"] += calls
+        metrics.answer_replays.inc(source)
+        metrics.answer_llm_calls_deduplicated.inc(amount=calls)
+        return True, response
+
+def finish_answer(session_id, key, response=None, calls=0, keep=True):
+    """
+    Release a claimed submission. Duplicates waiting on it get the response
+    (None if it failed); keep=False doesn't keep it for later duplicates.
+    """
+    reply = (response, calls) if response is not None else None
+    if reply and keep:
+        _replies[(session_id, key)] = reply
+        while len(_replies) > ANSWER_REPLAY_SIZE:
+            _replies.popitem(last=False)
+    future = _pending.pop((session_id, key), None)
+    if future is not None and not future.done():
+        future.set_result(reply)
+
+def replay_snapshot():
+    return {**replay_stats, "cached": len(_replies)}
+
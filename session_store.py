@@ -0,0 +1,404 @@
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+import metrics
+from bayes import build_index
+from domain_classifier import classify_domain
+
+# Format byte: b"j" = compact JSON, b"z" = zlib-compressed compact JSON
+_COMPRESS_OVER = 512
+
+
+class Session:
+    """
+    One diagnostic session in fixed slots (no per-instance dict). Supports
+    the dict-style access the rest of the code uses.
+    """
+
+    __slots__ = (
+        "original_message", "main_issue", "risk_level", "domain", "hypotheses", "probs", "hyp_index",
+        "likelihoods", "answers_history", "asked_questions", "answer_count", "questions", "trace"
+    )
+    _LISTS = ("hypotheses", "answers_history", "asked_questions", "questions", "trace")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            if name in fields:
+                value = fields[name]
+            elif name in self._LISTS:
+                value = []
+            else:
+                value = 0 if name == "answer_count" else None
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def setdefault(self, key, default):
+        """Fill a field that is still unset (None)"""
+        if self.get(key) is None:
+            self[key] = default
+        return self[key]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def copy(self):
+        """
+        A working copy for one request: the lists and hypothesis dicts an
+        answer changes are copied, everything they hold is shared
+        """
+        clone = Session(**dict(self.items()))
+        for name in ("answers_history", "asked_questions", "questions", "trace"):
+            clone[name] = list(self[name])
+        clone["hypotheses"] = [dict(h) for h in self["hypotheses"]]
+        return clone
+
+
+def session_size(session):
+    """Approximate bytes held by a session; objects it references twice count once"""
+    seen = set()
+    stack = [session]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, Session):
+            stack.extend(getattr(obj, name) for name in obj.__slots__)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return total
+
+
+def encode_session(session):
+    """Serialize a session compactly; derived fields are rebuilt on decode"""
+    data = {k: v for k, v in session.items() if k != "hyp_index"}
+    data["probs"] = list(session["probs"])
+    if session.get("likelihoods"):
+        data["likelihoods"] = {k: list(v) for k, v in session["likelihoods"].items()}
+    # default=list covers the likelihood arrays shared with the question log
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=list).encode()
+    if len(raw) > _COMPRESS_OVER:
+        return b"z" + zlib.compress(raw, 1)
+    return b"j" + raw
+
+
+def decode_session(blob):
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    session = Session(**{k: v for k, v in json.loads(raw).items() if k in Session.__slots__})
+    session["probs"] = array("d", session["probs"])
+    if session.get("likelihoods"):
+        session["likelihoods"] = {k: array("d", v) for k, v in session["likelihoods"].items()}
+    session["hyp_index"] = build_index(session["hypotheses"])
+    # Sessions written before domain classification existed
+    session.setdefault("domain", classify_domain(session["original_message"], session["main_issue"]))
+    return session
+
+
+class SessionStore:
+    """
+    Storage behind session_manager. Sessions expire after ttl idle seconds.
+    get() returns a private copy; changes are only kept once written back.
+    put_if() is the compare-and-set answers commit through: it writes only
+    while the stored answer_count is still the one the request started from,
+    so two workers can't both record the same answer.
+    """
+
+    async def get(self, session_id):
+        raise NotImplementedError
+
+    async def put(self, session_id, session):
+        raise NotImplementedError
+
+    async def put_if(self, session_id, session, answer_count):
+        """Write session if the stored one has answer_count answers; returns whether it did"""
+        raise NotImplementedError
+
+    async def delete(self, session_id):
+        raise NotImplementedError
+
+    async def reap(self):
+        """Drop expired sessions; called periodically by the session reaper"""
+
+    async def snapshot(self):
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Per-process dict with idle TTL and LRU eviction past max_size sessions
+    or max_bytes of estimated session memory
+    """
+
+    def __init__(self, ttl, max_size, max_bytes=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()  # session_id -> (expires_at, size, session), least recently written first
+        self.bytes = 0
+        self.stats = {"expired": 0, "evicted": 0}
+
+    def _live(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(session_id)
+            self.stats["expired"] += 1
+            return None
+        return entry[2]
+
+    async def get(self, session_id):
+        session = self._live(session_id)
+        return session.copy() if session is not None else None
+
+    async def put(self, session_id, session):
+        self._put(session_id, session)
+
+    async def put_if(self, session_id, session, answer_count):
+        # Nothing awaits between the check and the write, so this is atomic per process
+        stored = self._live(session_id)
+        if stored is None or stored["answer_count"] != answer_count:
+            return False
+        self._put(session_id, session)
+        return True
+
+    def _put(self, session_id, session):
+        if session_id in self._sessions:
+            self._drop(session_id)
+        size = session_size(session)
+        self._sessions[session_id] = (time.monotonic() + self.ttl, size, session)
+        self.bytes += size
+        while len(self._sessions) > self.max_size or (self.max_bytes and self.bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+            self.stats["evicted"] += 1
+
+    async def delete(self, session_id):
+        if session_id in self._sessions:
+            self._drop(session_id)
+
+    def _drop(self, session_id):
+        self.bytes -= self._sessions.pop(session_id)[1]
+
+    async def reap(self):
+        # Every put moves a session to the end with a fresh expiry, so expired ones sit at the front
+        now = time.monotonic()
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry[0] >= now:
+                break
+            self._drop(session_id)
+            self.stats["expired"] += 1
+        metrics.sessions_live.set(len(self._sessions))
+        metrics.sessions_bytes.set(self.bytes)
+
+    async def snapshot(self):
+        live = len(self._sessions)
+        return {
+            **self.stats,
+            "live": live,
+            "bytes": self.bytes,
+            "avg_bytes": self.bytes // live if live else 0
+        }
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Local SQLite file in WAL mode, shared by every worker on the host. Calls
+    run in a worker thread so the event loop never waits on the disk.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL, seq INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Files created before answers were committed with compare-and-set
+        if "seq" not in {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}:
+            self._db.execute("ALTER TABLE sessions ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+
+    async def get(self, session_id):
+        row = await asyncio.to_thread(self._get, session_id)
+        return decode_session(row[0]) if row else None
+
+    def _get(self, session_id):
+        with self._lock:
+            return self._db.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at >= ?", (session_id, time.time())
+            ).fetchone()
+
+    async def put(self, session_id, session):
+        await asyncio.to_thread(self._put, session_id, encode_session(session), session["answer_count"])
+
+    def _put(self, session_id, blob, seq):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at, seq) VALUES (?, ?, ?, ?)",
+                (session_id, blob, time.time() + self.ttl, seq)
+            )
+            self._puts += 1
+            if self._puts % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    async def put_if(self, session_id, session, answer_count):
+        return await asyncio.to_thread(
+            self._put_if, session_id, encode_session(session), session["answer_count"], answer_count
+        )
+
+    def _put_if(self, session_id, blob, seq, expected):
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "UPDATE sessions SET data = ?, seq = ?, expires_at = ? WHERE id = ? AND seq = ? AND expires_at >= ?",
+                (blob, seq, now + self.ttl, session_id, expected, now)
+            )
+            return cursor.rowcount == 1
+
+    async def delete(self, session_id):
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
+
+    async def reap(self):
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        live = await asyncio.to_thread(self._execute, "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions")
+        metrics.sessions_live.set(live[0])
+        metrics.sessions_bytes.set(live[1])
+
+    async def snapshot(self):
+        live, size = await asyncio.to_thread(
+            self._execute, "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+        )
+        return {"live": live, "bytes": size}
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Any Redis-protocol server, through the asyncio client. Each session is a
+    hash of its encoded data and answer count (the compare-and-set sequence);
+    expiry is handled server-side.
+    """
+
+    def __init__(self, url, ttl, client=None):
+        if client is None:
+            try:
+                import redis.asyncio
+            except ImportError:
+                raise RuntimeError("SESSION_STORE=redis requires the 'redis' package (pip install redis)")
+            client = redis.asyncio.Redis.from_url(url)
+        self.ttl = max(int(ttl), 1)
+        self._redis = client
+
+    def _key(self, session_id):
+        return f"session:{session_id}"
+
+    async def get(self, session_id):
+        blob = await self._redis.hget(self._key(session_id), "data")
+        return decode_session(blob) if blob else None
+
+    async def put(self, session_id, session):
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={"data": encode_session(session), "seq": session["answer_count"]})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def put_if(self, session_id, session, answer_count):
+        from redis.exceptions import WatchError
+
+        key, blob = self._key(session_id), encode_session(session)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            seq = await pipe.hget(key, "seq")
+            if seq is None or int(seq) != answer_count:
+                await pipe.unwatch()
+                return False
+            pipe.multi()
+            pipe.hset(key, mapping={"data": blob, "seq": session["answer_count"]})
+            pipe.expire(key, self.ttl)
+            try:
+                await pipe.execute()
+            except WatchError:
+                return False  # another worker wrote between our read and write
+        return True
+
+    async def delete(self, session_id):
+        await self._redis.delete(self._key(session_id))
+
+    async def _sizes(self):
+        """(live sessions, stored bytes), walking the keys with SCAN a batch at a time"""
+        live = size = 0
+        batch = []
+        async for key in self._redis.scan_iter(match=self._key("*"), count=500):
+            batch.append(key)
+            if len(batch) == 500:
+                size += await self._data_bytes(batch)
+                live, batch = live + 500, []
+        if batch:
+            size += await self._data_bytes(batch)
+            live += len(batch)
+        return live, size
+
+    async def _data_bytes(self, keys):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hstrlen(key, "data")
+            return sum(await pipe.execute())
+
+    async def reap(self):
+        # Redis expires sessions itself; only the gauges need refreshing
+        live, size = await self._sizes()
+        metrics.sessions_live.set(live)
+        metrics.sessions_bytes.set(size)
+
+    async def snapshot(self):
+        live, size = await self._sizes()
+        return {"live": live, "bytes": size}
+
+
+def make_store(kind, ttl, max_size, sqlite_path, redis_url, max_bytes=None):
+    if kind == "memory":
+        return MemorySessionStore(ttl, max_size, max_bytes)
+    if kind == "sqlite":
+        return SQLiteSessionStore(sqlite_path, ttl)
+    if kind == "redis":
+        return RedisSessionStore(redis_url, ttl)
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
@@ -0,0 +1,140 @@
+import asyncio
+import copy
+import confidence_gate
+from bayes import apply_vector, bayes_update
+from llm_engine import generate_adaptive_question
+from stopping_policy import stopping_policy
+
+# How speculative next questions turned out since startup
+stats = {
+    "started": 0,
+    "used": 0,
+    "discarded_on_stop": 0,
+    "regenerated": 0,
+    "prefetch_missed": 0,
+    "prefetch_skipped_on_stop": 0,
+    "skipped_on_stop": 0,
+    "cancelled_on_error": 0
+}
+
+
+def _top_two(hypotheses):
+    ranked = sorted(hypotheses, key=lambda x: x["probability"], reverse=True)
+    return [h["name"].lower() for h in ranked[:2]]
+
+
+def start_speculative_question(original_issue, hypotheses, answers_history, asked_questions, domain=None):
+    """
+    Generate the next question against the predicted (pre-update) hypotheses.
+    Returns (task, predicted_hypotheses) so the caller can validate it later.
+    """
+    # The updater mutates hypothesis dicts in place, so speculate on a snapshot
+    predicted = copy.deepcopy(hypotheses)
+    task = asyncio.create_task(generate_adaptive_question(
+        original_issue=original_issue,
+        hypotheses=predicted,
+        answers_history=list(answers_history),
+        asked_questions=list(asked_questions),
+        domain=domain
+    ))
+    # A dropped task may already have failed; don't leave its error unretrieved
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    stats["started"] += 1
+    return task, predicted
+
+
+def prefetch_next_question(session, min_share):
+    """
+    While the user reads the current question, start the question that would
+    follow its likeliest answer (predicted from the option likelihoods).
+    Returns (answer, speculative) or None when no answer is at least
+    min_share likely, or when that answer would end the session.
+    """
+    likelihoods = session["likelihoods"]
+    if not likelihoods or not session["questions"]:
+        return None
+    weights = {option: sum(p * l for p, l in zip(session["probs"], row)) for option, row in likelihoods.items()}
+    total = sum(weights.values())
+    key = max(weights, key=weights.get)
+    if not total or weights[key] / total < min_share:
+        return None
+
+    # Same state _apply_answer will reach if this answer comes in
+    probs = bayes_update(session["probs"], likelihoods[key])
+    if would_stop(session, probs, session["answer_count"] + 1):
+        stats["prefetch_skipped_on_stop"] += 1
+        return None
+    question = session["questions"][-1]
+    answer = next((o for o in question["options"] if o.strip().lower() == key), key)
+    hypotheses = apply_vector([dict(h) for h in session["hypotheses"]], probs)
+    speculative = start_speculative_question(
+        original_issue=session["main_issue"],
+        hypotheses=hypotheses,
+        answers_history=session["answers_history"] + [{"question": question["question"], "answer": answer}],
+        asked_questions=session["asked_questions"],
+        domain=session["domain"]
+    )
+    return answer, speculative
+
+
+def would_stop(session, probs, answers):
+    """
+    Whether _apply_answer would stop the session at probs with answers
+    answers. Only the confidence gate's local verdict is used; a borderline
+    case the model would settle counts as continuing.
+    """
+    ranked = sorted(probs, reverse=True) + [0, 0]
+    verdict = confidence_gate.decide(ranked[0], ranked[1], answers, session["domain"])[0]["verdict"]
+    history = [step["probs"] for step in session["trace"]] + [probs]
+    return stopping_policy.decide(history, answers, session["domain"], session["risk_level"], verdict)[0]
+
+
+def abandon(task):
+    """Drop a prefetched question because the user picked another answer"""
+    task.cancel()
+    stats["prefetch_missed"] += 1
+
+
+def discard(task):
+    """Drop a speculative question because the session is finishing"""
+    task.cancel()
+    stats["discarded_on_stop"] += 1
+
+
+def skip_on_stop():
+    """Count a speculative question not started because the session will stop"""
+    stats["skipped_on_stop"] += 1
+
+
+def cancel(task):
+    """Drop a speculative question because the request it was for failed"""
+    task.cancel()
+    stats["cancelled_on_error"] += 1
+
+
+async def resolve(task, predicted, original_issue, hypotheses, answers_history, asked_questions, domain=None):
+    """
+    Use the speculative question if the question prompt would have targeted
+    the same top two hypotheses, otherwise regenerate on the final state.
+    """
+    if _top_two(predicted) == _top_two(hypotheses):
+        stats["used"] += 1
+        return await task
+
+    task.cancel()
+    stats["regenerated"] += 1
+    return await generate_adaptive_question(
+        original_issue=original_issue,
+        hypotheses=hypotheses,
+        answers_history=answers_history,
+        asked_questions=asked_questions,
+        domain=domain
+    )
+
+
+def speculation_stats():
+    """Counters plus the share of speculative calls that were wasted"""
+    wasted = (
+        stats["discarded_on_stop"] + stats["regenerated"] + stats["prefetch_missed"] + stats["cancelled_on_error"]
+    )
+    return {**stats, "wasted_rate": round(wasted / stats["started"], 3) if stats["started"] else 0.0}
@@ -0,0 +1,170 @@
+"""
+When a session has asked enough questions.
+
+A policy sees the session's probability history (one normalized vector per
+request, oldest first, the last one current), its answer count, domain,
+risk level and the confidence gate's verdict, and returns (stop, reason).
+
+- fixed: the original rule, STOP verdict after 4 answers or 8 answers.
+- entropy: per-domain and per-risk minimums and maximums; stops on a STOP
+  verdict or once the hypothesis distribution's normalized entropy is low
+  enough. Health, safety and high-risk sessions still need the confidence
+  gate's STOP.
+
+Replay logged sessions to compare policies:
+
+    python stopping_policy.py completion_log/ --policy fixed --policy entropy
+"""
+import argparse
+import math
+from collections import Counter
+from config import STOPPING_POLICY
+
+# Per-domain limits; risk limits are merged in, the stricter value winning
+DOMAIN_LIMITS = {
+    "health": {"min_questions": 4, "max_questions": 8, "max_entropy": 0.35, "require_verdict": True},
+    "safety": {"min_questions": 3, "max_questions": 8, "max_entropy": 0.40, "require_verdict": True},
+    "general": {"min_questions": 2, "max_questions": 7, "max_entropy": 0.55},
+    "tech": {"min_questions": 2, "max_questions": 7, "max_entropy": 0.60},
+}
+RISK_LIMITS = {
+    "high": {"min_questions": 4, "max_entropy": 0.35, "require_verdict": True},
+    "moderate": {"min_questions": 3},
+    "low": {},
+}
+
+def entropy(probs):
+    """Shannon entropy of a distribution, scaled to 0..1 by its maximum (log n)"""
+    if len(probs) < 2:
+        return 0.0
+    return -sum(p * math.log(p) for p in probs if p > 0) / math.log(len(probs))
+
+
+def limits_for(domain, risk_level):
+    limits = dict(DOMAIN_LIMITS.get(domain, DOMAIN_LIMITS["general"]))
+    for key, value in RISK_LIMITS.get(str(risk_level).lower(), {}).items():
+        if key == "min_questions":
+            limits[key] = max(limits[key], value)
+        elif key == "max_entropy":
+            limits[key] = min(limits[key], value)
+        elif key == "require_verdict":
+            limits[key] = limits.get(key, False) or value
+    return limits
+
+
+class StoppingPolicy:
+    name = "base"
+
+    def decide(self, history, answer_count, domain, risk_level, verdict):
+        raise NotImplementedError
+
+
+class FixedCountPolicy(StoppingPolicy):
+    """STOP verdict after min_questions answers, or max_questions answers regardless"""
+    name = "fixed"
+
+    def __init__(self, min_questions=4, max_questions=8):
+        self.min_questions = min_questions
+        self.max_questions = max_questions
+
+    def decide(self, history, answer_count, domain, risk_level, verdict):
+        if answer_count >= self.max_questions:
+            return True, "max_questions"
+        if verdict == "STOP" and answer_count >= self.min_questions:
+            return True, "verdict"
+        return False, "continue"
+
+
+class EntropyPolicy(StoppingPolicy):
+    """Stops as soon as the domain allows once one hypothesis clearly dominates"""
+    name = "entropy"
+
+    def decide(self, history, answer_count, domain, risk_level, verdict):
+        limits = limits_for(domain, risk_level)
+        if answer_count >= limits["max_questions"]:
+            return True, "max_questions"
+        if answer_count < limits["min_questions"]:
+            return False, "continue"
+        if verdict == "STOP":
+            return True, "verdict"
+        if limits.get("require_verdict"):
+            return False, "continue"
+        if entropy(history[-1]) <= limits["max_entropy"]:
+            return True, "entropy"
+        return False, "continue"
+
+
+POLICIES = {"fixed": FixedCountPolicy, "entropy": EntropyPolicy}
+
+
+def make_policy(name):
+    if name not in POLICIES:
+        raise ValueError(f"Unknown STOPPING_POLICY: {name}")
+    return POLICIES[name]()
+
+
+stopping_policy = make_policy(STOPPING_POLICY)
+
+
+# -------------------------
+# Offline replay
+# -------------------------
+
+def replay(record, policy):
+    """
+    (answers, reason, top hypothesis index) for a logged session under policy.
+    A policy that would keep asking past the logged end stops where the log does.
+    """
+    history = [record["start"]["probs"]]
+    for i, turn in enumerate(record["turns"]):
+        history.append(turn.get("probs") or history[-1])
+        stop, reason = policy.decide(history, i + 1, record["domain"], record["risk_level"], turn.get("verdict", "CONTINUE"))
+        if stop:
+            break
+    else:
+        reason = "end_of_log"
+    probs = history[-1]
+    return len(history) - 1, reason, max(range(len(probs)), key=probs.__getitem__)
+
+
+def evaluate(records, policy, start_calls=1):
+    """
+    Average answers and estimated LLM calls per session, and how often the
+    policy's top hypothesis matches the logged final diagnosis. Calls are
+    start_calls per /start plus one per answer (next question or final
+    response) plus one more per answer to a question without likelihoods.
+    """
+    sessions = answers = calls = agreed = 0
+    reasons = Counter()
+    for record in records:
+        if not record.get("turns") or not record.get("start", {}).get("probs"):
+            continue
+        n, reason, top = replay(record, policy)
+        sessions += 1
+        answers += n
+        reasons[reason] += 1
+        calls += start_calls + n + sum(1 for turn in record["turns"][:n] if not turn["question"].get("likelihoods"))
+        agreed += record["hypotheses"][top]["name"] == record["top_hypothesis"]
+    if not sessions:
+        return {"sessions": 0}
+    return {
+        "sessions": sessions,
+        "answers_per_session": round(answers / sessions, 2),
+        "llm_calls_per_session": round(calls / sessions, 2),
+        "agreement": round(agreed / sessions, 3),
+        "stop_reasons": dict(reasons)
+    }
+
+
+if __name__ == "__main__":
+    from completion_log import iter_completions
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="completion log directory (COMPLETION_LOG_DIR) or one segment")
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES), help="repeat to compare (default: all)")
+    parser.add_argument("--start-calls", type=int, default=1, help="LLM calls per /start (2 without START_FUSED)")
+    args = parser.parse_args()
+
+    records = list(iter_completions(args.log))
+    for name in args.policy or sorted(POLICIES):
+        print(name, evaluate(records, make_policy(name), args.start_calls))
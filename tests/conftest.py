@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+# Modules build their provider clients from the environment; tests never reach it
+os.environ.setdefault("GROQ_API_KEY", "test")
+# Every call must reach the (replayed) provider, in the same order each run
+os.environ.update(RESPONSE_CACHE_SIZE="0", LLM_HEDGE="false")
+
+
+@pytest.fixture
+def llm_router():
+    """Call with a client factory to serve the app's LLM calls from it for one test"""
+    import model_router
+    from config import LLM_BACKENDS, LLM_ROUTES
+
+    def install(make_client):
+        clients = {name: make_client() for name in LLM_BACKENDS}
+        model_router.set_router(model_router.ModelRouter(LLM_BACKENDS, LLM_ROUTES, hedge=False, clients=clients))
+        return clients
+
+    previous = model_router._router
+    yield install
+    model_router.set_router(previous)
+
+
+@pytest.fixture
+def fake_llm(llm_router):
+    """fake_llm_server's canned completions, served instantly"""
+    from cassette import Cassette, ReplayClient
+    from fake_llm_server import fake_content
+
+    return llm_router(lambda: ReplayClient(Cassette(None), latency_scale=0, synthesize=fake_content))
@@ -0,0 +1,92 @@
+import asyncio
+import httpx
+import main
+from llm_scheduler import SchedulerOverloaded
+from models import AnswerRequest
+from session_manager import get_session
+
+MESSAGE = "my wifi keeps dropping every evening"
+
+
+async def _post(client, path, body):
+    return (await client.post(path, json=body)).json()
+
+
+def _client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+def _answer(start, number=1):
+    return {"session_id": start["session_id"], "selected_option": start["options"][0], "question_number": number}
+
+
+def test_failed_answer_can_be_retried(fake_llm, monkeypatch):
+    generate = main.generate_adaptive_question
+    failures = []
+
+    async def overloaded_once(**kwargs):
+        if not failures:
+            failures.append(1)
+            raise SchedulerOverloaded("queue full")
+        return await generate(**kwargs)
+
+    async def check():
+        async with _client() as client:
+            start = await _post(client, "/start", {"message": MESSAGE})
+            monkeypatch.setattr(main, "generate_adaptive_question", overloaded_once)
+            monkeypatch.setattr(main, "SPECULATIVE_QUESTIONS", False)
+
+            failed = await client.post("/answer", json=_answer(start))
+            assert failed.status_code == 503
+            assert (await get_session(start["session_id"]))["answer_count"] == 0
+
+            retried = await _post(client, "/answer", _answer(start))
+            assert retried["status"] == "continue" and retried["question_number"] == 2
+            session = await get_session(start["session_id"])
+            assert session["answer_count"] == 1 and len(session["answers_history"]) == 1
+
+    asyncio.run(check())
+
+
+def test_abandoned_stream_leaves_the_answer_unrecorded(fake_llm):
+    async def check():
+        async with _client() as client:
+            start = await _post(client, "/start", {"message": MESSAGE})
+            request = AnswerRequest(**_answer(start))
+            events = main._answer_events(request)
+            assert (await anext(events))[0] == "status"
+            await events.aclose()
+            assert (await get_session(start["session_id"]))["answer_count"] == 0
+
+            retried = await _post(client, "/answer", _answer(start))
+            assert retried["question_number"] == 2
+
+    asyncio.run(check())
+
+
+def test_concurrent_duplicates_record_one_answer(fake_llm, monkeypatch):
+    # Two workers: neither sees the other's session lock, both load answer_count 0
+    evaluate, arrived, both = main.evaluate_confidence, [], asyncio.Event()
+
+    async def rendezvous(**kwargs):
+        arrived.append(1)
+        if len(arrived) == 2:
+            both.set()
+        await both.wait()
+        return await evaluate(**kwargs)
+
+    async def check():
+        async with _client() as client:
+            start = await _post(client, "/start", {"message": MESSAGE})
+            monkeypatch.setattr(main, "evaluate_confidence", rendezvous)
+            request = AnswerRequest(**_answer(start))
+            replies = await asyncio.gather(main._answer(request), main._answer(request))
+
+        assert sorted("error" in reply for reply in replies) == [False, True]
+        assert [r for r in replies if "error" in r][0] == {
+            "error": "Out-of-sequence answer", "expected_question_number": 2
+        }
+        session = await get_session(start["session_id"])
+        assert session["answer_count"] == 1 and len(session["answers_history"]) == 1
+
+    asyncio.run(check())
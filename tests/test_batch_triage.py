@@ -0,0 +1,65 @@
+import asyncio
+import json
+import batch_triage
+from llm_scheduler import SchedulerOverloaded
+
+
+def _lines(n):
+    return [json.dumps({"id": f"lead-{i}", "message": f"enquiry {i}"}) for i in range(n)]
+
+
+def _triage(lines, **options):
+    async def collect():
+        return [row async for row in batch_triage.triage(lines, **options)]
+    return asyncio.run(collect())
+
+
+def _intents(delays):
+    """Fake extract_intents_batch: a pack whose first message is "enquiry i" takes delays.get(i, 0) seconds"""
+    async def extract(messages):
+        await asyncio.sleep(delays.get(int(messages[0].split()[-1]), 0))
+        return [{"main_issue": m, "risk_level": "low", "hypotheses": []} for m in messages]
+    return extract
+
+
+def test_checkpoints_wait_for_every_earlier_line(monkeypatch):
+    # The first pack finishes last, so nothing is checkpointed until it does
+    monkeypatch.setattr(batch_triage, "extract_intents_batch", _intents({0: 0.05}))
+    rows = _triage(_lines(6), pack_size=2, concurrency=3)
+
+    results = [row for row in rows if "checkpoint" not in row]
+    checkpoints = [row["checkpoint"] for row in rows if "checkpoint" in row]
+    assert sorted(row["id"] for row in results) == [f"lead-{i}" for i in range(6)]
+    assert [row["id"] for row in results[:2]] != ["lead-0", "lead-1"]
+    assert checkpoints == [6]
+    assert rows[-1] == {"checkpoint": 6}
+
+
+def test_checkpoints_advance_in_order(monkeypatch):
+    monkeypatch.setattr(batch_triage, "extract_intents_batch", _intents({}))
+    rows = _triage(_lines(4), pack_size=1, concurrency=1)
+    assert [row["checkpoint"] for row in rows if "checkpoint" in row] == [1, 2, 3, 4]
+
+
+def test_bad_lines_blanks_and_offset(monkeypatch):
+    monkeypatch.setattr(batch_triage, "extract_intents_batch", _intents({}))
+    lines = _lines(2) + ["", "not json", json.dumps({"id": "x"}), *_lines(5)[2:]]
+    rows = _triage(lines, offset=1, pack_size=8)
+
+    results = {row["id"]: row for row in rows if "checkpoint" not in row}
+    assert "lead-0" not in results
+    assert results[3] == {"id": 3, "error": "invalid JSON line"}
+    assert results["x"] == {"id": "x", "error": "missing message"}
+    assert {"lead-1", "lead-2", "lead-3", "lead-4"} <= results.keys()
+    assert rows[-1] == {"checkpoint": len(lines)}
+
+
+def test_overload_marks_the_pack_failed(monkeypatch):
+    async def overloaded(messages):
+        raise SchedulerOverloaded("queue full")
+
+    monkeypatch.setattr(batch_triage, "extract_intents_batch", overloaded)
+    rows = _triage(_lines(3), pack_size=2)
+    errors = [row for row in rows if "error" in row]
+    assert len(errors) == 3 and all("SchedulerOverloaded" in row["error"] for row in errors)
+    assert rows[-1] == {"checkpoint": 3}
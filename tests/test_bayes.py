@@ -0,0 +1,38 @@
+import pytest
+from bayes import MIN_LIKELIHOOD, apply_vector, bayes_update, likelihood_for, normalize, parse_likelihoods
+
+QUESTION = {
+    "question": "Is the router hot to the touch?",
+    "options": ["Yes", "No"],
+    "likelihoods": {"yes ": [0.9, 0.2], "No": [0.0, 0.8]},
+}
+
+
+def test_update_follows_bayes_rule():
+    posterior = bayes_update(normalize([0.5, 0.5]), [0.9, 0.3])
+    assert list(posterior) == pytest.approx([0.75, 0.25])
+    assert sum(posterior) == pytest.approx(1.0)
+
+
+def test_normalize_falls_back_to_uniform():
+    assert list(normalize([0, -1, 0])) == pytest.approx([1 / 3] * 3)
+
+
+def test_likelihoods_are_matched_case_insensitively_and_floored():
+    table = parse_likelihoods(QUESTION, 2)
+    assert list(likelihood_for(table, " YES")) == pytest.approx([0.9, 0.2])
+    # A zero would rule a hypothesis out for good on one answer
+    assert list(likelihood_for(table, "no")) == pytest.approx([MIN_LIKELIHOOD, 0.8])
+
+
+def test_unusable_likelihood_tables_are_rejected():
+    assert parse_likelihoods(QUESTION, 3) is None
+    assert parse_likelihoods({**QUESTION, "likelihoods": {"Yes": [0.9, 0.2]}}, 2) is None
+    assert parse_likelihoods({**QUESTION, "likelihoods": {"Yes": [0.9, "x"], "No": [0.1, 0.8]}}, 2) is None
+    assert likelihood_for(None, "Yes") is None
+
+
+def test_apply_vector_writes_rounded_probabilities():
+    hypotheses = [{"name": "Heat"}, {"name": "Interference"}]
+    apply_vector(hypotheses, [0.123456, 0.876544])
+    assert [h["probability"] for h in hypotheses] == [0.1235, 0.8765]
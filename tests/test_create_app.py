@@ -0,0 +1,40 @@
+from starlette.testclient import TestClient
+import model_router
+import session_manager
+from cassette import Cassette, ReplayClient
+from config import LLM_BACKENDS, LLM_ROUTES
+from fake_llm_server import fake_content
+from main import create_app
+from session_store import MemorySessionStore
+
+
+def _app():
+    cassette = Cassette(None)
+    clients = {
+        name: ReplayClient(cassette, latency_scale=0, synthesize=fake_content) for name in LLM_BACKENDS
+    }
+    store = MemorySessionStore(60, 100)
+    router = model_router.ModelRouter(LLM_BACKENDS, LLM_ROUTES, hedge=False, clients=clients)
+    return create_app(router, store), cassette, store
+
+
+def test_apps_keep_their_own_router_and_store(monkeypatch):
+    monkeypatch.setattr(model_router, "_router", None)
+    monkeypatch.setattr(session_manager, "store", None)
+    (first, first_calls, first_store), (second, second_calls, second_store) = _app(), _app()
+
+    with TestClient(first) as client:
+        session_id = client.post("/start", json={"message": "my laptop fan is loud even when idle"}).json()["session_id"]
+        with client.websocket_connect("/ws/diagnose") as ws:
+            ws.send_json({"type": "start", "message": "my printer prints blank pages"})
+            while ws.receive_json()["type"] != "done":
+                pass
+    assert first_calls.stats["synthesized"] > 0 and second_calls.stats["synthesized"] == 0
+    assert len(first_store) == 2 and len(second_store) == 0
+
+    with TestClient(second) as client:
+        assert client.post(f"/debug/session/{session_id}").json() == {"error": "Session not found"}
+    with TestClient(first) as client:
+        assert "main_issue" in client.post(f"/debug/session/{session_id}").json()
+    # Neither app built, replaced or closed the process-wide router or store
+    assert model_router._router is None and session_manager.store is None
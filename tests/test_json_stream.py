@@ -0,0 +1,47 @@
+from json_stream import JsonStreamParser, parse_json_text
+
+QUESTION = '{"question": "Does it drop at night?", "options": ["Yes", "No"]}'
+
+
+def test_prose_and_fences_around_the_object():
+    assert parse_json_text(f"Sure! ```json\n{QUESTION}\n``` Hope that helps {{:)}}") == {
+        "question": "Does it drop at night?", "options": ["Yes", "No"]
+    }
+
+
+def test_trailing_commas():
+    assert parse_json_text('{"a": [1, 2,], "b": {"c": true,},}') == {"a": [1, 2], "b": {"c": True}}
+
+
+def test_braces_in_leading_prose_restart_at_the_next_object():
+    assert parse_json_text(f"I think {{maybe}} this works: {QUESTION}")["options"] == ["Yes", "No"]
+
+
+def test_unclosed_brace_in_leading_prose():
+    assert parse_json_text(f"I think {{maybe this: {QUESTION}")["question"] == "Does it drop at night?"
+
+
+def test_quoted_words_in_leading_prose_are_not_a_key():
+    assert parse_json_text(f'text with {{ brace and "quote" then {QUESTION}')["options"] == ["Yes", "No"]
+    assert parse_json_text(f'a {{ "quote" {QUESTION}')["question"] == "Does it drop at night?"
+    assert parse_json_text('x { "a" "b" } {"c": 1}') == {"c": 1}
+
+
+def test_a_value_needs_its_colon():
+    assert parse_json_text('{"a": 1, "b" 2, "c": 3}') == {"a": 1, "c": 3}
+
+
+def test_empty_object_without_a_later_one():
+    assert parse_json_text("{}") == {}
+    assert parse_json_text("no json here") is None
+
+
+def test_truncated_output_keeps_completed_fields():
+    assert parse_json_text('{"question": "Q?", "options": ["A", "B"') == {"question": "Q?", "options": ["A", "B"]}
+
+
+def test_feed_announces_top_level_fields_as_they_complete():
+    parser = JsonStreamParser()
+    assert parser.feed('{"question": "Q?", "opt') == [("question", "Q?")]
+    assert parser.feed('ions": ["A", "B"]}') == [("options", ["A", "B"])]
+    assert parser.done
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from llm_scheduler import LLMScheduler, SchedulerOverloaded, TokenBucket, current_priority
+
+
+async def _hold(scheduler, priority, order, release):
+    current_priority.set(priority)
+    async with scheduler.slot(10):
+        order.append(priority)
+        await release.wait()
+
+
+def test_waiters_run_in_priority_order():
+    async def check():
+        scheduler, order, release = LLMScheduler(concurrency=1), [], asyncio.Event()
+        first = asyncio.create_task(_hold(scheduler, "start", order, release))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(_hold(scheduler, p, order, release)) for p in ("batch", "start", "answer")]
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["queue_depth"] == 3
+        release.set()
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(check()) == ["start", "answer", "start", "batch"]
+
+
+def test_a_full_queue_sheds_load():
+    async def check():
+        scheduler, release = LLMScheduler(concurrency=1, max_queue=1), asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "answer", [], release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_hold(scheduler, "answer", [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerOverloaded):
+            async with scheduler.slot(10):
+                pass
+        release.set()
+        await asyncio.gather(running, queued)
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(check())
+    assert snapshot["rejected"] == 1 and snapshot["active"] == 0
+
+
+def test_a_cancelled_waiter_leaves_the_queue():
+    async def check():
+        scheduler, release = LLMScheduler(concurrency=1), asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "answer", [], release))
+        await asyncio.sleep(0)
+        gone = asyncio.create_task(_hold(scheduler, "answer", [], release))
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+        release.set()
+        await running
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(check())
+    assert snapshot["queue_depth"] == 0 and snapshot["active"] == 0
+
+
+def test_identical_concurrent_calls_are_coalesced():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def check():
+        scheduler = LLMScheduler(concurrency=4)
+        return await asyncio.gather(*(scheduler.coalesce("same", call) for _ in range(3))), scheduler
+
+    replies, scheduler = asyncio.run(check())
+    assert replies == ["reply"] * 3 and len(calls) == 1 and scheduler.stats["coalesced"] == 2
+
+
+def test_token_bucket_delays_past_the_burst():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    now = bucket.updated
+    assert bucket.delay(2, now) == 0.0
+    bucket.take(2)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert TokenBucket(0).delay(1000, now) == 0.0
@@ -0,0 +1,44 @@
+from prompt_builder import build_question_messages
+
+HYPOTHESES = [
+    {"name": "Food poisoning", "probability": 0.5},
+    {"name": "Viral gastroenteritis", "probability": 0.3},
+    {"name": "Appendicitis", "probability": 0.2},
+]
+QUESTIONS = [
+    "Have you had a fever in the last two days?",
+    "Did you eat anything unusual or undercooked recently?",
+    "Is the pain mostly on the lower right side of your belly?",
+    "Has anyone you live with had the same symptoms?",
+    "Have you been vomiting, and if so how often?",
+    "Does the pain get worse when you walk or cough?",
+    "Have you been able to keep fluids down today?",
+]
+HISTORY = [{"question": q, "answer": "Yes, since yesterday evening after dinner"} for q in QUESTIONS]
+
+
+def _context(budget=200):
+    messages, _ = build_question_messages("Stomach pain", "health", HYPOTHESES, HISTORY, QUESTIONS, budget=budget)
+    return messages[1]["content"]
+
+
+def test_every_asked_question_stays_in_the_prompt():
+    context = _context()
+    for question in QUESTIONS:
+        assert " ".join(question.split()[:6]) in context
+    assert "Questions already asked: 7" in context
+
+
+def test_budget_trims_old_answers_before_anything_else():
+    tight, roomy = _context(budget=50), _context(budget=10_000)
+    assert roomy.count("→") == len(QUESTIONS)
+    # The latest turns keep their answers verbatim
+    assert tight.count("→") == 2
+    assert len(tight) < len(roomy)
+
+
+def test_repeated_questions_are_listed_once():
+    messages, _ = build_question_messages(
+        "Stomach pain", "health", HYPOTHESES, HISTORY[:2] + HISTORY[:1], QUESTIONS[:2]
+    )
+    assert messages[1]["content"].count("fever") == 1
@@ -0,0 +1,66 @@
+"""
+The engine stages and full sessions replayed from benchmarks/engine_cassette.log
+(see benchmarks/bench_replay.py). A prompt change shows up here as cassette
+misses or a new digest: re-record the cassette and the baseline together.
+"""
+import asyncio
+import json
+import os
+import pytest
+import bench_replay
+import main
+from cassette import Cassette, ReplayClient
+from load_test import MESSAGES
+
+BASELINE = os.path.join(os.path.dirname(bench_replay.DEFAULT_CASSETTE), "replay_baseline.json")
+
+
+@pytest.fixture
+def cassette(llm_router, monkeypatch):
+    cassette = Cassette(bench_replay.DEFAULT_CASSETTE)
+    llm_router(lambda: ReplayClient(cassette, latency_scale=0))
+    # Speculative questions would add calls, in an order that depends on timing
+    monkeypatch.setattr(main, "SPECULATIVE_QUESTIONS", False)
+    return cassette
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    with open(BASELINE) as f:
+        return json.load(f)
+
+
+def test_replay_matches_the_baseline(cassette, baseline):
+    repeat = baseline["settings"]["repeat"]
+
+    async def replay():
+        return await bench_replay.run_stages(repeat), await bench_replay.run_sessions(repeat)
+
+    (_, stage_calls, stage_outputs), (_, session_calls, session_outputs) = asyncio.run(replay())
+
+    assert cassette.stats["misses"] == 0
+    assert cassette.stats["hits"] == baseline["cassette"]["hits"]
+    assert stage_calls == baseline["llm_calls"]["stages"]
+    assert round(session_calls / (repeat * len(MESSAGES)), 2) == baseline["llm_calls"]["per_session"]
+    assert bench_replay.digest(stage_outputs, session_outputs) == baseline["digest"]
+
+
+def test_every_stage_answers_from_the_cassette(cassette):
+    timings, calls, outputs = asyncio.run(bench_replay.run_stages(1))
+
+    # intent, question, update and final each take one call; confidence is decided locally here
+    assert calls == 4 * len(MESSAGES)
+    assert all(len(samples) == len(MESSAGES) for samples in timings.values())
+    for intent, question, updated, confidence, final in outputs:
+        assert intent["hypotheses"] and question["options"]
+        assert "error" not in updated and confidence["verdict"] in ("STOP", "CONTINUE")
+        assert isinstance(final, str) and final
+
+
+def test_synthetic_mode_needs_a_synthesizer():
+    from cassette import load_synthesizer
+    from fake_llm_server import fake_content
+
+    with pytest.raises(ValueError, match="LLM_SYNTHESIZER"):
+        load_synthesizer("")
+    assert load_synthesizer("fake_llm_server:fake_content") is fake_content
@@ -0,0 +1,37 @@
+import pytest
+from config import RESPONSE_CACHE_SIMILARITY
+from response_cache import ResponseCache
+
+CACHED = ["Chest pain when breathing", "Wifi not working", "wifi router drops every evening"]
+# Close in wording, different in meaning
+WRONG_MATCHES = [
+    "my chest hurts when I run",
+    "my wifi is working",
+    "the wifi isn't working at all",
+    "wifi not dropping every evening",
+]
+
+
+def _cache(similarity):
+    cache = ResponseCache(10, 10 ** 6, 60, similarity)
+    for text in CACHED:
+        cache.put(text, {"main_issue": text})
+    return cache
+
+
+def test_near_hits_are_off_by_default():
+    assert RESPONSE_CACHE_SIMILARITY == 0
+    cache = _cache(RESPONSE_CACHE_SIMILARITY)
+    assert cache.get("Wifi router drops every evening!") == {"main_issue": CACHED[2]}
+    assert cache.get("wifi router drops in the evening") is None
+
+
+@pytest.mark.parametrize("text", WRONG_MATCHES)
+def test_no_near_hit_across_negations_or_for_health(text):
+    assert _cache(0.2).get(text) is None
+
+
+def test_near_hit_within_a_domain():
+    cache = _cache(0.5)
+    assert cache.get("wifi router drops in the evening") == {"main_issue": CACHED[2]}
+    assert cache.stats["near_hits"] == 1
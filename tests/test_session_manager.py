@@ -0,0 +1,23 @@
+import json
+from session_manager import add_answer, new_session, record_question
+
+INTENT = {"main_issue": "Wifi drops", "hypotheses": [{"name": "Heat", "probability": 0.5}, {"name": "Noise", "probability": 0.5}]}
+
+
+def test_a_session_holds_each_question_and_picked_option_once():
+    _, session = new_session("my wifi keeps dropping", INTENT)
+    # Fresh parses, as from the model and the request, share no strings
+    record_question(session, json.loads('{"question": "Is the router hot?", "options": ["Yes", "No"]}'))
+    add_answer(session, json.loads('"Is the router hot?"'), json.loads('"Yes"'))
+
+    answered = session["answers_history"][0]
+    assert answered["question"] is session["asked_questions"][0] is session["questions"][0]["question"]
+    assert answered["answer"] is session["questions"][0]["options"][0]
+
+
+def test_free_text_answers_are_kept_as_given():
+    _, session = new_session("my wifi keeps dropping", INTENT)
+    record_question(session, {"question": "Is the router hot?", "options": ["Yes", "No"]})
+    add_answer(session, "Is the router hot?", "only after gaming")
+    assert session["answers_history"][0]["answer"] == "only after gaming"
+    assert session["answer_count"] == 1
@@ -0,0 +1,145 @@
+import asyncio
+import time
+import pytest
+import metrics
+import session_manager
+from session_manager import add_answer, new_session, record_question
+from session_store import MemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+INTENT = {
+    "main_issue": "Wifi drops every evening",
+    "risk_level": "low",
+    "hypotheses": [
+        {"name": "Channel congestion", "description": "Neighbours' networks", "probability": 0.6},
+        {"name": "Router overheating", "description": "Drops after hours of load", "probability": 0.4},
+    ],
+}
+QUESTION = {
+    "question": "Does it drop on every device at once?",
+    "options": ["Yes", "No", "Not sure"],
+    "likelihoods": {"Yes": [0.7, 0.3], "No": [0.3, 0.7]},
+}
+
+
+def _session():
+    session_id, session = new_session("my wifi keeps dropping every evening", INTENT)
+    record_question(session, QUESTION)
+    return session_id, session
+
+
+def _answered(session):
+    return add_answer(session.copy(), session["asked_questions"][-1], "Yes")
+
+
+def _fields(session):
+    return dict(session.items())
+
+
+def _stores(tmp_path):
+    stores = [MemorySessionStore(60, 100), SQLiteSessionStore(str(tmp_path / "sessions.db"), 60)]
+    fakeredis = pytest.importorskip("fakeredis")
+    stores.append(RedisSessionStore(None, 60, client=fakeredis.FakeAsyncRedis()))
+    return stores
+
+
+def test_round_trip_and_delete(tmp_path):
+    async def check(store):
+        session_id, session = _session()
+        await store.put(session_id, session)
+        loaded = await store.get(session_id)
+        assert _fields(loaded) == _fields(session)
+        await store.delete(session_id)
+        assert await store.get(session_id) is None
+
+    for store in _stores(tmp_path):
+        asyncio.run(check(store))
+
+
+def test_put_if_commits_each_answer_once(tmp_path):
+    async def check(store):
+        session_id, session = _session()
+        await store.put(session_id, session)
+        first, second = _answered(session), _answered(session)
+        assert await store.put_if(session_id, first, 0)
+        # A second request (or worker) that loaded the same state loses
+        assert not await store.put_if(session_id, second, 0)
+        assert (await store.get(session_id))["answer_count"] == 1
+        assert not await store.put_if("unknown", first, 0)
+
+    for store in _stores(tmp_path):
+        asyncio.run(check(store))
+
+
+def test_get_returns_a_private_copy():
+    async def check():
+        store = MemorySessionStore(60, 100)
+        session_id, session = _session()
+        await store.put(session_id, session)
+        loaded = await store.get(session_id)
+        add_answer(loaded, loaded["asked_questions"][-1], "No")
+        loaded["hypotheses"][0]["probability"] = 0.0
+        stored = await store.get(session_id)
+        assert stored["answer_count"] == 0 and stored["answers_history"] == []
+        assert stored["hypotheses"][0]["probability"] == 0.6
+
+    asyncio.run(check())
+
+
+def test_redis_sets_the_ttl():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def check():
+        client = fakeredis.FakeAsyncRedis()
+        store = RedisSessionStore(None, 60, client=client)
+        session_id, session = _session()
+        await store.put(session_id, session)
+        assert 0 < await client.ttl(f"session:{session_id}") <= 60
+        assert await store.put_if(session_id, _answered(session), 0)
+        assert 0 < await client.ttl(f"session:{session_id}") <= 60
+
+    asyncio.run(check())
+
+
+def test_sqlite_expires_idle_sessions(tmp_path):
+    async def check():
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), 0.05)
+        session_id, session = _session()
+        await store.put(session_id, session)
+        time.sleep(0.1)
+        assert await store.get(session_id) is None
+        assert not await store.put_if(session_id, _answered(session), 0)
+        await store.reap()
+        assert (await store.snapshot())["live"] == 0
+
+    asyncio.run(check())
+
+
+def test_stored_sessions_are_counted(tmp_path):
+    async def check(store):
+        for _ in range(3):
+            session_id, session = _session()
+            await store.put(session_id, session)
+        await store.delete(session_id)
+        snapshot = await store.snapshot()
+        assert snapshot["live"] == 2 and snapshot["bytes"] > 0
+        await store.reap()
+        assert metrics.sessions_live.values[()] == 2
+
+    for store in _stores(tmp_path):
+        asyncio.run(check(store))
+
+
+def test_id_based_session_api(monkeypatch):
+    async def check():
+        session_id = await session_manager.create_session("my wifi keeps dropping every evening", INTENT)
+        session = await session_manager.get_session(session_id)
+        assert session["main_issue"] == INTENT["main_issue"]
+        updated = await session_manager.add_answer_to_session(session_id, "Does it drop on every device at once?", "Yes")
+        assert updated["answer_count"] == 1
+        assert (await session_manager.get_session(session_id))["answers_history"] == [
+            {"question": "Does it drop on every device at once?", "answer": "Yes"}
+        ]
+        assert await session_manager.add_answer_to_session("unknown", "Q?", "A") is None
+
+    monkeypatch.setattr(session_manager, "store", MemorySessionStore(60, 100))
+    asyncio.run(check())
@@ -0,0 +1,90 @@
+import asyncio
+import speculation
+from session_manager import new_session, record_question
+
+INTENT = {
+    "main_issue": "Wifi drops every evening",
+    "risk_level": "low",
+    "hypotheses": [
+        {"name": "Channel congestion", "probability": 0.5},
+        {"name": "Router overheating", "probability": 0.3},
+        {"name": "ISP outage", "probability": 0.2},
+    ],
+}
+QUESTION = {
+    "question": "Does it drop on every device at once?",
+    "options": ["Yes", "No"],
+    "likelihoods": {"Yes": [0.9, 0.3, 0.2], "No": [0.1, 0.7, 0.8]},
+}
+
+
+def _session(answer_count):
+    _, session = new_session("my wifi keeps dropping every evening", INTENT)
+    record_question(session, QUESTION, {"probs": list(session["probs"])})
+    session["answer_count"] = answer_count
+    return session
+
+
+def test_prefetches_the_likeliest_answer(fake_llm):
+    async def check():
+        prefetch = speculation.prefetch_next_question(_session(0), 0.1)
+        assert prefetch is not None and prefetch[0] == "Yes"
+        speculation.abandon(prefetch[1][0])
+
+    asyncio.run(check())
+
+
+def test_skips_the_prefetch_when_the_answer_would_end_the_session():
+    skipped = speculation.stats["prefetch_skipped_on_stop"]
+    # One more answer reaches every domain's question limit
+    assert speculation.prefetch_next_question(_session(50), 0.1) is None
+    assert speculation.stats["prefetch_skipped_on_stop"] == skipped + 1
+
+
+def test_a_failing_answer_cancels_its_speculative_question(fake_llm, monkeypatch):
+    import main
+
+    started = []
+
+    def start(**kwargs):
+        started.append(speculation.start_speculative_question(**kwargs))
+        return started[-1]
+
+    async def unavailable(**kwargs):
+        raise RuntimeError("confidence model unavailable")
+
+    monkeypatch.setattr(main, "SPECULATIVE_QUESTIONS", True)
+    monkeypatch.setattr(main, "start_speculative_question", start)
+    monkeypatch.setattr(main, "evaluate_confidence", unavailable)
+
+    async def check():
+        try:
+            await main._apply_answer(_session(0), "Yes")
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("the confidence failure was swallowed")
+        await asyncio.sleep(0)
+        assert len(started) == 1 and started[0][0].cancelled()
+
+    asyncio.run(check())
+
+
+def test_an_answer_that_ends_the_session_starts_no_speculation(monkeypatch):
+    import main
+
+    def start(**kwargs):
+        raise AssertionError("speculated on the last turn")
+
+    async def continuing(**kwargs):
+        return {"confidence_score": 0.5, "verdict": "CONTINUE"}
+
+    monkeypatch.setattr(main, "SPECULATIVE_QUESTIONS", True)
+    monkeypatch.setattr(main, "start_speculative_question", start)
+    monkeypatch.setattr(main, "evaluate_confidence", continuing)
+    skipped = speculation.stats["skipped_on_stop"]
+
+    # The answer reaches every domain's question limit
+    _, _, should_stop, speculative = asyncio.run(main._apply_answer(_session(49), "Yes"))
+    assert should_stop and speculative is None
+    assert speculation.stats["skipped_on_stop"] == skipped + 1
@@ -0,0 +1,83 @@
+import asyncio
+import llm_engine
+import main
+import metrics
+from session_manager import get_session
+
+
+def test_fused_start_streams_the_session_before_the_question(fake_llm, monkeypatch):
+    complete_stream, progress = llm_engine._complete_stream, {"finished": False}
+
+    async def tracked(*args, **kwargs):
+        async for delta in complete_stream(*args, **kwargs):
+            yield delta
+        progress["finished"] = True
+
+    monkeypatch.setattr(llm_engine, "_complete_stream", tracked)
+    monkeypatch.setattr(main, "START_FUSED", True)
+
+    async def check():
+        events = []
+        async for event, data in main._start_events("my laptop fan is loud even when idle"):
+            events.append((event, progress["finished"], data))
+        return events
+
+    events = asyncio.run(check())
+    assert [event for event, _, _ in events] == ["session", "question", "options", "done"]
+    session, question = events[0], events[1]
+    assert not session[1], "the session event waited for the whole fused reply"
+    assert question[2]["question"] and question[2]["question_number"] == 1
+
+    stored = asyncio.run(get_session(session[2]["session_id"]))
+    assert stored["asked_questions"] == [question[2]["question"]]
+    assert stored["likelihoods"]
+    # One fused call, no second one for the question
+    assert sum(client.cassette.stats["synthesized"] for client in fake_llm.values()) == 1
+
+
+def test_a_broken_fused_reply_falls_back_to_a_separate_question(fake_llm, monkeypatch):
+    from model_router import API_ERRORS
+
+    complete_stream = llm_engine._complete_stream
+
+    async def breaks_after_intent(messages, *args, **kwargs):
+        fused, received = "first_question" in messages[0]["content"], ""
+        async for delta in complete_stream(messages, *args, **kwargs):
+            received += delta
+            if fused and '"first_question"' in received:
+                raise API_ERRORS[0]("connection reset", request=None, body=None)
+            yield delta
+
+    monkeypatch.setattr(llm_engine, "_complete_stream", breaks_after_intent)
+    monkeypatch.setattr(main, "START_FUSED", True)
+
+    async def check():
+        events = []
+        async for event, data in main._start_events("my printer prints blank pages"):
+            if event == "session":
+                # Already usable when the client first sees its id
+                assert await get_session(data["session_id"]) is not None
+            events.append((event, data))
+        return events
+
+    events = asyncio.run(check())
+    assert [event for event, _ in events] == ["session", "question", "options", "done"]
+    stored = asyncio.run(get_session(events[0][1]["session_id"]))
+    assert stored["asked_questions"] == [events[1][1]["question"]]
+    assert metrics.start_fallbacks.values[()] >= 1
+
+
+def test_a_provider_failure_ends_the_stream_with_an_error(fake_llm, monkeypatch):
+    from model_router import API_ERRORS
+
+    async def down(*args, **kwargs):
+        raise API_ERRORS[0]("connection reset", request=None, body=None)
+        yield
+
+    monkeypatch.setattr(llm_engine, "_complete_stream", down)
+    monkeypatch.setattr(main, "START_FUSED", True)
+
+    async def check():
+        return [event async for event in main._start_events("my printer jams")]
+
+    assert asyncio.run(check()) == [("error", {"error": "Failed to process your enquiry"})]
@@ -0,0 +1,35 @@
+import pytest
+from stopping_policy import EntropyPolicy, FixedCountPolicy, entropy, limits_for
+
+CERTAIN = [0.97, 0.02, 0.01]
+UNSURE = [0.4, 0.35, 0.25]
+
+
+def test_entropy_is_scaled_to_one():
+    assert entropy([1 / 3] * 3) == pytest.approx(1.0)
+    assert entropy([1.0, 0.0]) == 0.0
+    assert entropy([1.0]) == 0.0
+
+
+def test_risk_limits_only_tighten():
+    limits = limits_for("tech", "high")
+    assert limits["min_questions"] == 4 and limits["max_entropy"] == 0.35 and limits["require_verdict"]
+    assert limits_for("health", "low") == limits_for("health", "unknown")
+
+
+def test_entropy_policy():
+    policy = EntropyPolicy()
+    assert policy.decide([CERTAIN], 1, "tech", "low", "STOP") == (False, "continue")
+    assert policy.decide([CERTAIN], 2, "tech", "low", "CONTINUE") == (True, "entropy")
+    assert policy.decide([UNSURE], 2, "tech", "low", "CONTINUE") == (False, "continue")
+    assert policy.decide([UNSURE], 7, "tech", "low", "CONTINUE") == (True, "max_questions")
+    # Health needs the confidence gate's STOP however certain the distribution
+    assert policy.decide([CERTAIN], 5, "health", "low", "CONTINUE") == (False, "continue")
+    assert policy.decide([CERTAIN], 5, "health", "low", "STOP") == (True, "verdict")
+
+
+def test_fixed_policy():
+    policy = FixedCountPolicy()
+    assert policy.decide([CERTAIN], 3, "tech", "low", "STOP") == (False, "continue")
+    assert policy.decide([UNSURE], 4, "tech", "low", "STOP") == (True, "verdict")
+    assert policy.decide([UNSURE], 8, "tech", "low", "CONTINUE") == (True, "max_questions")
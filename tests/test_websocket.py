@@ -0,0 +1,41 @@
+from starlette.testclient import TestClient
+import main
+import speculation
+
+
+def _turn(ws):
+    events = []
+    while not events or events[-1]["type"] not in ("done", "error"):
+        events.append(ws.receive_json())
+    return events
+
+
+def test_a_malformed_frame_gets_an_error_and_keeps_the_connection(fake_llm):
+    with TestClient(main.app).websocket_connect("/ws/diagnose") as ws:
+        ws.send_text("{not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "start", "message": "my laptop fan is loud even when idle"})
+        assert [event["type"] for event in _turn(ws)] == ["session", "question", "options", "done"]
+
+
+def test_the_prefetch_uses_the_session_the_turn_committed(fake_llm, monkeypatch):
+    loads, get_session = [], main.get_session
+
+    async def counted(session_id):
+        loads.append(session_id)
+        return await get_session(session_id)
+
+    monkeypatch.setattr(main, "get_session", counted)
+    monkeypatch.setattr(main, "WS_PREFETCH_MIN_SHARE", 0.01)
+    started = speculation.stats["started"]
+
+    with TestClient(main.app).websocket_connect("/ws/diagnose") as ws:
+        ws.send_json({"type": "start", "message": "my printer prints blank pages"})
+        events = _turn(ws)
+        assert not loads, "the start turn reloaded its own session"
+        options = events[-2]
+        ws.send_json({"type": "answer", "selected_option": options["options"][0], "question_number": 1})
+        assert _turn(ws)[-1]["type"] == "done"
+    # The answer itself loads the session once; the prefetches after each turn don't
+    assert len(loads) == 1
+    assert speculation.stats["started"] > started